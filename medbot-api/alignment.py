@@ -0,0 +1,189 @@
+"""
+Speaker-to-transcript alignment.
+
+Diarization gives speaker turns, Whisper gives segments with word
+timestamps. ``assign_speakers`` labels every word with the speaker whose
+turns overlap it the most and splits Whisper segments wherever the speaker
+changes mid-segment.
+
+Turns are indexed once, split into layers of non-overlapping turns (a new
+layer only where turns overlap, so there are as many layers as speakers
+ever talk at once - usually two or three). Within a layer starts and ends
+are both sorted, so for each word two binary searches give exactly the turns
+that overlap it, however long or nested other turns are. The overlaps of all
+those (word, turn) pairs are computed in one vectorized pass, so aligning n
+words against m turns in L layers costs O(m log m + L n log m) plus the
+overlapping pairs themselves, instead of O(n * m).
+"""
+
+import heapq
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Words that fall in a gap between turns take the nearest turn's speaker if
+# it is at most this many seconds away
+MAX_GAP_SECONDS = 1.0
+
+
+class SpeakerIndex:
+    """Sorted-array index over diarization turns for overlap queries"""
+
+    def __init__(self, speaker_segments: List[Dict[str, Any]]):
+        turns = sorted(speaker_segments, key=lambda turn: turn["start"])
+        self.starts = np.array([turn["start"] for turn in turns], dtype=np.float64)
+        self.ends = np.array([turn["end"] for turn in turns], dtype=np.float64)
+        self.labels = sorted(set(turn["speaker"] for turn in turns))
+        codes = {label: i for i, label in enumerate(self.labels)}
+        self.codes = np.array([codes[turn["speaker"]] for turn in turns], dtype=np.int64)
+        # Latest end among the turns up to each one (turns may overlap or
+        # nest), and which turn it belongs to, for words between turns
+        self.max_end = np.maximum.accumulate(self.ends) if len(turns) else self.ends
+        ends_here = np.where(self.ends >= self.max_end, np.arange(len(turns)), 0)
+        self.max_end_turn = np.maximum.accumulate(ends_here) if len(turns) else ends_here
+
+        # Each turn goes to the layer that became free first, or a new layer
+        # if every layer is still busy at its start
+        free: List[Tuple[float, int]] = []
+        layer_of = np.zeros(len(turns), dtype=np.int64)
+        layers = 0
+        for i, (start, end) in enumerate(zip(self.starts, self.ends)):
+            if free and free[0][0] <= start:
+                _, layer = heapq.heappop(free)
+            else:
+                layer, layers = layers, layers + 1
+            layer_of[i] = layer
+            heapq.heappush(free, (end, layer))
+        # Turn indices of each layer, in start (and so end) order
+        self.layers = [np.flatnonzero(layer_of == layer) for layer in range(layers)]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def overlapping(self, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(interval, turn) index pairs of every turn overlapping each [start, end) interval"""
+        interval_parts, turn_parts = [], []
+        for turns in self.layers:
+            # Turns [lo, hi) of the layer start before the interval ends and
+            # end after it starts
+            his = np.searchsorted(self.starts[turns], ends, side="left")
+            los = np.minimum(np.searchsorted(self.ends[turns], starts, side="right"), his)
+            counts = his - los
+            interval_parts.append(np.repeat(np.arange(len(starts)), counts))
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            turn_parts.append(turns[np.repeat(los, counts) + offsets])
+        return np.concatenate(interval_parts), np.concatenate(turn_parts)
+
+    def lookup(self, starts: np.ndarray, ends: np.ndarray) -> List[Optional[str]]:
+        """Speaker with the largest overlap for each [start, end) interval"""
+        n = len(starts)
+        if len(self) == 0 or n == 0:
+            return [None] * n
+
+        # Sum the overlap of every (interval, overlapping turn) pair per
+        # (interval, speaker)
+        interval_idx, turn_idx = self.overlapping(starts, ends)
+        overlap = (
+            np.minimum(ends[interval_idx], self.ends[turn_idx])
+            - np.maximum(starts[interval_idx], self.starts[turn_idx])
+        )
+        totals = np.zeros((n, len(self.labels)), dtype=np.float64)
+        np.add.at(totals, (interval_idx, self.codes[turn_idx]), np.clip(overlap, 0, None))
+
+        best = totals.argmax(axis=1)
+        has_overlap = totals[np.arange(n), best] > 0
+
+        # No overlap (zero-length word or a gap between turns): use the
+        # closest turn on either side if it is near enough. Before the word,
+        # that is the latest-ending turn, which may have started long before
+        # (or cover a zero-length word)
+        his = np.searchsorted(self.starts, ends, side="left")
+        before = self.max_end_turn[np.clip(his - 1, 0, len(self) - 1)]
+        after = np.clip(his, 0, len(self) - 1)
+        gap_before = np.where(his > 0, starts - self.ends[before], np.inf)
+        gap_after = np.where(his < len(self), self.starts[after] - ends, np.inf)
+        nearest = np.where(gap_before <= gap_after, self.codes[before], self.codes[after])
+        near_enough = np.minimum(gap_before, gap_after) <= MAX_GAP_SECONDS
+
+        codes = np.where(has_overlap, best, np.where(near_enough, nearest, -1))
+        return [self.labels[code] if code >= 0 else None for code in codes]
+
+
+def _words(segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Word timings of a Whisper segment, or the segment itself as one 'word'"""
+    return segment.get("words") or [{"word": segment["text"], "start": segment["start"], "end": segment["end"]}]
+
+
+def assign_speakers(
+    segments: List[Dict[str, Any]],
+    speaker_segments: List[Dict[str, Any]],
+    speaker_map: Optional[Dict[str, str]] = None,
+    unknown_label: str = "Unknown"
+) -> List[Dict[str, Any]]:
+    """
+    Label transcript segments with speakers.
+
+    Each word gets the speaker with maximum overlap; words with no nearby
+    turn inherit the previous word's speaker. A Whisper segment is split into
+    several output segments where the speaker changes within it. Output
+    segments have ``start``, ``end``, ``text`` and ``speaker``.
+    """
+    index = SpeakerIndex(speaker_segments)
+    speaker_map = speaker_map or {}
+
+    segment_words = [_words(segment) for segment in segments]
+    words = [word for group in segment_words for word in group]
+    if not words:
+        return []
+    labels = index.lookup(
+        np.array([w["start"] for w in words], dtype=np.float64),
+        np.array([w["end"] for w in words], dtype=np.float64)
+    )
+
+    # Fill gaps from the previous word, then leading gaps from the first known one
+    previous = next((label for label in labels if label is not None), None)
+    for i, label in enumerate(labels):
+        if label is None:
+            labels[i] = previous
+        else:
+            previous = label
+
+    def speaker_name(label: Optional[str]) -> str:
+        return speaker_map.get(label, label) if label is not None else unknown_label
+
+    result: List[Dict[str, Any]] = []
+    position = 0
+    for segment, group in zip(segments, segment_words):
+        group_labels = labels[position:position + len(group)]
+        position += len(group)
+
+        if all(label == group_labels[0] for label in group_labels):
+            # One speaker for the whole segment: keep Whisper's segment as is
+            result.append({
+                "start": segment["start"],
+                "end": segment["end"],
+                "text": segment["text"].strip(),
+                "speaker": speaker_name(group_labels[0])
+            })
+            continue
+
+        current = None
+        for word, label in zip(group, group_labels):
+            if current is None or label != current_label:
+                if current is not None:
+                    current["text"] = current["text"].strip()
+                    result.append(current)
+                current_label = label
+                current = {
+                    "start": word["start"],
+                    "end": word["end"],
+                    "text": word["word"],
+                    "speaker": speaker_name(label)
+                }
+            else:
+                current["end"] = word["end"]
+                current["text"] += word["word"]
+        current["text"] = current["text"].strip()
+        result.append(current)
+
+    return result
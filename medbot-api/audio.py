@@ -0,0 +1,283 @@
+"""
+Audio decoding helpers.
+
+Whisper and pyannote both work on 16kHz mono audio, so everything decoded
+here is returned as float32 NumPy arrays at ``SAMPLE_RATE``.
+"""
+
+import asyncio
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+SAMPLE_RATE = 16000
+
+
+# Containers that may keep their index at the end of the file. ffmpeg cannot
+# decode those from a pipe, so they are spooled to a temporary file first.
+SEEKABLE_CONTAINERS = {".mp4", ".m4a", ".mov"}
+
+# Raw upload bytes handed to ffmpeg per write
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class EmptyUploadError(ValueError):
+    """Raised when an upload contains no data"""
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size or duration limit"""
+
+
+def _ffmpeg_command(source: str, max_seconds: Optional[float] = None) -> List[str]:
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-threads", "0",
+        "-i", source
+    ]
+    if max_seconds is not None:
+        # Decode one second past the limit so an over-long file is detectable
+        command += ["-t", str(max_seconds + 1)]
+    return command + ["-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"]
+
+
+def decode_audio(file_path: str, max_seconds: Optional[float] = None) -> np.ndarray:
+    """
+    Decode any ffmpeg-readable file to 16kHz mono float32 in a single pass.
+
+    The PCM is read straight from ffmpeg's stdout, so no intermediate WAV is
+    written. The same array can be handed to Whisper and (via
+    ``waveform_input``) to pyannote.
+    """
+    try:
+        output = subprocess.run(_ffmpeg_command(file_path, max_seconds), capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='replace').strip()}") from e
+    audio = np.frombuffer(output, dtype=np.float32).copy()
+    if max_seconds is not None and len(audio) > max_seconds * SAMPLE_RATE:
+        raise UploadTooLargeError(f"Audio is longer than the {max_seconds / 60:.0f} minute limit")
+    return audio
+
+
+class _PCMBuffer:
+    """
+    Growable float32 sample buffer filled from raw f32le bytes.
+
+    Capacity doubles as needed, so the array is only ever as large as the
+    decoded audio (plus headroom that is trimmed at the end).
+    """
+
+    def __init__(self, max_samples: int, initial_seconds: float = 60):
+        self.max_samples = max_samples
+        self.array = np.empty(int(min(max_samples, initial_seconds * SAMPLE_RATE)) + 1, dtype=np.float32)
+        self.length = 0
+        self._carry = b""  # partial sample left over from the previous read
+
+    def write(self, data: bytes):
+        data = self._carry + data
+        usable = len(data) - len(data) % 4
+        self._carry = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=np.float32)
+
+        end = self.length + len(samples)
+        if end > self.max_samples:
+            raise UploadTooLargeError(
+                f"Audio is longer than the {self.max_samples / SAMPLE_RATE / 60:.0f} minute limit"
+            )
+        if end > len(self.array):
+            self.array.resize(min(max(end, 2 * len(self.array)), self.max_samples + 1), refcheck=False)
+        self.array[self.length:end] = samples
+        self.length = end
+
+    def samples(self) -> np.ndarray:
+        self.array.resize(self.length, refcheck=False)
+        return self.array
+
+
+async def save_upload(upload, path: str, max_bytes: int) -> int:
+    """
+    Copy an ``UploadFile`` to ``path`` in chunks, enforcing the size limit as
+    it goes. Removes the partial file on any error. Returns the bytes written.
+    """
+    bytes_read = 0
+    try:
+        with open(path, "wb") as output:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                bytes_read += len(chunk)
+                if bytes_read > max_bytes:
+                    raise UploadTooLargeError(f"Upload is larger than the {max_bytes // (1024 * 1024)} MB limit")
+                output.write(chunk)
+        if bytes_read == 0:
+            raise EmptyUploadError("Uploaded file is empty")
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    return bytes_read
+
+
+async def _decode_upload_via_file(upload, suffix: str, max_bytes: int, max_seconds: float) -> Tuple[np.ndarray, int]:
+    """Fallback for containers ffmpeg has to seek in: spool in chunks, then decode"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_path = temp_file.name
+    bytes_read = await save_upload(upload, temp_path, max_bytes)
+
+    try:
+        loop = asyncio.get_running_loop()
+        audio = await loop.run_in_executor(None, decode_audio, temp_path, max_seconds)
+        return audio, bytes_read
+    finally:
+        os.unlink(temp_path)
+
+
+async def decode_upload(upload, max_bytes: int, max_seconds: float) -> Tuple[np.ndarray, int]:
+    """
+    Stream-decode an ``UploadFile`` to 16kHz mono float32.
+
+    Upload chunks are piped into ffmpeg's stdin while PCM is read from its
+    stdout into a growing sample buffer, so neither the raw upload nor a disk
+    copy is held while decoding. Both limits are enforced as data flows; the
+    decode is aborted with ``UploadTooLargeError`` as soon as one is crossed.
+
+    Returns the samples and the number of upload bytes read.
+    """
+    suffix = Path(upload.filename or "").suffix.lower()
+    if suffix in SEEKABLE_CONTAINERS:
+        return await _decode_upload_via_file(upload, suffix, max_bytes, max_seconds)
+
+    process = await asyncio.create_subprocess_exec(
+        *_ffmpeg_command("pipe:0"),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    pcm = _PCMBuffer(max_samples=int(max_seconds * SAMPLE_RATE))
+    bytes_read = 0
+
+    async def feed():
+        nonlocal bytes_read
+        try:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                bytes_read += len(chunk)
+                if bytes_read > max_bytes:
+                    raise UploadTooLargeError(f"Upload is larger than the {max_bytes // (1024 * 1024)} MB limit")
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg exited early; its stderr says why
+        finally:
+            process.stdin.close()
+
+    async def collect():
+        while True:
+            data = await process.stdout.read(65536)
+            if not data:
+                break
+            pcm.write(data)
+
+    tasks = [
+        asyncio.ensure_future(feed()),
+        asyncio.ensure_future(collect()),
+        asyncio.ensure_future(process.stderr.read())
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        raise
+
+    returncode = await process.wait()
+    if bytes_read == 0:
+        raise EmptyUploadError("Uploaded file is empty")
+    if returncode != 0:
+        stderr = tasks[2].result().decode(errors="replace").strip()
+        raise RuntimeError(f"Failed to decode audio: {stderr}")
+    return pcm.samples(), bytes_read
+
+
+def waveform_input(audio: np.ndarray) -> Dict[str, Any]:
+    """Wrap decoded samples in the in-memory format pyannote pipelines accept"""
+    return {
+        "waveform": torch.from_numpy(audio).unsqueeze(0),  # (channel, time)
+        "sample_rate": SAMPLE_RATE
+    }
+
+
+class StreamDecoder:
+    """
+    Decode a growing compressed audio stream (e.g. MediaRecorder webm/opus
+    chunks) with a single long-lived ffmpeg process.
+
+    Chunks from MediaRecorder are not independently decodable - only the
+    first one carries the container header - so all bytes of a stream are
+    piped into the same ffmpeg stdin and PCM is collected from its stdout.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._reader = None
+        self._pcm = bytearray()
+
+    async def start(self):
+        self._process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            # Keep probing short so the first samples come out quickly
+            "-probesize", "32768", "-analyzeduration", "0",
+            "-i", "pipe:0",
+            "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        self._reader = asyncio.create_task(self._read_stdout())
+
+    async def _read_stdout(self):
+        while True:
+            chunk = await self._process.stdout.read(65536)
+            if not chunk:
+                break
+            self._pcm.extend(chunk)
+
+    async def feed(self, data: bytes):
+        """Send more compressed bytes to the decoder"""
+        self._process.stdin.write(data)
+        await self._process.stdin.drain()
+
+    def take(self) -> np.ndarray:
+        """Return all samples decoded since the last call"""
+        usable = len(self._pcm) - len(self._pcm) % 4
+        samples = np.frombuffer(bytes(self._pcm[:usable]), dtype=np.float32).copy()
+        del self._pcm[:usable]
+        return samples
+
+    async def finish(self) -> np.ndarray:
+        """Close the input, wait for ffmpeg to flush and return the remaining samples"""
+        if self._process.stdin and not self._process.stdin.is_closing():
+            self._process.stdin.close()
+        await self._reader
+        await self._process.wait()
+        return self.take()
+
+    async def abort(self):
+        """Stop ffmpeg without waiting for buffered output"""
+        if self._process and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        if self._reader:
+            self._reader.cancel()
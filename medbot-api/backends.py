@@ -0,0 +1,260 @@
+"""
+Whisper inference backends and the registry that loads them.
+
+Every backend exposes ``transcribe(audio, **options)`` taking 16kHz mono
+float32 samples and returning a dict shaped like openai-whisper's
+``model.transcribe`` output (``text``, ``segments``, ``language``), so the
+endpoints do not care which engine produced it.
+
+``transcribe`` also takes an optional ``progress`` callback, called with the
+fraction of the audio decoded so far (once per 30-second window for
+openai-whisper, once per segment for faster-whisper).
+
+Backends:
+- ``openai-whisper``: the reference PyTorch implementation
+- ``openai-whisper-int8``: the same model with its Linear layers dynamically
+  quantized to int8 (CPU only)
+- ``faster-whisper``: CTranslate2 engine with int8 weights (optional
+  dependency: ``pip install faster-whisper``)
+"""
+
+import importlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+import whisper
+
+BACKENDS = ("openai-whisper", "openai-whisper-int8", "faster-whisper")
+MODEL_SIZES = ("tiny", "base", "small", "medium", "large", "large-v2", "large-v3")
+
+ProgressCallback = Callable[[float], None]
+
+# Progress callback of the transcription running on the current thread
+_progress = threading.local()
+
+
+class _WindowProgress:
+    """
+    Stand-in for the tqdm bar in ``whisper.transcribe``. openai-whisper
+    advances it once per decoded 30-second window; this reports each step to
+    the progress callback of the calling thread instead of drawing a bar.
+    """
+
+    def __init__(self, total: Optional[int] = None, **kwargs):
+        self.total = total
+        self.n = 0
+        self.callback = getattr(_progress, "callback", None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n: int = 1):
+        self.n += n
+        if self.callback and self.total:
+            self.callback(min(1.0, self.n / self.total))
+
+
+class _TqdmModule:
+    tqdm = _WindowProgress
+
+
+# whisper/__init__.py re-exports the transcribe function under the module's
+# name, so fetch the module itself to swap its progress bar
+importlib.import_module("whisper.transcribe").tqdm = _TqdmModule
+
+
+class WhisperBackend:
+    """Base class: a loaded Whisper model behind a common transcribe() call"""
+
+    backend = ""
+
+    def __init__(self, size: str):
+        self.size = size
+
+    @property
+    def id(self) -> str:
+        """Stable identifier used in cache keys and the health endpoint"""
+        return f"{self.backend}:{self.size}"
+
+    def transcribe(self, audio: np.ndarray, progress: Optional[ProgressCallback] = None, **options) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class OpenAIWhisperBackend(WhisperBackend):
+    backend = "openai-whisper"
+
+    def __init__(self, size: str):
+        super().__init__(size)
+        self.model = whisper.load_model(size)
+
+    def transcribe(self, audio: np.ndarray, progress: Optional[ProgressCallback] = None, **options) -> Dict[str, Any]:
+        options.setdefault("fp16", False)  # Explicitly disable FP16
+        _progress.callback = progress
+        try:
+            return self.model.transcribe(audio, **options)
+        finally:
+            _progress.callback = None
+
+
+def quantize_linear_layers(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Dynamically quantize every Linear layer of a Whisper model to int8.
+
+    Whisper's layers are ``whisper.model.Linear``, a subclass of
+    ``nn.Linear``; ``quantize_dynamic`` matches exact types and has no
+    quantized counterpart for the subclass, so the layers are first swapped
+    for plain ``nn.Linear`` sharing the same weights. The subclass only casts
+    weights to the input dtype, which makes no difference on fp32 CPU.
+    """
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None, device="meta")
+                plain.weight = child.weight
+                plain.bias = child.bias
+                setattr(module, name, plain)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class QuantizedWhisperBackend(OpenAIWhisperBackend):
+    """openai-whisper with int8 dynamic quantization of all Linear layers"""
+
+    backend = "openai-whisper-int8"
+
+    def __init__(self, size: str):
+        WhisperBackend.__init__(self, size)
+        self.model = quantize_linear_layers(whisper.load_model(size, device="cpu"))
+
+
+class FasterWhisperBackend(WhisperBackend):
+    """CTranslate2 engine via faster-whisper, int8 weights on CPU"""
+
+    backend = "faster-whisper"
+
+    def __init__(self, size: str, compute_type: str = "int8", cpu_threads: int = 0):
+        super().__init__(size)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError(
+                "The faster-whisper backend needs the faster-whisper package: pip install faster-whisper"
+            )
+        self.compute_type = compute_type
+        self.model = WhisperModel(size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+    @property
+    def id(self) -> str:
+        return f"{self.backend}:{self.size}-{self.compute_type}"
+
+    def transcribe(self, audio: np.ndarray, progress: Optional[ProgressCallback] = None, **options) -> Dict[str, Any]:
+        options.pop("fp16", None)  # openai-whisper only
+        segments, info = self.model.transcribe(audio, **options)
+
+        converted: List[Dict[str, Any]] = []
+        for segment in segments:
+            item = {
+                "id": segment.id,
+                "seek": segment.seek,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "tokens": segment.tokens,
+                "temperature": segment.temperature,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob
+            }
+            if segment.words is not None:
+                item["words"] = [
+                    {"word": w.word, "start": w.start, "end": w.end, "probability": w.probability}
+                    for w in segment.words
+                ]
+            converted.append(item)
+            # Segments are decoded lazily as this loop pulls them
+            if progress and info.duration:
+                progress(min(1.0, segment.end / info.duration))
+
+        return {
+            "text": "".join(segment["text"] for segment in converted),
+            "segments": converted,
+            "language": info.language
+        }
+
+
+def load_backend(backend: str, size: str, cpu_threads: int = 0) -> WhisperBackend:
+    """Load one Whisper model with the given backend"""
+    if backend == "openai-whisper":
+        return OpenAIWhisperBackend(size)
+    if backend == "openai-whisper-int8":
+        return QuantizedWhisperBackend(size)
+    if backend == "faster-whisper":
+        return FasterWhisperBackend(size, cpu_threads=cpu_threads)
+    raise ValueError(f"Unknown Whisper backend '{backend}'. Available: {', '.join(BACKENDS)}")
+
+
+class ModelRegistry:
+    """
+    Resolves which Whisper backend and size a request gets, and loads them.
+    Loaded models are kept (and unloaded) by the ``ModelManager`` in models.py.
+
+    ``allowed`` limits which model sizes requests may ask for, so a client
+    cannot make the server load ``large`` on a small box.
+    """
+
+    def __init__(self, default_backend: str, default_size: str, allowed_sizes: List[str], cpu_threads: int = 0):
+        self.check_backend(default_backend)
+        self.default_backend = default_backend
+        self.default_size = default_size
+        self.allowed_sizes = set(allowed_sizes) | {default_size}
+        self.cpu_threads = cpu_threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def check_backend(backend: str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown Whisper backend '{backend}'. Available: {', '.join(BACKENDS)}")
+
+    def resolve(self, backend: Optional[str] = None, size: Optional[str] = None) -> tuple:
+        """Validate a requested backend/size, falling back to the defaults"""
+        with self._lock:
+            backend = backend or self.default_backend
+            size = size or self.default_size
+            allowed = sorted(self.allowed_sizes)
+        self.check_backend(backend)
+        if size not in allowed:
+            raise ValueError(f"Whisper model '{size}' is not enabled. Available: {', '.join(allowed)}")
+        return backend, size
+
+    @staticmethod
+    def model_id(backend: str, size: str) -> str:
+        """Identifier of a model (as ``WhisperBackend.id``), available before it is loaded"""
+        if backend == "faster-whisper":
+            return f"{backend}:{size}-int8"
+        return f"{backend}:{size}"
+
+    @property
+    def default_id(self) -> str:
+        return self.model_id(self.default_backend, self.default_size)
+
+    def is_default(self, model: WhisperBackend) -> bool:
+        return (model.backend, model.size) == (self.default_backend, self.default_size)
+
+    def set_default(self, backend: str, size: str):
+        """Make ``backend``/``size`` the model requests get unless they ask for another"""
+        self.check_backend(backend)
+        with self._lock:
+            self.default_backend = backend
+            self.default_size = size
+            self.allowed_sizes.add(size)
+
+    def load(self, backend: str, size: str) -> WhisperBackend:
+        """Load one model (blocking)"""
+        print(f"Loading Whisper model {size} ({backend})...")
+        model = load_backend(backend, size, self.cpu_threads)
+        print(f"Whisper model {model.id} loaded successfully!")
+        return model
@@ -0,0 +1,303 @@
+"""
+Offline batch transcription.
+
+Processes a directory of recordings (searched recursively) or a manifest
+file (one path per line, relative to the manifest; ``#`` starts a comment)
+with the same models and pipeline as the API and background jobs, without
+going through HTTP. The models are loaded once, recordings are decoded on a
+thread pool ahead of inference so ffmpeg never holds up Whisper or pyannote,
+and each result is appended to a JSONL file as soon as it is done:
+
+    {"file": "2026-01-12/room3-0915.mp3", "status": "done", "full_text": "...", "segments": [...], "audio_seconds": 1204.5, "processing_seconds": 31.2, "rtf": 0.026, ...}
+
+Running the same command again skips the files already in the output with
+``"status": "done"``, so an interrupted backfill resumes where it stopped.
+Failed files are recorded with ``"status": "failed"`` and retried on the next
+run; when a file appears more than once, its last line is the current one.
+
+Usage (from medbot-api/):
+    python batch.py /data/clinics --output clinics.jsonl
+    python batch.py manifest.txt --kind transcribe --model small --output manifest.jsonl
+    python batch.py /data/clinics --output clinics.jsonl --min-speakers 2 --max-speakers 3 --note
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Response
+
+import index
+import telemetry
+from audio import SAMPLE_RATE, decode_audio
+from telemetry import AUDIO_SECONDS, observe_stage
+
+
+def list_recordings(source: str) -> List[Tuple[str, str]]:
+    """
+    (name, path) of every recording to process. Names are relative to the
+    directory, or as written in the manifest, and identify the file in the
+    output when resuming.
+    """
+    if os.path.isdir(source):
+        recordings = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if Path(filename).suffix.lower() in index.ALLOWED_EXTENSIONS:
+                    path = os.path.join(root, filename)
+                    recordings.append((os.path.relpath(path, source), path))
+        return recordings
+
+    base = os.path.dirname(os.path.abspath(source))
+    recordings = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            name = line.split("#", 1)[0].strip()
+            if name:
+                recordings.append((name, os.path.join(base, name)))
+    return recordings
+
+
+def finished_files(output: str) -> Set[str]:
+    """Names already processed successfully according to an earlier run's output"""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Last line of a run that was killed mid-write
+                continue
+            if record.get("status") == "done":
+                done.add(record["file"])
+            else:
+                done.discard(record.get("file"))
+    return done
+
+
+def open_output(output: str):
+    """Open the JSONL output for appending, after any partial last line"""
+    partial = False
+    if os.path.exists(output) and os.path.getsize(output) > 0:
+        with open(output, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            partial = f.read(1) != b"\n"
+    f = open(output, "a", encoding="utf-8")
+    if partial:
+        f.write("\n")
+    return f
+
+
+def decode(path: str) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    audio = decode_audio(path, index.MAX_AUDIO_SECONDS)
+    return audio, time.perf_counter() - started
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class BatchProgress:
+    """Running totals and the per-file progress line"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def record(self, name: str, record: Dict[str, Any]):
+        if record["status"] == "done":
+            self.done += 1
+            self.audio_seconds += record["audio_seconds"]
+            detail = (
+                f"{record['audio_seconds'] / 60:6.1f} min in {record['processing_seconds']:6.1f} s "
+                f"(RTF {record['rtf']:.3f})"
+            )
+        else:
+            self.failed += 1
+            detail = f"FAILED: {record['error'].splitlines()[0] if record['error'] else ''}"
+
+        elapsed = time.perf_counter() - self.started
+        finished = self.done + self.failed
+        remaining = elapsed / finished * (self.total - finished)
+        print(
+            f"[{finished:>{len(str(self.total))}}/{self.total}] {name}  {detail}  | "
+            f"{self.summary()}, ETA {format_duration(remaining)}",
+            flush=True
+        )
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        if not self.audio_seconds:
+            return f"no audio in {format_duration(elapsed)}"
+        rtf = elapsed / self.audio_seconds
+        return (
+            f"{self.audio_seconds / 3600:.2f} h audio in {format_duration(elapsed)}, "
+            f"RTF {rtf:.3f} ({1 / rtf:.1f}x realtime)"
+        )
+
+
+async def run_batch(
+    recordings: List[Tuple[str, str]],
+    output,
+    kind: str,
+    options: Dict[str, Any],
+    decode_workers: int,
+    prefetch: int,
+    concurrency: int
+) -> BatchProgress:
+    """
+    Decode ``recordings`` on a thread pool, at most ``prefetch`` ahead of the
+    ``concurrency`` recordings being transcribed, and append each result to
+    ``output``. Several recordings in flight keep both inference pools busy:
+    one can be diarized while the next one is in Whisper.
+    """
+    loop = asyncio.get_running_loop()
+    decode_pool = ThreadPoolExecutor(decode_workers, thread_name_prefix="decode")
+    decoded: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+    progress = BatchProgress(len(recordings))
+
+    async def feed():
+        for name, path in recordings:
+            await decoded.put((name, loop.run_in_executor(decode_pool, decode, path)))
+        for _ in range(concurrency):
+            await decoded.put(None)
+
+    async def work():
+        # Wait for inference capacity like background jobs do
+        index.wait_for_inference.set(True)
+        while True:
+            item = await decoded.get()
+            if item is None:
+                return
+            name, decoding = item
+            telemetry.request_id.set(f"batch-{name}")
+            response = Response()  # collects Server-Timing for the record
+            started = time.perf_counter()
+            try:
+                audio, decode_seconds = await decoding
+                observe_stage("decode", decode_seconds, response, filename=name)
+                AUDIO_SECONDS.labels("batch").inc(len(audio) / SAMPLE_RATE)
+                result = await index.process_recording(response, kind, options, audio, name, "batch")
+                processing = time.perf_counter() - started
+                record = {
+                    "file": name,
+                    "status": "done",
+                    **result,
+                    "processing_seconds": round(processing, 2),
+                    "rtf": round(processing / result["audio_seconds"], 4) if result["audio_seconds"] else None
+                }
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                telemetry.log("batch_file_failed", level="error", file=name, error=detail)
+                record = {"file": name, "status": "failed", "error": detail}
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            progress.record(name, record)
+
+    try:
+        await asyncio.gather(feed(), *(work() for _ in range(concurrency)))
+    finally:
+        decode_pool.shutdown(wait=False, cancel_futures=True)
+    return progress
+
+
+async def load_models(kind: str, options: Dict[str, Any]):
+    """Load every model the batch needs once, before the first recording"""
+    started = time.perf_counter()
+    whisper_model = await index.acquire_whisper(options.get("backend"), options.get("model"))
+    try:
+        if kind == "diarize":
+            index.release_model(await index.acquire_diarization())
+    finally:
+        index.release_model(whisper_model)
+    print(f"Models loaded in {time.perf_counter() - started:.1f} s")
+
+
+async def main(args) -> int:
+    try:
+        if args.kind == "diarize":
+            hints = index.speaker_hints(args.num_speakers, args.min_speakers, args.max_speakers)
+            index.check_clinician(args.clinician)
+        else:
+            hints = {}
+        options = {
+            "model": args.model, "backend": args.backend, "note": args.note,
+            "speakers": hints, "clinician": args.clinician
+        }
+        await load_models(args.kind, options)
+    except HTTPException as e:
+        print(f"ERROR: {e.detail}")
+        return 1
+
+    recordings = list_recordings(args.source)
+    done = finished_files(args.output)
+    pending = [(name, path) for name, path in recordings if name not in done]
+    print(f"{len(recordings)} recording(s), {len(recordings) - len(pending)} already done, {len(pending)} to process")
+
+    try:
+        with open_output(args.output) as output:
+            progress = await run_batch(
+                pending, output, args.kind, options, args.decode_workers, args.prefetch, args.concurrency
+            )
+    finally:
+        index.whisper_executor.shutdown()
+        index.diarization_executor.shutdown()
+        for batcher in list(index.batched_whispers.values()):
+            batcher.shutdown()
+        if index.long_audio:
+            index.long_audio.shutdown()
+        if index.encounter_store:
+            index.encounter_store.close()
+        await index.note_client.aclose()
+
+    print(f"Finished: {progress.done} done, {progress.failed} failed; {progress.summary()}")
+    return 1 if progress.failed else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory of recordings, or a manifest file with one path per line")
+    parser.add_argument("--output", required=True, help="JSONL file to append results to (and resume from)")
+    parser.add_argument("--kind", choices=["diarize", "transcribe"], default="diarize")
+    parser.add_argument("--model", help="Whisper model size (default: WHISPER_MODEL)")
+    parser.add_argument("--backend", help="Whisper backend (default: WHISPER_BACKEND)")
+    parser.add_argument("--num-speakers", type=int)
+    parser.add_argument("--min-speakers", type=int)
+    parser.add_argument("--max-speakers", type=int)
+    parser.add_argument("--clinician", help="Id of the enrolled clinician in every recording")
+    parser.add_argument("--note", action="store_true", help="Also generate a clinical note for each recording")
+    parser.add_argument("--decode-workers", type=int, default=2, help="ffmpeg decodes running at once")
+    parser.add_argument("--prefetch", type=int, default=4,
+                        help="Decoded recordings kept waiting for inference (bounds memory)")
+    parser.add_argument("--concurrency", type=int, default=2, help="Recordings in inference at once")
+    parser.add_argument("--log-level", default="warning", choices=list(telemetry.LOG_LEVELS),
+                        help="Structured log lines to write besides the progress lines")
+    args = parser.parse_args(argv)
+    if min(args.decode_workers, args.prefetch, args.concurrency) < 1:
+        parser.error("--decode-workers, --prefetch and --concurrency must be at least 1")
+    return args
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    telemetry.min_log_level = telemetry.LOG_LEVELS[arguments.log_level]
+    try:
+        sys.exit(asyncio.run(main(arguments)))
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume")
+        sys.exit(130)
@@ -0,0 +1,255 @@
+"""
+Micro-batching Whisper decoder.
+
+``model.transcribe`` decodes one 30-second window at a time for one request.
+On CPU that leaves the encoder and decoder matmuls far below an efficient
+batch size. ``BatchedWhisper`` cuts each request into 30-second log-mel
+windows, collects windows from all pending requests for up to ``max_wait_ms``
+and decodes them together with ``whisper.decode``, which accepts a batch of
+mel spectrograms. Results are split back out per request.
+
+Differences from ``model.transcribe``:
+- windows are fixed 30-second slices instead of seeking to the last
+  timestamp, so a word falling on a window boundary may be split
+- no temperature fallback and no word timestamps
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import CHUNK_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE
+from whisper.tokenizer import get_tokenizer
+
+from inference import QueueFullError
+
+# Seconds per timestamp token
+TIME_PRECISION = 0.02
+
+
+class _Window:
+    def __init__(self, mel: torch.Tensor, offset: float, duration: float):
+        self.mel = mel
+        self.offset = offset
+        self.duration = duration
+        self.future: Future = Future()
+
+
+class BatchedWhisper:
+    """
+    Batch 30-second windows from concurrent requests through one Whisper model.
+
+    A single scheduler thread owns the model. ``max_pending`` bounds the
+    number of windows waiting to be decoded; requests that would exceed it
+    are rejected with ``QueueFullError``. After ``shutdown`` every window not
+    yet decoded, and every new request, fails with ``RuntimeError``.
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_size: int = 8,
+        max_wait_ms: float = 50,
+        max_pending: int = 256,
+        torch_threads: Optional[int] = None
+    ):
+        self.model = model
+        self.torch_threads = torch_threads
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_pending = max_pending
+        self._queue: "queue.Queue[Optional[_Window]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._batches = 0
+        self._windows = 0
+        self._rejected = 0
+        self._decode_time = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="whisper-batcher", daemon=True)
+        self._thread.start()
+
+    def _split(self, audio: np.ndarray) -> List[_Window]:
+        windows = []
+        for start in range(0, max(len(audio), 1), N_SAMPLES):
+            chunk = audio[start:start + N_SAMPLES]
+            mel = whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(chunk, N_SAMPLES),
+                n_mels=self.model.dims.n_mels
+            )
+            windows.append(_Window(
+                mel=whisper.pad_or_trim(mel, N_FRAMES),
+                offset=start / SAMPLE_RATE,
+                duration=len(chunk) / SAMPLE_RATE
+            ))
+        return windows
+
+    def _collect(self) -> List[_Window]:
+        """Block for the first window, then gather more until full or the wait budget is spent"""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # let the loop see the shutdown signal
+                break
+            batch.append(item)
+        return batch
+
+    def _fail(self, windows: List[_Window], error: Exception):
+        for window in windows:
+            if not window.future.done():
+                window.future.set_exception(error)
+        with self._lock:
+            self._pending -= len(windows)
+
+    def _run(self):
+        if self.torch_threads:
+            torch.set_num_threads(self.torch_threads)
+        options = whisper.DecodingOptions(fp16=False)
+        while True:
+            batch = self._collect()
+            if self._closed:
+                # Collected while shutting down: never decoded
+                self._fail(batch, RuntimeError("shutting down"))
+                return
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            try:
+                mel = torch.stack([w.mel for w in batch]).to(self.model.device)
+                results = whisper.decode(self.model, mel, options)
+                for window, result in zip(batch, results):
+                    window.future.set_result(result)
+            except Exception as e:
+                for window in batch:
+                    if not window.future.done():
+                        window.future.set_exception(e)
+
+            with self._lock:
+                self._pending -= len(batch)
+                self._batches += 1
+                self._windows += len(batch)
+                self._decode_time += time.perf_counter() - started
+
+    def _segments(self, window: _Window, result, tokenizer, first_id: int) -> List[Dict[str, Any]]:
+        """Turn the timestamp tokens of one decoded window into transcribe()-style segments"""
+        segments = []
+        start = None
+        text_tokens: List[int] = []
+
+        def add(end: float):
+            text = tokenizer.decode(text_tokens)
+            if text.strip():
+                segments.append({
+                    "id": first_id + len(segments),
+                    "seek": int(window.offset * 100),
+                    "start": round(window.offset + (start or 0.0), 2),
+                    "end": round(window.offset + min(end, window.duration), 2),
+                    "text": text,
+                    "tokens": list(text_tokens),
+                    "temperature": result.temperature,
+                    "avg_logprob": result.avg_logprob,
+                    "compression_ratio": result.compression_ratio,
+                    "no_speech_prob": result.no_speech_prob
+                })
+
+        for token in result.tokens:
+            if token >= tokenizer.timestamp_begin:
+                timestamp = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+                if text_tokens:
+                    add(timestamp)
+                    text_tokens = []
+                # A timestamp after text closes that segment; either way it is
+                # also the start of whatever text comes next
+                start = timestamp
+            else:
+                text_tokens.append(token)
+
+        if text_tokens:
+            add(window.duration)
+        return segments
+
+    async def transcribe(self, audio: np.ndarray) -> Dict[str, Any]:
+        """
+        Transcribe 16kHz mono audio through the shared batch queue.
+
+        Returns a dict shaped like ``model.transcribe`` output
+        (``text``, ``segments``, ``language``).
+        """
+        # Mel computation is cheap but not free for long recordings
+        loop = asyncio.get_running_loop()
+        windows = await loop.run_in_executor(None, self._split, audio)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("shutting down")
+            if self._pending + len(windows) > self.max_pending:
+                self._rejected += 1
+                raise QueueFullError(f"Batch queue is full ({self._pending} windows pending)")
+            self._pending += len(windows)
+            # Under the lock, so shutdown cannot drain the queue in between
+            for window in windows:
+                self._queue.put(window)
+        results = await asyncio.gather(*(asyncio.wrap_future(w.future) for w in windows))
+
+        language = results[0].language if results else "en"
+        tokenizer = get_tokenizer(
+            self.model.is_multilingual,
+            num_languages=self.model.num_languages,
+            language=language,
+            task="transcribe"
+        )
+        segments = []
+        for window, result in zip(windows, results):
+            segments.extend(self._segments(window, result, tokenizer, len(segments)))
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": language
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batch_size": self.batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "pending_windows": self._pending,
+                "batches": self._batches,
+                "windows": self._windows,
+                "rejected": self._rejected,
+                "avg_batch_size": round(self._windows / self._batches, 2) if self._batches else 0.0,
+                "avg_batch_ms": round(1000 * self._decode_time / self._batches, 1) if self._batches else 0.0,
+                "window_seconds": CHUNK_LENGTH
+            }
+
+    def shutdown(self):
+        """Stop the scheduler thread and fail every window still waiting to be decoded"""
+        with self._lock:
+            self._closed = True
+            queued = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    queued.append(item)
+            self._queue.put(None)
+        self._fail(queued, RuntimeError("shutting down"))
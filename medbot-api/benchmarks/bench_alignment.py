@@ -0,0 +1,91 @@
+"""
+Benchmark: speaker alignment for long, many-turn transcripts.
+
+Compares the original per-segment midpoint scan over every speaker turn
+(O(segments x turns)) with alignment.assign_speakers (per-word, binary
+search over layers of sorted turns). Needs only NumPy - no models are
+loaded. ``--covering-turn`` adds one turn spanning the whole recording (e.g.
+background speech diarized as one long turn), which overlaps every word.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_alignment.py --hours 1 2 4 --speakers 3
+    python benchmarks/bench_alignment.py --hours 1 4 --covering-turn
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alignment import assign_speakers  # noqa: E402
+
+
+def synthetic_transcript(hours: float, speakers: int, seed: int = 0, covering_turn: bool = False):
+    """Alternating speaker turns of 1-20 s and Whisper-like segments with word timings"""
+    rng = np.random.default_rng(seed)
+    total = hours * 3600
+
+    turns, t = [], 0.0
+    while t < total:
+        length = rng.uniform(1, 20)
+        turns.append({"start": t, "end": min(t + length, total), "speaker": f"SPEAKER_{rng.integers(speakers):02d}"})
+        t += length + rng.uniform(0, 0.5)
+    if covering_turn:
+        turns.insert(0, {"start": 0.0, "end": total, "speaker": "BACKGROUND"})
+
+    segments, t = [], 0.0
+    while t < total:
+        words, w = [], t
+        for _ in range(rng.integers(5, 25)):
+            length = rng.uniform(0.15, 0.6)
+            words.append({"word": " word", "start": w, "end": w + length})
+            w += length + rng.uniform(0, 0.1)
+        segments.append({"start": t, "end": w, "text": "".join(x["word"] for x in words), "words": words})
+        t = w + rng.uniform(0, 1)
+    return segments, turns
+
+
+def midpoint_scan(segments, turns):
+    """The alignment loop /transcribe/diarize used before alignment.py"""
+    result = []
+    for segment in segments:
+        mid = (segment["start"] + segment["end"]) / 2
+        speaker = "Unknown"
+        for turn in turns:
+            if turn["start"] <= mid <= turn["end"]:
+                speaker = turn["speaker"]
+                break
+        result.append({"start": segment["start"], "end": segment["end"], "text": segment["text"], "speaker": speaker})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[0.5, 1, 2, 4])
+    parser.add_argument("--speakers", type=int, default=3)
+    parser.add_argument("--covering-turn", action="store_true", help="add one turn spanning the recording")
+    args = parser.parse_args()
+
+    print(f"{'hours':>6} {'segments':>9} {'words':>8} {'turns':>7} {'midpoint scan':>14} {'indexed':>10} {'speedup':>8}")
+    for hours in args.hours:
+        segments, turns = synthetic_transcript(hours, args.speakers, covering_turn=args.covering_turn)
+        words = sum(len(s["words"]) for s in segments)
+
+        started = time.perf_counter()
+        midpoint_scan(segments, turns)
+        naive = time.perf_counter() - started
+
+        started = time.perf_counter()
+        assign_speakers(segments, turns)
+        indexed = time.perf_counter() - started
+
+        print(f"{hours:>6.1f} {len(segments):>9} {words:>8} {len(turns):>7} "
+              f"{naive:>13.3f}s {indexed:>9.3f}s {naive / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Latency and throughput benchmark for the API endpoints.
+
+Sends synthetic consultations (see synthetic_audio.py) of given lengths,
+upload formats and speaker counts to /transcribe, /transcribe/simple and
+/transcribe/diarize, and synthetic transcripts to /generate-clinical-note,
+at one or more concurrency levels. The note endpoint talks to the fake
+chat-completions server in fake_llm.py, so no API key is needed and the
+numbers do not depend on a remote service.
+
+For every scenario it reports p50/p95/p99 latency, realtime factor (p50
+latency / audio length), throughput and the peak RSS of the server process,
+and writes everything to a JSON file. Pass an earlier file to --compare to
+see what changed between two commits.
+
+By default the app is imported and driven in-process through an ASGI
+transport (its lifespan and model warm-up run as in a real server; the
+result cache is off so repeated runs measure the models). With --url it
+drives a running server instead; start that server with DO_AI_API_URL
+pointing at ``python benchmarks/fake_llm.py`` for the note endpoint, and
+pass --server-pid to record its peak RSS.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_api.py --endpoints transcribe diarize note --seconds 60 300 --concurrency 1 4
+    python benchmarks/bench_api.py --formats webm mp3 --speakers 2 3 --requests 16
+    python benchmarks/bench_api.py --url http://localhost:8000 --server-pid 12345
+    python benchmarks/bench_api.py --compare benchmarks/results/20260101-120000-abc1234.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from audio import SAMPLE_RATE  # noqa: E402
+from bench_notes import synthetic_transcript  # noqa: E402
+from fake_llm import FakeChatServer  # noqa: E402
+from synthetic_audio import FORMATS, encode, synthetic_consultation  # noqa: E402
+
+AUDIO_ENDPOINTS = {
+    "transcribe": "/transcribe",
+    "simple": "/transcribe/simple",
+    "diarize": "/transcribe/diarize"
+}
+NOTE_ENDPOINT = "/generate-clinical-note"
+
+# Server settings recorded with the results, so runs are only compared like for like
+CONFIG_VARIABLES = (
+    "WHISPER_BACKEND", "WHISPER_MODEL", "INFERENCE_WORKERS", "INFERENCE_QUEUE_SIZE",
+    "WHISPER_THREADS", "DIARIZATION_THREADS", "WHISPER_BATCHING", "LONG_AUDIO_PROCESSES",
+    "VAD_ENABLED", "RESULT_CACHE_ENABLED", "NOTE_MAX_CONCURRENCY", "NOTE_CHUNK_TOKENS"
+)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=BENCH_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb(server_pid: Optional[int]) -> Optional[float]:
+    """High-water RSS of the server: this process in-process, else VmHWM of --server-pid"""
+    if server_pid is None:
+        # ru_maxrss is in KB on Linux (bytes on macOS)
+        scale = 1 if sys.platform == "darwin" else 1024
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+    try:
+        with open(f"/proc/{server_pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+async def drive(client: httpx.AsyncClient, requests: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Send ``requests`` with at most ``concurrency`` in flight; latency per successful request"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def worker():
+        while not queue.empty():
+            request = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.post(**request)
+                statuses[str(response.status_code)] += 1
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "wall": time.perf_counter() - started, "statuses": dict(statuses)}
+
+
+def summarize(scenario: Dict[str, Any], run: Dict[str, Any], audio_seconds: Optional[float], rss: Optional[float]):
+    latencies, wall = run["latencies"], run["wall"]
+    p50 = percentile(latencies, 50)
+    return {
+        **scenario,
+        "requests": sum(run["statuses"].values()),
+        "ok": len(latencies),
+        "statuses": run["statuses"],
+        "p50_ms": p50,
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 1) if latencies else None,
+        "rtf": round(p50 / 1000 / audio_seconds, 4) if audio_seconds and p50 is not None else None,
+        "requests_per_second": round(len(latencies) / wall, 3),
+        "audio_seconds_per_second": round(len(latencies) * audio_seconds / wall, 2) if audio_seconds else None,
+        "wall_seconds": round(wall, 2),
+        "peak_rss_mb": rss
+    }
+
+
+def audio_requests(endpoint: str, seconds: float, audio_format: str, speakers: int, count: int, seed: int):
+    """``count`` different recordings, so neither the result cache nor the OS file cache flatters repeats"""
+    return [
+        {
+            "url": AUDIO_ENDPOINTS[endpoint],
+            "files": {"file": (f"consult.{audio_format}", encode(
+                synthetic_consultation(seconds, speakers, seed=seed + i), audio_format
+            ))}
+        }
+        for i in range(count)
+    ]
+
+
+def note_requests(minutes: float, count: int, seed: int):
+    requests = []
+    for i in range(count):
+        transcript = synthetic_transcript(minutes, seed=seed + i)
+        requests.append({"url": NOTE_ENDPOINT, "json": {"transcript": transcript, "formatted_transcript": transcript}})
+    return requests
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 1800):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/health/ready")
+            if response.status_code == 200:
+                return
+            if response.json().get("status") == "unhealthy":
+                raise RuntimeError(f"Server failed to start: {response.json()}")
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1)
+    raise RuntimeError("Server did not become ready in time")
+
+
+async def run_all(args, client: httpx.AsyncClient) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Run every scenario; returns the results and the server's health snapshot afterwards"""
+    await wait_until_ready(client)
+    results = []
+    header = (
+        f"{'endpoint':<10} {'sec':>5} {'fmt':>5} {'spk':>3} {'conc':>4} {'ok':>5} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RTF':>7} {'req/s':>7} {'RSS MB':>8}"
+    )
+    print(header)
+
+    def report(result: Dict[str, Any]):
+        results.append(result)
+        rtf = f"{result['rtf']:7.3f}" if result["rtf"] is not None else f"{'-':>7}"
+        print(
+            f"{result['endpoint']:<10} {result['seconds']:>5g} {result.get('format') or '-':>5} "
+            f"{result.get('speakers') or '-':>3} {result['concurrency']:>4} "
+            f"{result['ok']:>2}/{result['requests']:<2} {result['p50_ms'] or 0:9.0f} {result['p95_ms'] or 0:9.0f} "
+            f"{result['p99_ms'] or 0:9.0f} {rtf} {result['requests_per_second']:7.2f} {result['peak_rss_mb'] or 0:8.0f}"
+        )
+
+    seed = 0
+    for endpoint in args.endpoints:
+        for seconds in args.seconds:
+            combos = [(None, None)] if endpoint == "note" else [
+                (audio_format, speakers) for audio_format in args.formats for speakers in args.speakers
+            ]
+            for audio_format, speakers in combos:
+                for concurrency in args.concurrency:
+                    count = max(args.requests, concurrency)
+                    seed += count
+                    if endpoint == "note":
+                        requests = note_requests(seconds / 60, count + 1, seed)
+                    else:
+                        requests = audio_requests(endpoint, seconds, audio_format, speakers, count + 1, seed)
+                    # One untimed request first, so lazy loading is not counted
+                    await drive(client, requests[:1], 1)
+                    run = await drive(client, requests[1:], concurrency)
+                    scenario = {
+                        "endpoint": endpoint, "seconds": seconds, "format": audio_format,
+                        "speakers": speakers, "concurrency": concurrency
+                    }
+                    report(summarize(
+                        scenario, run, None if endpoint == "note" else seconds, peak_rss_mb(args.server_pid)
+                    ))
+    # Model, pool, cache and VAD state of the server, kept with the results
+    return results, (await client.get("/")).json()
+
+
+async def run_in_process(args) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    with FakeChatServer(
+        args.llm_port, prefill_ms_per_token=args.llm_prefill_ms, decode_ms_per_token=args.llm_decode_ms
+    ) as llm_url:
+        # Set before importing the app, which reads its configuration at import time
+        os.environ.setdefault("RESULT_CACHE_ENABLED", "0")
+        os.environ.setdefault("JOB_WORKERS", "0")
+        os.environ["DO_AI_API_URL"] = llm_url
+        os.environ["DO_AI_API_KEY"] = "bench"
+        import index
+
+        transport = httpx.ASGITransport(app=index.app)
+        async with index.lifespan(index.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://medbot", timeout=None) as client:
+                return await run_all(args, client)
+
+
+async def run_remote(args) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        return await run_all(args, client)
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    """Print the latency/throughput change of every scenario also present in the baseline"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def key(result):
+        return tuple(result.get(name) for name in ("endpoint", "seconds", "format", "speakers", "concurrency"))
+
+    previous = {key(result): result for result in baseline["results"]}
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    print(f"{'endpoint':<10} {'sec':>5} {'fmt':>5} {'spk':>3} {'conc':>4} {'p50':>8} {'p95':>8} {'req/s':>8} {'RSS':>8}")
+
+    def change(new, old):
+        if not new or not old:
+            return f"{'-':>8}"
+        return f"{100 * (new - old) / old:+7.1f}%"
+
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        print(
+            f"{result['endpoint']:<10} {result['seconds']:>5g} {result.get('format') or '-':>5} "
+            f"{result.get('speakers') or '-':>3} {result['concurrency']:>4} "
+            f"{change(result['p50_ms'], old['p50_ms'])} {change(result['p95_ms'], old['p95_ms'])} "
+            f"{change(result['requests_per_second'], old['requests_per_second'])} "
+            f"{change(result['peak_rss_mb'], old['peak_rss_mb'])}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", default=["transcribe", "simple", "diarize", "note"],
+                        choices=[*AUDIO_ENDPOINTS, "note"])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 300],
+                        help="Recording lengths (for note: length of the consultation transcript)")
+    parser.add_argument("--formats", nargs="+", default=["webm"], choices=list(FORMATS))
+    parser.add_argument("--speakers", type=int, nargs="+", default=[2])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--requests", type=int, default=8, help="Timed requests per scenario")
+    parser.add_argument("--url", help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, to record its peak RSS")
+    parser.add_argument("--llm-port", type=int, default=8765)
+    parser.add_argument("--llm-prefill-ms", type=float, default=0.5)
+    parser.add_argument("--llm-decode-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    started = datetime.now()
+    results, server = asyncio.run(run_remote(args) if args.url else run_in_process(args))
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{started:%Y%m%d-%H%M%S}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "started_at": started.isoformat(timespec="seconds"),
+                "mode": "remote" if args.url else "in-process",
+                "url": args.url,
+                "host": platform.node(),
+                "cpu_count": os.cpu_count(),
+                "python": platform.python_version(),
+                "sample_rate": SAMPLE_RATE,
+                "config": {} if args.url else {name: os.environ.get(name) for name in CONFIG_VARIABLES},
+                "server": server
+            },
+            "results": results
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
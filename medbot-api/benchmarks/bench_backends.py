@@ -0,0 +1,105 @@
+"""
+Benchmark Whisper backends: realtime factor and word error rate.
+
+Each sample is an audio file with a reference transcript next to it
+(``visit01.wav`` + ``visit01.txt``). No recordings ship with the repo since
+consult audio cannot be committed; point --samples at a local folder, e.g.
+a few LibriSpeech utterances or de-identified recordings.
+
+Realtime factor (RTF) is processing time / audio duration - lower is faster.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_backends.py --samples ~/medbot-samples \\
+        --backends openai-whisper openai-whisper-int8 faster-whisper --models base small
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import SAMPLE_RATE, decode_audio  # noqa: E402
+from backends import BACKENDS, load_backend  # noqa: E402
+
+AUDIO_SUFFIXES = {".wav", ".mp3", ".m4a", ".mp4", ".webm", ".ogg", ".flac"}
+
+
+def normalize(text: str):
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level Levenshtein distance divided by the reference length"""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_samples(directory: str):
+    samples = []
+    for path in sorted(Path(directory).expanduser().iterdir()):
+        reference = path.with_suffix(".txt")
+        if path.suffix.lower() in AUDIO_SUFFIXES and reference.exists():
+            samples.append((path.name, decode_audio(str(path)), reference.read_text()))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", required=True, help="Folder with audio files and matching .txt transcripts")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--models", nargs="+", default=["base"])
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads for faster-whisper (0 = default)")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    if not samples:
+        sys.exit(f"No audio files with matching .txt transcripts in {args.samples}")
+    total_audio = sum(len(audio) for _, audio, _ in samples) / SAMPLE_RATE
+    print(f"{len(samples)} samples, {total_audio:.0f} s of audio\n")
+
+    print(f"{'model':<34} {'load s':>7} {'RTF':>7} {'xRT':>7} {'WER':>7}")
+    for size in args.models:
+        for backend in args.backends:
+            try:
+                started = time.perf_counter()
+                engine = load_backend(backend, size, cpu_threads=args.threads)
+                load_time = time.perf_counter() - started
+            except Exception as e:
+                print(f"{backend + ':' + size:<34} skipped: {e}")
+                continue
+
+            # One short warm-up pass so first-call overhead is not measured
+            engine.transcribe(samples[0][1][:SAMPLE_RATE * 5])
+
+            processing, errors, words = 0.0, 0.0, 0
+            for _, audio, reference in samples:
+                started = time.perf_counter()
+                result = engine.transcribe(audio)
+                processing += time.perf_counter() - started
+                reference_words = len(normalize(reference))
+                errors += word_error_rate(reference, result["text"]) * reference_words
+                words += reference_words
+
+            rtf = processing / total_audio
+            wer = errors / words if words else 0.0
+            print(f"{engine.id:<34} {load_time:>7.1f} {rtf:>7.3f} {1 / rtf:>6.1f}x {wer:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Throughput of batch.py against scripting the HTTP API.
+
+Writes synthetic consultations (see synthetic_audio.py) to a temporary
+directory and processes them with the same models in two ways: the way a
+backfill script would, uploading them one at a time to /transcribe/diarize
+(in-process, through an ASGI transport, so there is no network in the
+numbers), and with batch.py's pipeline at each --concurrency. Prints wall
+time, aggregate realtime factor (wall time / audio duration) and recordings
+per minute. The result cache and encounter storage are off so every run
+does the same work.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_batch.py --files 8 --seconds 300
+    python benchmarks/bench_batch.py --files 16 --seconds 600 --format mp3 --concurrency 1 2 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import Response
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_audio import FORMATS, encode, synthetic_consultation  # noqa: E402
+
+
+async def run(args, recordings, audio_seconds: float):
+    # Set before importing the app, which reads its configuration at import time
+    os.environ["RESULT_CACHE_ENABLED"] = "0"
+    os.environ["ENCOUNTERS_ENABLED"] = "0"
+    os.environ.setdefault("JOB_WORKERS", "0")
+    os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+    import batch
+    import index
+    import telemetry
+    telemetry.min_log_level = telemetry.LOG_LEVELS["warning"]
+
+    options = {"model": None, "backend": None, "note": False, "speakers": {}, "clinician": None}
+    await batch.load_models("diarize", options)
+    # One untimed pass so neither run pays for first-call setup
+    audio, _ = batch.decode(recordings[0][1])
+    await index.process_recording(Response(), "diarize", options, audio, None, "batch")
+
+    runs = []
+    with open(os.devnull, "w") as output:
+        for concurrency in args.concurrency:
+            started = time.perf_counter()
+            progress = await batch.run_batch(
+                recordings, output, "diarize", options, args.decode_workers, args.prefetch, concurrency
+            )
+            if progress.failed:
+                print(f"WARNING: {progress.failed} recording(s) failed in the batch run")
+            runs.append((f"batch.py concurrency {concurrency}", time.perf_counter() - started))
+
+    transport = httpx.ASGITransport(app=index.app)
+    async with index.lifespan(index.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://medbot", timeout=None) as client:
+            started = time.perf_counter()
+            for name, path in recordings:
+                with open(path, "rb") as f:
+                    response = await client.post("/transcribe/diarize", files={"file": (name, f.read())})
+                response.raise_for_status()
+            runs.append(("HTTP, one file at a time", time.perf_counter() - started))
+
+    print(f"\n{'run':<28} {'wall s':>8} {'RTF':>7} {'xRT':>7} {'files/min':>9}")
+    for label, elapsed in runs:
+        rtf = elapsed / audio_seconds
+        print(f"{label:<28} {elapsed:8.1f} {rtf:7.3f} {1 / rtf:6.1f}x {len(recordings) / elapsed * 60:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=300, help="Length of each recording")
+    parser.add_argument("--format", default="webm", choices=list(FORMATS))
+    parser.add_argument("--speakers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--decode-workers", type=int, default=2)
+    parser.add_argument("--prefetch", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        recordings = []
+        for i in range(args.files):
+            name = f"consultation-{i:03d}.{args.format}"
+            path = os.path.join(directory, name)
+            with open(path, "wb") as f:
+                f.write(encode(synthetic_consultation(args.seconds, args.speakers, seed=i), args.format))
+            recordings.append((name, path))
+        print(f"{args.files} recordings of {args.seconds:g} s ({args.format}, {args.speakers} speakers)")
+        asyncio.run(run(args, recordings, args.files * args.seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Throughput benchmark: per-request model.transcribe vs BatchedWhisper.
+
+Runs the same set of clips through both paths with N concurrent requests and
+prints audio seconds processed per wall-clock second.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_batching.py --model base --requests 8 --seconds 60
+    python benchmarks/bench_batching.py --audio sample.wav --batch-size 16
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import whisper
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import SAMPLE_RATE  # noqa: E402
+from batching import BatchedWhisper  # noqa: E402
+
+
+def synthetic_clip(seconds: float, seed: int) -> np.ndarray:
+    """Amplitude-modulated harmonic tone with pauses - cheap stand-in for speech"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 60 * rng.random()
+    voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    syllables = (np.sin(2 * np.pi * 4 * t) > 0).astype(np.float32)
+    pauses = (np.sin(2 * np.pi * 0.2 * t + rng.random() * 6) > -0.5).astype(np.float32)
+    audio = 0.1 * voice * syllables * pauses + 0.005 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+
+def run_sequential(model, clips, workers: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda clip: model.transcribe(clip, fp16=False), clips))
+    return time.perf_counter() - started
+
+
+async def run_batched(engine: BatchedWhisper, clips) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(engine.transcribe(clip) for clip in clips))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--audio", help="Audio file to use for every request instead of synthetic clips")
+    parser.add_argument("--requests", type=int, default=8, help="Concurrent requests")
+    parser.add_argument("--seconds", type=float, default=60, help="Length of each synthetic clip")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="Threads for the per-request path")
+    args = parser.parse_args()
+
+    model = whisper.load_model(args.model)
+    if args.audio:
+        clips = [whisper.load_audio(args.audio)] * args.requests
+    else:
+        clips = [synthetic_clip(args.seconds, seed) for seed in range(args.requests)]
+    audio_seconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+
+    # Warm up kernels once so neither path pays for first-call overhead
+    model.transcribe(clips[0][:SAMPLE_RATE * 5], fp16=False)
+
+    sequential = run_sequential(model, clips, args.workers)
+    engine = BatchedWhisper(model, batch_size=args.batch_size, max_wait_ms=args.max_wait_ms)
+    batched = asyncio.run(run_batched(engine, clips))
+    engine.shutdown()
+
+    print(f"{args.requests} requests, {audio_seconds:.0f} s of audio, model '{args.model}'")
+    print(f"per-request : {sequential:8.2f} s  ({audio_seconds / sequential:6.2f}x realtime)")
+    print(f"batched     : {batched:8.2f} s  ({audio_seconds / batched:6.2f}x realtime)")
+    print(f"speedup     : {sequential / batched:8.2f}x")
+    print(f"batcher     : {engine.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Write throughput and query latency of the encounter store.
+
+Fills a fresh store with synthetic diarized consultations (about one segment
+per 5 seconds of audio), once committing every encounter on its own and once
+through the batching writer, then times re-opening an encounter, listing a
+page and full-text searches against the filled store.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_encounters.py --encounters 2000 --minutes 20
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_notes import WORDS  # noqa: E402
+from encounters import EncounterStore  # noqa: E402
+
+QUERIES = ["knee pain", "ibuprofen", "menisc", "swelling morning stiffness", "follow up mri"]
+
+
+def synthetic_encounter(minutes: float, rng: random.Random) -> dict:
+    segments, start, speaker = [], 0.0, 0
+    while start < minutes * 60:
+        duration = rng.uniform(2, 8)
+        text = " ".join(rng.choice(WORDS) for _ in range(int(duration * 2.5))).capitalize() + "."
+        segments.append({"start": round(start, 2), "end": round(start + duration, 2), "text": text,
+                         "speaker": ("Clinician", "Patient")[speaker]})
+        start += duration + rng.uniform(0.2, 1.5)
+        speaker = 1 - speaker if rng.random() < 0.7 else speaker
+    full_text = " ".join(segment["text"] for segment in segments)
+    return {
+        "full_text": full_text,
+        "formatted_transcript": "\n\n".join(f"{s['speaker']}: {s['text']}" for s in segments),
+        "segments": segments,
+        "speakers": ["Clinician", "Patient"]
+    }
+
+
+def fill(store: EncounterStore, encounters: list, sync_each: bool) -> tuple:
+    """Total time to store everything, time a request spends per encounter, and the ids"""
+    started = time.perf_counter()
+    request_time, ids = 0.0, []
+    for encounter in encounters:
+        queued = time.perf_counter()
+        ids.append(store.add_encounter(encounter, "consult.webm", audio_seconds=encounter["segments"][-1]["end"]))
+        if sync_each:
+            store.sync()
+        request_time += time.perf_counter() - queued
+    store.sync()
+    return time.perf_counter() - started, request_time / len(encounters), ids
+
+
+def timed_ms(fn, repeat: int = 20) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encounters", type=int, default=1000)
+    parser.add_argument("--minutes", type=float, default=20, help="Length of each consultation")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    encounters = [synthetic_encounter(args.minutes, rng) for _ in range(args.encounters)]
+    segments = sum(len(encounter["segments"]) for encounter in encounters)
+    print(f"{args.encounters} encounters of {args.minutes:g} min, {segments} segments")
+
+    with tempfile.TemporaryDirectory() as directory:
+        single = EncounterStore(os.path.join(directory, "single"))
+        elapsed, per_request, _ = fill(single, encounters, sync_each=True)
+        single.close()
+        print(f"{'writer':<26} {'total s':>8} {'encounters/s':>13} {'ms per request':>15}")
+        print(f"{'write on request path':<26} {elapsed:8.2f} {args.encounters / elapsed:13.0f} {per_request * 1000:15.3f}")
+
+        store = EncounterStore(os.path.join(directory, "batched"))
+        elapsed, per_request, ids = fill(store, encounters, sync_each=False)
+        stats = store.stats()
+        print(
+            f"{'batched background writer':<26} {elapsed:8.2f} {args.encounters / elapsed:13.0f} "
+            f"{per_request * 1000:15.3f}  ({stats['batches']} batches)"
+        )
+
+        print(f"\n{'query':<48} {'median ms':>9} {'hits':>7}")
+        print(f"{'open one encounter':<48} {timed_ms(lambda: store.get_encounter(rng.choice(ids))):9.2f}")
+        print(f"{'list page (offset 0)':<48} {timed_ms(lambda: store.list_encounters(20, 0)):9.2f}")
+        print(f"{'list page (offset 500)':<48} {timed_ms(lambda: store.list_encounters(20, 500)):9.2f}")
+        for order in ("recent", "relevance"):
+            for query in QUERIES:
+                _, total = store.search_segments(query, 20, 0, order)
+                ms = timed_ms(lambda: store.search_segments(query, 20, 0, order))
+                print(f"{f'search {query!r} ({order})':<48} {ms:9.2f} {total:>7}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Speedup of chunk-parallel long-audio transcription against chunk count.
+
+Transcribes one long recording with a single ``model.transcribe`` call using
+all cores, then with ``ChunkedTranscriber`` split into 2, 4, 8... chunks on
+as many worker processes, the cores divided evenly between them. Each
+configuration runs once untimed first so process start-up and model loading
+are not counted.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_longform.py --model base --minutes 20 --chunks 2 4 8
+    python benchmarks/bench_longform.py --audio consult.wav --chunks 4 8 16
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from audio import SAMPLE_RATE, decode_audio  # noqa: E402
+from backends import load_backend  # noqa: E402
+from bench_batching import synthetic_clip  # noqa: E402
+from longform import ChunkedTranscriber  # noqa: E402
+
+
+def run_single(args, audio) -> float:
+    cores = os.cpu_count() or 1
+    torch.set_num_threads(cores)
+    model = load_backend(args.backend, args.model, cpu_threads=cores)
+    model.transcribe(audio[:SAMPLE_RATE * 5])
+    started = time.perf_counter()
+    model.transcribe(audio)
+    return time.perf_counter() - started
+
+
+async def run_chunked(args, audio, chunks: int) -> tuple:
+    transcriber = ChunkedTranscriber(
+        args.backend, args.model,
+        processes=chunks,
+        torch_threads=max(1, (os.cpu_count() or 1) // chunks)
+    )
+    try:
+        await transcriber.transcribe(audio, chunks=chunks)
+        started = time.perf_counter()
+        result = await transcriber.transcribe(audio, chunks=chunks)
+        return time.perf_counter() - started, len(result["segments"])
+    finally:
+        transcriber.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="openai-whisper")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--audio", help="Recording to transcribe instead of a synthetic one")
+    parser.add_argument("--minutes", type=float, default=20, help="Length of the synthetic recording")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[2, 4, 8])
+    args = parser.parse_args()
+
+    if args.audio:
+        audio = decode_audio(args.audio)
+    else:
+        audio = synthetic_clip(args.minutes * 60, seed=0)
+    audio_seconds = len(audio) / SAMPLE_RATE
+
+    single = run_single(args, audio)
+    print(f"{audio_seconds / 60:.1f} min of audio, {args.backend}:{args.model}, {os.cpu_count()} cores")
+    print(f"{'chunks':>6} {'wall s':>8} {'RTF':>6} {'speedup':>8} {'segments':>9}")
+    print(f"{1:>6} {single:8.1f} {single / audio_seconds:6.3f} {1.0:8.2f} {'-':>9}")
+    for chunks in args.chunks:
+        elapsed, segments = asyncio.run(run_chunked(args, audio, chunks))
+        print(f"{chunks:>6} {elapsed:8.1f} {elapsed / audio_seconds:6.3f} {single / elapsed:8.2f} {segments:>9}")
+
+
+if __name__ == "__main__":
+    main()
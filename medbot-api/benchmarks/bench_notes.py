@@ -0,0 +1,109 @@
+"""
+Benchmark clinical note generation: one request vs map-reduce over chunks.
+
+Runs against the fake chat-completions server in fake_llm.py, so no API key
+is needed and the numbers reflect the request pattern rather than a
+particular model. Consultations are synthetic two-speaker transcripts in the
+diarize endpoint's ``formatted_transcript`` format.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_notes.py --minutes 10 30 60 90
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm import FakeChatServer  # noqa: E402
+from llm import ChatAPIError, ChatClient  # noqa: E402
+from notes import chunk_transcript, estimate_tokens, extract_facts, merge_message  # noqa: E402
+
+WORDS = (
+    "knee pain swelling weeks walking stairs worse morning stiffness medial joint line "
+    "tenderness effusion range of motion flexion extension ligament stable x-ray "
+    "arthritis physiotherapy ibuprofen injection review follow up mri meniscus"
+).split()
+
+
+def synthetic_transcript(minutes: float, words_per_minute: int = 150, seed: int = 0) -> str:
+    """Alternating doctor/patient turns of 10-60 words"""
+    rng = random.Random(seed)
+    remaining = int(minutes * words_per_minute)
+    turns, speaker = [], 1
+    while remaining > 0:
+        length = min(remaining, rng.randint(10, 60))
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        turns.append(f"Person {speaker}: {sentence.capitalize()}.")
+        remaining -= length
+        speaker = 3 - speaker
+    return "\n\n".join(turns)
+
+
+def note_payload(message: str) -> dict:
+    return {
+        "model": "fake",
+        "messages": [{"role": "user", "content": message}],
+        "max_tokens": 2000
+    }
+
+
+async def single_call(client: ChatClient, transcript: str) -> float:
+    started = time.perf_counter()
+    await client.complete(note_payload(transcript))
+    return time.perf_counter() - started
+
+
+async def map_reduce(client: ChatClient, transcript: str, chunk_tokens: int) -> tuple:
+    started = time.perf_counter()
+    chunks = chunk_transcript(transcript, chunk_tokens)
+    if len(chunks) == 1:
+        # Same shortcut as the API: short transcripts go straight to the note request
+        await client.complete(note_payload(transcript))
+    else:
+        facts = await extract_facts(client, "fake", chunks)
+        await client.complete(note_payload(merge_message(facts)))
+    return time.perf_counter() - started, len(chunks)
+
+
+async def run(args, url: str):
+    client = ChatClient(url, api_key="test", max_concurrency=args.concurrency, max_retries=0, timeout=600)
+    print(f"{'minutes':>7} {'tokens':>7} {'single s':>9} {'chunks':>7} {'map-reduce s':>13}")
+    for minutes in args.minutes:
+        transcript = synthetic_transcript(minutes)
+        try:
+            single = f"{await single_call(client, transcript):9.1f}"
+        except ChatAPIError as e:
+            single = f"{'overflow' if e.status_code == 400 else e.status_code:>9}"
+        mapped, chunks = await map_reduce(client, transcript, args.chunk_tokens)
+        print(f"{minutes:>7g} {estimate_tokens(transcript):>7} {single} {chunks:>7} {mapped:>13.1f}")
+    await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 30, 60, 90])
+    parser.add_argument("--chunk-tokens", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=4, help="NOTE_MAX_CONCURRENCY")
+    parser.add_argument("--prefill-ms", type=float, default=0.5)
+    parser.add_argument("--decode-ms", type=float, default=5.0)
+    parser.add_argument("--context", type=int, default=16384)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with FakeChatServer(
+        args.port,
+        prefill_ms_per_token=args.prefill_ms,
+        decode_ms_per_token=args.decode_ms,
+        context_tokens=args.context
+    ) as url:
+        asyncio.run(run(args, url))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Serialization time and response size of /transcribe for long recordings.
+
+Builds a synthetic Whisper result (segments with tokens and decoder scores,
+like ``model.transcribe`` returns) and compares FastAPI's default path
+(``jsonable_encoder`` + ``json.dumps``) with orjson, ``?fields=`` and
+``?format=columnar``, each uncompressed, gzip and brotli.
+
+Usage (from medbot-api/):
+    python benchmarks/bench_payload.py --minutes 30 60 180
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payload import compress, encode_json, select_segments  # noqa: E402
+
+WORDS = "the knee has been painful for about three weeks mostly when walking up stairs".split()
+
+
+def synthetic_result(minutes: float, seed: int = 0) -> dict:
+    """Whisper-shaped result with one segment per ~5 seconds"""
+    rng = random.Random(seed)
+    segments, start = [], 0.0
+    while start < minutes * 60:
+        duration = rng.uniform(2, 8)
+        text = " " + " ".join(rng.choice(WORDS) for _ in range(int(duration * 2.5)))
+        segments.append({
+            "id": len(segments),
+            "seek": int(start * 100) // 3000 * 3000,
+            "start": round(start, 2),
+            "end": round(start + duration, 2),
+            "text": text,
+            "tokens": [rng.randint(50364, 51864)] + [rng.randint(0, 50000) for _ in text.split()] * 2,
+            "temperature": 0.0,
+            "avg_logprob": -rng.random(),
+            "compression_ratio": 1 + rng.random(),
+            "no_speech_prob": rng.random() / 10
+        })
+        start += duration
+    return {"text": "".join(s["text"] for s in segments), "segments": segments, "language": "en"}
+
+
+def body(result: dict, segments) -> dict:
+    return {
+        "success": True,
+        "filename": "consult.webm",
+        "transcription": result["text"],
+        "language": result["language"],
+        "segments": segments
+    }
+
+
+def timed(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - started)
+    return value, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[30, 60, 180])
+    args = parser.parse_args()
+
+    variants = {
+        "default (stdlib)": lambda r: json.dumps(
+            jsonable_encoder(body(r, r["segments"])), ensure_ascii=False, separators=(",", ":")
+        ).encode(),
+        "orjson full": lambda r: encode_json(body(r, r["segments"])),
+        "fields=start,end,text": lambda r: encode_json(body(r, select_segments(r["segments"], ["start", "end", "text"]))),
+        "format=columnar": lambda r: encode_json(body(r, select_segments(r["segments"], format="columnar")))
+    }
+
+    print(f"{'minutes':>7} {'variant':<22} {'encode ms':>9} {'raw KB':>8} {'gzip KB':>8} {'gzip ms':>8} {'br KB':>7} {'br ms':>6}")
+    for minutes in args.minutes:
+        result = synthetic_result(minutes)
+        for name, encode in variants.items():
+            raw, encode_ms = timed(lambda: encode(result))
+            (gzipped, _), gzip_ms = timed(lambda: compress(raw, "gzip"))
+            (brotlied, coding), br_ms = timed(lambda: compress(raw, "br"))
+            br = f"{len(brotlied) / 1024:7.1f} {br_ms:6.1f}" if coding == "br" else f"{'-':>7} {'-':>6}"
+            print(
+                f"{minutes:>7g} {name:<22} {encode_ms:9.1f} {len(raw) / 1024:8.1f} "
+                f"{len(gzipped) / 1024:8.1f} {gzip_ms:8.1f} {br}"
+            )
+
+
+if __name__ == "__main__":
+    main()
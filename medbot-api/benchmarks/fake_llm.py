@@ -0,0 +1,119 @@
+"""
+Local stand-in for the chat-completions API, for benchmarks and manual tests.
+
+Latency is modelled on a real deployment: a prefill cost per prompt token,
+then a decode cost per generated token (streamed as SSE when the request asks
+for it). Prompts longer than the context window get a 400, like the real API.
+The reply is filler text whose length grows with the prompt, up to
+``max_tokens``. Every request body is kept in ``app.state.bodies`` so tests
+can check what was sent.
+
+Run it standalone and point the API at it:
+    python benchmarks/fake_llm.py --port 8765
+    DO_AI_API_URL=http://127.0.0.1:8765/v1/chat/completions DO_AI_API_KEY=test python index.py
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHARS_PER_TOKEN = 4
+
+
+def create_app(
+    prefill_ms_per_token: float = 0.5,
+    decode_ms_per_token: float = 20.0,
+    context_tokens: int = 16384,
+    output_ratio: float = 0.25
+) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.bodies = []
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        app.state.bodies.append(body)
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // CHARS_PER_TOKEN
+        max_tokens = body.get("max_tokens", 2000)
+
+        if prompt_tokens + max_tokens > context_tokens:
+            return JSONResponse({"error": {
+                "code": "context_length_exceeded",
+                "message": f"This model's maximum context length is {context_tokens} tokens; "
+                           f"the request needs {prompt_tokens + max_tokens}"
+            }}, status_code=400)
+
+        output_tokens = max(16, min(max_tokens, int(prompt_tokens * output_ratio)))
+        await asyncio.sleep(prompt_tokens * prefill_ms_per_token / 1000)
+
+        if not body.get("stream"):
+            await asyncio.sleep(output_tokens * decode_ms_per_token / 1000)
+            return {
+                "model": body.get("model"),
+                "choices": [{"message": {"role": "assistant", "content": "note " * output_tokens}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": output_tokens}
+            }
+
+        async def events():
+            for _ in range(output_tokens):
+                await asyncio.sleep(decode_ms_per_token / 1000)
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': 'note '}}]})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class FakeChatServer:
+    """
+    Run the fake API on a background thread: ``with FakeChatServer(port) as url: ...``
+    Port 0 picks a free port. ``app`` serves another stand-in instead.
+    """
+
+    def __init__(self, port: int = 8765, app: Optional[FastAPI] = None, **latency):
+        self.port = port
+        self.app = app or create_app(**latency)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1/chat/completions"
+
+    def __enter__(self) -> str:
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        if self.port == 0:
+            self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self.url
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--prefill-ms", type=float, default=0.5, help="Milliseconds per prompt token")
+    parser.add_argument("--decode-ms", type=float, default=20.0, help="Milliseconds per generated token")
+    parser.add_argument("--context", type=int, default=16384, help="Context window in tokens")
+    args = parser.parse_args()
+
+    app = create_app(args.prefill_ms, args.decode_ms, args.context)
+    uvicorn.run(app, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Content-addressed cache for transcription and diarization results.
+
+Clinicians often submit the same recording more than once (``/transcribe``
+then ``/transcribe/diarize``, or a retry after the note step failed). Results
+are stored under a key derived from the decoded audio, the model name and
+the decode options, so a repeat submission skips inference entirely.
+
+Entries live in a single SQLite file as zlib-compressed JSON. The cache is
+bounded by total size (least recently used entries are evicted first) and
+by age (entries older than the TTL are ignored and purged).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def audio_fingerprint(audio: np.ndarray) -> str:
+    """Hash decoded samples; identical audio in any container gives the same key"""
+    return hashlib.blake2b(np.ascontiguousarray(audio).data, digest_size=20).hexdigest()
+
+
+def _json_default(value):
+    # Whisper results can contain NumPy scalars/arrays
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResultCache:
+    """On-disk LRU + TTL cache of JSON-serialisable results"""
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "results.sqlite3")
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self._evictions = 0
+
+    @staticmethod
+    def key(fingerprint: str, model_name: str, kind: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Cache key for one result of ``kind`` computed with ``model_name`` and ``options``"""
+        description = json.dumps([fingerprint, model_name, kind, options or {}], sort_keys=True)
+        return f"{kind}:{hashlib.sha256(description.encode()).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Any]:
+        kind = key.split(":", 1)[0]
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._misses[kind] = self._misses.get(kind, 0) + 1
+                return None
+            self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._hits[kind] = self._hits.get(kind, 0) + 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, value: Any):
+        blob = zlib.compress(json.dumps(value, default=_json_default).encode(), 6)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, kind, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, key.split(":", 1)[0], blob, len(blob), now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones until under the size budget"""
+        expired = self._db.execute(
+            "DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self._evictions += max(expired, 0)
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+            "SELECT key, size FROM results ORDER BY accessed_at"
+        ).fetchall():
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+            return {
+                "entries": entries,
+                "size_mb": round(size / (1024 * 1024), 2),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": dict(self._hits),
+                "misses": dict(self._misses),
+                "evictions": self._evictions
+            }
@@ -0,0 +1,423 @@
+"""
+Stored encounters: diarized transcripts and clinical notes, searchable.
+
+Every ``/transcribe/diarize`` result (and diarize job) is kept as an
+encounter with its speaker-labelled segments, and every generated clinical
+note is kept with the encounter it was written from. Segments and notes are
+indexed with SQLite FTS5, so finding "chest pain" across all past visits, or
+re-opening one, is a few milliseconds of SQLite instead of another upload
+and a full Whisper + pyannote run.
+
+Writes go through a queue to a single writer thread that commits whatever
+has accumulated (up to ``batch_size`` records, or ``max_wait_ms`` after the
+first) in one transaction, so a request never waits on a disk sync. Reads
+flush queued writes first, so a record can be read back as soon as the
+response that created it has been sent.
+
+Transcripts and notes are patient data; keep the retention in line with
+your data retention policy.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+# Words of context around a match in search snippets
+SNIPPET_TOKENS = 12
+
+# Result orders for searches. Relevance (bm25) has to score every match
+# before the first page comes back; recent reads the index newest first and
+# stops after one page, so it stays fast for common words.
+SEARCH_ORDERS = ("recent", "relevance")
+
+# Queue marker: write what has been collected without waiting out max_wait_ms
+_FLUSH = ("flush", {})
+
+
+def fts_query(text: str) -> str:
+    """
+    User input as an FTS5 query: every word must appear, the last one as a
+    prefix (so results show up while typing). Words are quoted, so FTS5
+    operators and punctuation in the input are matched literally.
+    """
+    words = [word.replace('"', '""') for word in text.split()]
+    if not words:
+        raise ValueError("Search query is empty")
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class EncounterStore:
+    """SQLite (FTS5) store of diarized transcripts and notes with a batching writer thread"""
+
+    def __init__(self, directory: str, batch_size: int = 64, max_wait_ms: float = 200):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "encounters.sqlite3")
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL makes NORMAL safe against corruption; a crash loses at most the last batch
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS encounters (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                source TEXT NOT NULL,
+                full_text TEXT NOT NULL,
+                formatted_transcript TEXT NOT NULL,
+                speakers TEXT NOT NULL,
+                clinician TEXT,
+                audio_seconds REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS encounters_created ON encounters (created_at, id);
+
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                encounter_id TEXT NOT NULL REFERENCES encounters (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                start REAL NOT NULL,
+                end REAL NOT NULL,
+                speaker TEXT,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS segments_encounter ON segments (encounter_id, position);
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+                text, content='segments', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+                INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+                INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END;
+
+            CREATE TABLE IF NOT EXISTS notes (
+                id TEXT PRIMARY KEY,
+                encounter_id TEXT REFERENCES encounters (id) ON DELETE CASCADE,
+                clinical_note TEXT NOT NULL,
+                model TEXT,
+                chunks INTEGER,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS notes_encounter ON notes (encounter_id, created_at);
+            CREATE INDEX IF NOT EXISTS notes_created ON notes (created_at);
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                clinical_note, content='notes', content_rowid='rowid', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+                INSERT INTO notes_fts (rowid, clinical_note) VALUES (new.rowid, new.clinical_note);
+            END;
+            CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts (notes_fts, rowid, clinical_note)
+                VALUES ('delete', old.rowid, old.clinical_note);
+            END;
+            """
+        )
+        self._queue: "queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = queue.Queue()
+        self._batches = 0
+        self._writes = 0
+        self._failed = 0
+        self._write_time = 0.0
+        self._thread = threading.Thread(target=self._run, name="encounter-writer", daemon=True)
+        self._thread.start()
+
+    # Writes (queued)
+
+    def add_encounter(
+        self,
+        result: Dict[str, Any],
+        filename: Optional[str] = None,
+        source: str = "request",
+        audio_seconds: Optional[float] = None
+    ) -> str:
+        """Queue a diarize result for storage and return its encounter id"""
+        encounter_id = uuid.uuid4().hex
+        self._queue.put(("encounter", {
+            "id": encounter_id,
+            "filename": filename,
+            "source": source,
+            "full_text": result["full_text"],
+            "formatted_transcript": result["formatted_transcript"],
+            "speakers": json.dumps(result["speakers"]),
+            "clinician": json.dumps(result.get("clinician")),
+            "audio_seconds": audio_seconds,
+            "created_at": time.time(),
+            "segments": result["segments"]
+        }))
+        return encounter_id
+
+    def add_note(self, note: Dict[str, Any], encounter_id: Optional[str] = None) -> str:
+        """Queue a generated clinical note for storage and return its id"""
+        note_id = uuid.uuid4().hex
+        self._queue.put(("note", {
+            "id": note_id,
+            "encounter_id": encounter_id,
+            "clinical_note": note["clinical_note"],
+            "model": note.get("model"),
+            "chunks": note.get("chunks"),
+            "created_at": time.time()
+        }))
+        return note_id
+
+    def _collect(self) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Block for the first record, then gather more until full, the wait
+        budget is spent or a reader asks for a flush. None means shut down.
+        """
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        deadline = 0.0
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if batch and remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining if batch else None)
+            except queue.Empty:
+                break
+            if item is None or item is _FLUSH:
+                self._queue.task_done()
+                if item is None:
+                    if not batch:
+                        return None
+                    self._queue.put(None)  # stop once this batch is written
+                if batch:
+                    break
+                continue
+            if not batch:
+                deadline = time.perf_counter() + self.max_wait
+            batch.append(item)
+        return batch
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        # Encounters first, so notes in the same batch can reference them
+        batch = sorted(batch, key=lambda item: item[0] != "encounter")
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for kind, record in batch:
+                    if kind == "encounter":
+                        segments = [
+                            (record["id"], position, segment["start"], segment["end"],
+                             segment.get("speaker"), segment["text"])
+                            for position, segment in enumerate(record.pop("segments"))
+                        ]
+                        self._db.execute(
+                            "INSERT INTO encounters (id, filename, source, full_text, formatted_transcript, "
+                            "speakers, clinician, audio_seconds, created_at) VALUES (:id, :filename, :source, "
+                            ":full_text, :formatted_transcript, :speakers, :clinician, :audio_seconds, :created_at)",
+                            record
+                        )
+                        self._db.executemany(
+                            "INSERT INTO segments (encounter_id, position, start, end, speaker, text) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            segments
+                        )
+                    else:
+                        # A note for an encounter deleted in the meantime is kept unlinked
+                        if record["encounter_id"] is not None and self._db.execute(
+                            "SELECT 1 FROM encounters WHERE id = ?", (record["encounter_id"],)
+                        ).fetchone() is None:
+                            record["encounter_id"] = None
+                        self._db.execute(
+                            "INSERT INTO notes (id, encounter_id, clinical_note, model, chunks, created_at) "
+                            "VALUES (:id, :encounter_id, :clinical_note, :model, :chunks, :created_at)",
+                            record
+                        )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                self._write(batch)
+                self._writes += len(batch)
+            except Exception as e:
+                self._failed += len(batch)
+                print(f"ERROR: Could not store {len(batch)} encounter record(s): {str(e)}")
+            self._batches += 1
+            self._write_time += time.perf_counter() - started
+            for _ in batch:
+                self._queue.task_done()
+
+    def sync(self):
+        """Write queued records now and wait until they are committed (or failed)"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    # Reads
+
+    def get_encounter(self, encounter_id: str) -> Optional[Dict[str, Any]]:
+        self.sync()
+        with self._lock:
+            row = self._db.execute("SELECT * FROM encounters WHERE id = ?", (encounter_id,)).fetchone()
+            if row is None:
+                return None
+            segments = self._db.execute(
+                "SELECT start, end, text, speaker FROM segments WHERE encounter_id = ? ORDER BY position",
+                (encounter_id,)
+            ).fetchall()
+            notes = self._db.execute(
+                "SELECT id AS note_id, clinical_note, model, chunks, created_at FROM notes "
+                "WHERE encounter_id = ? ORDER BY created_at",
+                (encounter_id,)
+            ).fetchall()
+        encounter = self._summary(row)
+        encounter.update(
+            full_text=row["full_text"],
+            formatted_transcript=row["formatted_transcript"],
+            segments=[dict(segment) for segment in segments],
+            notes=[dict(note) for note in notes]
+        )
+        return encounter
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "encounter_id": row["id"],
+            "filename": row["filename"],
+            "source": row["source"],
+            "speakers": json.loads(row["speakers"]),
+            "clinician": json.loads(row["clinician"]) if row["clinician"] else None,
+            "audio_seconds": row["audio_seconds"],
+            "created_at": row["created_at"]
+        }
+
+    def list_encounters(self, limit: int, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Newest first, one page; returns the page and the total count"""
+        self.sync()
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM encounters").fetchone()[0]
+            rows = self._db.execute(
+                "SELECT e.*, (SELECT COUNT(*) FROM notes n WHERE n.encounter_id = e.id) AS notes "
+                "FROM encounters e ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        page = []
+        for row in rows:
+            summary = self._summary(row)
+            summary["preview"] = row["full_text"][:200]
+            summary["notes"] = row["notes"]
+            page.append(summary)
+        return page, total
+
+    @staticmethod
+    def _order(table: str, order: str) -> str:
+        if order not in SEARCH_ORDERS:
+            raise ValueError(f"Unknown order '{order}'. Available: {', '.join(SEARCH_ORDERS)}")
+        return "rank" if order == "relevance" else f"{table}.rowid DESC"
+
+    def search_segments(
+        self, text: str, limit: int, offset: int, order: str = "recent"
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Segments matching ``text`` (newest or best match first); returns the page and the total count"""
+        query = fts_query(text)
+        order_by = self._order("segments_fts", order)
+        self.sync()
+        with self._lock:
+            total = self._db.execute(
+                "SELECT COUNT(*) FROM segments_fts WHERE segments_fts MATCH ?", (query,)
+            ).fetchone()[0]
+            rows = self._db.execute(
+                f"""
+                SELECT s.encounter_id, s.position, s.start, s.end, s.speaker, s.text,
+                       snippet(segments_fts, 0, '[', ']', '...', {SNIPPET_TOKENS}) AS snippet,
+                       e.filename, e.created_at
+                FROM segments_fts
+                JOIN segments s ON s.id = segments_fts.rowid
+                JOIN encounters e ON e.id = s.encounter_id
+                WHERE segments_fts MATCH ?
+                ORDER BY {order_by} LIMIT ? OFFSET ?
+                """,
+                (query, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def search_notes(
+        self, text: str, limit: int, offset: int, order: str = "recent"
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Clinical notes matching ``text`` (newest or best match first); returns the page and the total count"""
+        query = fts_query(text)
+        order_by = self._order("notes_fts", order)
+        self.sync()
+        with self._lock:
+            total = self._db.execute(
+                "SELECT COUNT(*) FROM notes_fts WHERE notes_fts MATCH ?", (query,)
+            ).fetchone()[0]
+            rows = self._db.execute(
+                f"""
+                SELECT n.id AS note_id, n.encounter_id, n.model, n.created_at,
+                       snippet(notes_fts, 0, '[', ']', '...', {SNIPPET_TOKENS}) AS snippet
+                FROM notes_fts
+                JOIN notes n ON n.rowid = notes_fts.rowid
+                WHERE notes_fts MATCH ?
+                ORDER BY {order_by} LIMIT ? OFFSET ?
+                """,
+                (query, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def get_note(self, note_id: str) -> Optional[Dict[str, Any]]:
+        self.sync()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id AS note_id, encounter_id, clinical_note, model, chunks, created_at "
+                "FROM notes WHERE id = ?",
+                (note_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def delete_encounter(self, encounter_id: str) -> bool:
+        """Delete an encounter with its segments and notes"""
+        self.sync()
+        with self._lock:
+            return self._db.execute("DELETE FROM encounters WHERE id = ?", (encounter_id,)).rowcount > 0
+
+    def purge(self, max_age_seconds: float) -> int:
+        """Delete encounters and unlinked notes older than ``max_age_seconds``"""
+        cutoff = time.time() - max_age_seconds
+        self.sync()
+        with self._lock:
+            removed = self._db.execute("DELETE FROM encounters WHERE created_at < ?", (cutoff,)).rowcount
+            self._db.execute("DELETE FROM notes WHERE encounter_id IS NULL AND created_at < ?", (cutoff,))
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            encounters = self._db.execute("SELECT COUNT(*) FROM encounters").fetchone()[0]
+            notes = self._db.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        return {
+            "encounters": encounters,
+            "notes": notes,
+            "pending_writes": self._queue.qsize(),
+            "batches": self._batches,
+            "writes": self._writes,
+            "failed": self._failed,
+            "avg_batch_ms": round(1000 * self._write_time / self._batches, 1) if self._batches else 0.0
+        }
@@ -1,23 +1,80 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import whisper
-import tempfile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import os
+import secrets
 from pathlib import Path
 import traceback
 from pyannote.audio import Pipeline
 import torch
 from dotenv import load_dotenv
-from pydub import AudioSegment
 import subprocess
-import requests
-from typing import Dict, Any
+import asyncio
+import json
+import time
+import threading
+import numpy as np
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from inference import InferenceExecutor, QueueFullError
+from audio import (
+    SAMPLE_RATE, StreamDecoder, EmptyUploadError, UploadTooLargeError,
+    decode_audio, decode_upload, save_upload, waveform_input
+)
+from streaming import LiveTranscriber
+from cache import ResultCache, audio_fingerprint
+from alignment import assign_speakers
+from backends import ModelRegistry, ProgressCallback, WhisperBackend
+from warmup import ModelStatus, warmup_audio
+from models import ModelManager
+from llm import ChatAPIError, ChatClient
+from notes import note_message
+from jobs import JOB_KINDS, JobProgress, JobStore, remove_audio, worker_id
+from longform import ChunkedTranscriber
+from vad import SpeechMap, VoiceActivityDetector
+from payload import FORMATS, json_response, parse_fields, select_segments
+from encounters import EncounterStore
+from speakers import CLINICIAN_ID_PATTERN, ClinicianStore, match_clinician, speaker_labels, split_diarization
+from telemetry import (
+    AUDIO_BYTES, AUDIO_SECONDS, CACHE_LOOKUPS, VAD_SKIPPED_SECONDS, RequestContextMiddleware,
+    gauge, log, metrics_response, observe_stage, register_collector, request_id, span
+)
 
 # Load environment variables from .env file
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background so the server can bind (and answer the
+    # liveness probe) right away; /health/ready turns 200 once they are warm
+    warmup_task = asyncio.create_task(warm_up()) if WARMUP_ON_STARTUP else None
+    job_tasks = start_job_workers(JOB_WORKERS)
+    if encounter_store and ENCOUNTER_RETENTION_DAYS > 0:
+        await run_in_threadpool(encounter_store.purge, ENCOUNTER_RETENTION_DAYS * 86400)
+    yield
+    for task in job_tasks:
+        task.cancel()
+    if warmup_task:
+        warmup_task.cancel()
+    # Drop queued inference jobs on shutdown instead of waiting for them
+    whisper_executor.shutdown()
+    diarization_executor.shutdown()
+    for batcher in list(batched_whispers.values()):
+        batcher.shutdown()
+    if long_audio:
+        long_audio.shutdown()
+    model_manager.shutdown()
+    if encounter_store:
+        # Commit queued transcripts and notes before exiting
+        await run_in_threadpool(encounter_store.close)
+    await note_client.aclose()
+
+
 # Initialize FastAPI app
-app = FastAPI(title="MedBot API", description="Medical Audio Transcription API")
+app = FastAPI(title="MedBot API", description="Medical Audio Transcription API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -28,32 +85,628 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load Whisper model (using 'base' model - you can change to 'tiny', 'small', 'medium', or 'large')
-print("Loading Whisper model...")
-model = whisper.load_model("base")
-print("Whisper model loaded successfully!")
+# Request ids, request latency metrics and one structured log line per request
+app.add_middleware(RequestContextMiddleware)
+
+# CPU threads for each model. The diarize endpoint runs Whisper and pyannote
+# at the same time, so the cores are split between them.
+cpu_count = os.cpu_count() or 2
+diarization_threads = int(os.environ.get("DIARIZATION_THREADS", str(max(1, cpu_count // 2))))
+whisper_threads = int(os.environ.get("WHISPER_THREADS", str(max(1, cpu_count - diarization_threads))))
 
-# Load Pyannote diarization pipeline
+# Whisper models are loaded through a registry so the backend and model size
+# can be chosen per deployment (WHISPER_BACKEND / WHISPER_MODEL) or per request
+# (?model=small&backend=faster-whisper) from the sizes in WHISPER_ALLOWED_MODELS.
+# Sizes: 'tiny', 'base', 'small', 'medium', 'large'
+whisper_registry = ModelRegistry(
+    default_backend=os.environ.get("WHISPER_BACKEND", "openai-whisper"),
+    default_size=os.environ.get("WHISPER_MODEL", "base"),
+    allowed_sizes=[size.strip() for size in os.environ.get("WHISPER_ALLOWED_MODELS", "").split(",") if size.strip()],
+    cpu_threads=whisper_threads
+)
+DIARIZATION_MODEL_NAME = "pyannote/speaker-diarization-3.1"
+
+# Models are not loaded at import time. With WARMUP_ON_STARTUP=1 (default) the
+# lifespan loads the default Whisper model and the diarization pipeline in the
+# background and runs a dummy pass through each; otherwise each model loads the
+# first time a request needs it.
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") == "1"
+models_ready = not WARMUP_ON_STARTUP
+model_status = ModelStatus()
+model_status.set("whisper", "not_loaded", whisper_registry.default_id)
+
+# Pyannote diarization pipeline
 # Note: Requires HuggingFace token with access to pyannote models
-print("Loading speaker diarization model...")
-try:
-    # Try to load with token from environment variable
-    hf_token = os.environ.get("HUGGINGFACE_TOKEN")
-    if hf_token:
-        diarization_pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
+hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+DIARIZATION_MODEL_ID = f"pyannote:{DIARIZATION_MODEL_NAME}"
+if hf_token:
+    model_status.set("diarization", "not_loaded", DIARIZATION_MODEL_NAME)
+else:
+    print("WARNING: HUGGINGFACE_TOKEN not found. Speaker diarization will not be available.")
+    print("To enable it, get a token from https://huggingface.co/settings/tokens")
+    print("and accept terms at https://huggingface.co/pyannote/speaker-diarization-3.1")
+    model_status.set("diarization", "disabled", "HUGGINGFACE_TOKEN not set")
+
+# A failed pipeline load (e.g. Hugging Face unreachable at startup) is retried
+# by the next request at most this often
+DIARIZATION_RETRY_SECONDS = float(os.environ.get("DIARIZATION_RETRY_SECONDS", "60"))
+_diarization_failed_at = 0.0
+
+_whisper_lock = threading.Lock()
+
+
+def model_unloaded(model_id: str, reason: str):
+    """Keep the load state and micro-batchers in step with the model manager"""
+    if model_id == DIARIZATION_MODEL_ID:
+        model_status.set("diarization", "not_loaded", f"unloaded ({reason})")
+        return
+    with _whisper_lock:
+        if model_id == whisper_registry.default_id:
+            model_status.set("whisper", "not_loaded", f"unloaded ({reason})")
+        batcher = batched_whispers.pop(model_id, None)
+    if batcher:
+        batcher.shutdown()
+
+
+# Loaded models are kept in LRU order within MODEL_MEMORY_BUDGET_MB (0 = no
+# limit): loading another model unloads the least recently used idle ones
+# first. Models unused for MODEL_IDLE_MINUTES (0 = never) are unloaded and load
+# again on their next use. Requests hold a reference while they run, so a
+# model is never unloaded under them.
+model_manager = ModelManager(
+    budget_bytes=int(float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0")) * 1024 * 1024),
+    idle_seconds=float(os.environ.get("MODEL_IDLE_MINUTES", "0")) * 60,
+    on_unload=model_unloaded
+)
+
+
+def acquire_whisper_model(backend: str, size: str) -> WhisperBackend:
+    """
+    Take a reference on a Whisper model (blocking), loading it within the
+    memory budget if needed; give it back with ``release_model``. Tracks the
+    default model's load state and starts micro-batching on it.
+    """
+    def load() -> WhisperBackend:
+        tracked = whisper_registry.model_id(backend, size) == whisper_registry.default_id
+        if tracked:
+            model_status.set("whisper", "loading", whisper_registry.default_id)
+        try:
+            model = whisper_registry.load(backend, size)
+        except Exception as e:
+            if tracked:
+                model_status.set("whisper", "failed", str(e))
+            raise
+        if tracked:
+            model_status.set("whisper", "loaded", model.id)
+        return model
+
+    model = model_manager.acquire(whisper_registry.model_id(backend, size), load)
+    if whisper_registry.is_default(model):
+        start_batching(model)
+    return model
+
+
+def start_batching(default_model: WhisperBackend):
+    """Start micro-batching on the default model, once per model (WHISPER_BATCHING=1)"""
+    if os.environ.get("WHISPER_BATCHING", "0") != "1":
+        return
+    with _whisper_lock:
+        if default_model.id in batched_whispers:
+            return
+        if default_model.backend != "openai-whisper":
+            print(f"WARNING: WHISPER_BATCHING needs the openai-whisper backend; ignored for {default_model.id}")
+            return
+        from batching import BatchedWhisper
+        batcher = BatchedWhisper(
+            default_model.model,
+            batch_size=int(os.environ.get("WHISPER_BATCH_SIZE", "8")),
+            max_wait_ms=float(os.environ.get("WHISPER_BATCH_WAIT_MS", "50")),
+            torch_threads=whisper_threads
+        )
+        batched_whispers[default_model.id] = batcher
+        # The batcher holds the model; keep it loaded while it is the default
+        model_manager.pin(default_model.id)
+        print(f"Whisper micro-batching enabled for {default_model.id} (batch size {batcher.batch_size})")
+
+
+def diarization_unavailable() -> bool:
+    """No token, or the last load failed less than DIARIZATION_RETRY_SECONDS ago"""
+    state = model_status.state("diarization")
+    return state == "disabled" or (
+        state == "failed" and time.monotonic() - _diarization_failed_at < DIARIZATION_RETRY_SECONDS
+    )
+
+
+def acquire_diarization_pipeline() -> Optional[Pipeline]:
+    """
+    Take a reference on the diarization pipeline (blocking), loading it if
+    needed; None if it is unavailable. Give it back with ``release_model``.
+    """
+    global _diarization_failed_at
+    if diarization_unavailable():
+        return None
+
+    def load() -> Pipeline:
+        print("Loading speaker diarization model...")
+        model_status.set("diarization", "loading", DIARIZATION_MODEL_NAME)
+        pipeline = Pipeline.from_pretrained(
+            DIARIZATION_MODEL_NAME,
             use_auth_token=hf_token
         )
+        if pipeline is None:
+            # pyannote returns None instead of raising when the token has no access
+            raise RuntimeError(
+                "access denied - accept the terms at https://huggingface.co/pyannote/speaker-diarization-3.1"
+            )
+        model_status.set("diarization", "loaded", DIARIZATION_MODEL_NAME)
         print("Speaker diarization model loaded successfully!")
-    else:
-        print("WARNING: HUGGINGFACE_TOKEN not found. Speaker diarization will not be available.")
-        print("To enable it, get a token from https://huggingface.co/settings/tokens")
-        print("and accept terms at https://huggingface.co/pyannote/speaker-diarization-3.1")
-        diarization_pipeline = None
-except Exception as e:
-    print(f"WARNING: Could not load diarization model: {str(e)}")
-    print("Speaker diarization will not be available.")
-    diarization_pipeline = None
+        return pipeline
+
+    try:
+        return model_manager.acquire(DIARIZATION_MODEL_ID, load)
+    except Exception as e:
+        print(f"WARNING: Could not load diarization model: {str(e)}")
+        print(f"Speaker diarization will not be available; retrying in {DIARIZATION_RETRY_SECONDS:.0f} s.")
+        _diarization_failed_at = time.monotonic()
+        model_status.set("diarization", "failed", str(e))
+        return None
+
+
+def release_model(*models):
+    """Give back models taken with ``acquire_whisper`` / ``acquire_diarization`` (None is skipped)"""
+    for model in models:
+        if model is not None:
+            model_manager.release(model)
+
+
+# Worker pools that run Whisper / pyannote off the event loop.
+# INFERENCE_WORKERS jobs run at once per model; INFERENCE_QUEUE_SIZE more may
+# wait before new requests are turned away with 503. Whisper and diarization
+# get separate pools so the diarize endpoint can run both at the same time.
+
+whisper_executor = InferenceExecutor(
+    max_workers=int(os.environ.get("INFERENCE_WORKERS", "1")),
+    max_queue=int(os.environ.get("INFERENCE_QUEUE_SIZE", "4")),
+    torch_threads=whisper_threads,
+    name="whisper"
+)
+diarization_executor = InferenceExecutor(
+    max_workers=int(os.environ.get("INFERENCE_WORKERS", "1")),
+    max_queue=int(os.environ.get("INFERENCE_QUEUE_SIZE", "4")),
+    torch_threads=diarization_threads,
+    name="diarization"
+)
+
+
+# Set for background jobs, which should queue behind interactive requests
+# rather than fail when the inference pools are full
+wait_for_inference: ContextVar[bool] = ContextVar("wait_for_inference", default=False)
+
+
+async def run_inference(
+    response: Response,
+    executor: InferenceExecutor,
+    stage: str,
+    fn: Callable,
+    *args,
+    **kwargs
+):
+    """
+    Run a blocking model call on one of the inference pools.
+
+    Rejects the request with 503 when the queue is full (background jobs wait
+    for space instead) and reports queue wait / run time for the stage in the
+    Server-Timing response header.
+    """
+    while True:
+        try:
+            result, timing = await executor.run(fn, *args, **kwargs)
+            break
+        except QueueFullError as e:
+            if not wait_for_inference.get():
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Server is busy: {str(e)}. Please retry shortly.",
+                    headers={"Retry-After": "10"}
+                )
+            await asyncio.sleep(1)
+
+    observe_stage(f"{stage}-queue", timing["queue_wait"], response)
+    observe_stage(stage, timing["run_time"], response)
+    return result
+
+
+# Optional micro-batching of /transcribe and /transcribe/simple across
+# requests, by model id; started on the default Whisper model once it is
+# loaded. After a swap the previous model keeps its batcher until it is
+# unloaded, so requests already queued on it finish.
+batched_whispers: Dict[str, Any] = {}
+
+
+def default_batcher():
+    return batched_whispers.get(whisper_registry.default_id)
+
+
+async def warm_up():
+    """
+    Load the default models and run one dummy pass through each, on the same
+    worker pools requests use, so the first real request does not pay for
+    weight loading, kernel selection or allocator growth.
+    """
+    global models_ready
+    print("Warming up models...")
+    started = time.perf_counter()
+    try:
+        whisper_model = await run_in_threadpool(acquire_whisper_model, *whisper_registry.resolve())
+        try:
+            await whisper_executor.run(whisper_model.transcribe, warmup_audio(2))
+        finally:
+            release_model(whisper_model)
+        model_status.set("whisper", "ready", whisper_model.id)
+    except Exception as e:
+        print(f"ERROR: Whisper warm-up failed: {str(e)}")
+        print(traceback.format_exc())
+        model_status.set("whisper", "failed", str(e))
+        return
+
+    pipeline = await run_in_threadpool(acquire_diarization_pipeline)
+    if pipeline is not None:
+        try:
+            await diarization_executor.run(pipeline, waveform_input(warmup_audio(5)))
+            model_status.set("diarization", "ready", DIARIZATION_MODEL_NAME)
+        except Exception as e:
+            # The pipeline loaded, so leave it usable and just report the problem
+            print(f"WARNING: Diarization warm-up failed: {str(e)}")
+        finally:
+            release_model(pipeline)
+
+    models_ready = True
+    print(f"Models ready in {time.perf_counter() - started:.1f} s")
+
+
+async def acquire_whisper(backend: Optional[str] = None, size: Optional[str] = None) -> WhisperBackend:
+    """
+    Resolve the Whisper model a request asked for and take a reference on
+    it, loading it if needed; the caller gives it back with ``release_model``
+    """
+    try:
+        backend, size = whisper_registry.resolve(backend, size)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    # Loading a model not used before can take a while; keep it off the event loop
+    try:
+        return await run_in_threadpool(acquire_whisper_model, backend, size)
+    except Exception as e:
+        log("model_load_failed", level="error", model=f"{backend}:{size}", error=str(e))
+        raise HTTPException(
+            status_code=503,
+            detail=f"Whisper model is not available: {str(e)}"
+        )
+
+
+async def acquire_diarization() -> Pipeline:
+    """
+    Take a reference on the diarization pipeline, loading it on first use;
+    503 if unavailable. The caller gives it back with ``release_model``.
+    """
+    pipeline = await run_in_threadpool(acquire_diarization_pipeline)
+    if pipeline is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Speaker diarization is not available. Please set HUGGINGFACE_TOKEN environment variable."
+        )
+    # Loaded by a request (after a failed warm-up or an unload) - it works
+    if model_status.state("diarization") != "ready":
+        model_status.set("diarization", "ready", DIARIZATION_MODEL_NAME)
+    return pipeline
+
+
+# Long-audio mode: recordings of at least LONG_AUDIO_MIN_MINUTES are cut at
+# pauses and the chunks transcribed in parallel on LONG_AUDIO_PROCESSES worker
+# processes with LONG_AUDIO_THREADS torch threads each (default model only).
+# Every process holds its own copy of the model. Off when LONG_AUDIO_PROCESSES=0.
+long_audio = None
+LONG_AUDIO_PROCESSES = int(os.environ.get("LONG_AUDIO_PROCESSES", "0"))
+LONG_AUDIO_MIN_SECONDS = float(os.environ.get("LONG_AUDIO_MIN_MINUTES", "10")) * 60
+if LONG_AUDIO_PROCESSES > 0:
+    long_audio = ChunkedTranscriber(
+        backend=whisper_registry.default_backend,
+        size=whisper_registry.default_size,
+        processes=LONG_AUDIO_PROCESSES,
+        torch_threads=int(os.environ.get("LONG_AUDIO_THREADS", str(max(1, cpu_count // LONG_AUDIO_PROCESSES)))),
+        min_chunk_seconds=float(os.environ.get("LONG_AUDIO_MIN_CHUNK_MINUTES", "2")) * 60
+    )
+
+
+def uses_long_audio(whisper_model: WhisperBackend, audio: np.ndarray) -> bool:
+    """
+    Chunk-parallel transcription covers recordings past the length threshold
+    on the model the long-audio processes load (the startup default)
+    """
+    return (
+        long_audio is not None
+        and (whisper_model.backend, whisper_model.size) == (long_audio.backend, long_audio.size)
+        and len(audio) >= LONG_AUDIO_MIN_SECONDS * SAMPLE_RATE
+    )
+
+
+async def transcribe_long_audio(
+    response: Response,
+    audio: np.ndarray,
+    progress: Optional[ProgressCallback] = None,
+    **options
+) -> Dict[str, Any]:
+    """Transcribe a long recording as parallel chunks on the long-audio process pool"""
+    with span("whisper-chunked", response) as details:
+        while True:
+            try:
+                result = await long_audio.transcribe(audio, progress=progress, **options)
+                break
+            except QueueFullError as e:
+                if not wait_for_inference.get():
+                    raise HTTPException(
+                        status_code=503,
+                        detail=f"Server is busy: {str(e)}. Please retry shortly.",
+                        headers={"Retry-After": "30"}
+                    )
+                await asyncio.sleep(1)
+        details["segments"] = len(result["segments"])
+    return result
+
+
+def uses_batching(whisper_model: WhisperBackend, progress: Optional[ProgressCallback] = None) -> bool:
+    """Micro-batching covers the model(s) it was started on, and cannot report progress"""
+    return whisper_model.id in batched_whispers and progress is None
+
+
+async def transcribe_waveform(
+    response: Response,
+    whisper_model: WhisperBackend,
+    audio: np.ndarray,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Plain Whisper transcription of decoded audio, batched with other requests
+    when WHISPER_BATCHING is enabled and the default model is used, or split
+    across the long-audio pool for long recordings
+    """
+    if uses_long_audio(whisper_model, audio):
+        return await transcribe_long_audio(response, audio, progress)
+
+    if not uses_batching(whisper_model, progress):
+        return await run_inference(
+            response, whisper_executor, "whisper", whisper_model.transcribe, audio, progress=progress
+        )
+
+    with span("whisper-batched", response):
+        try:
+            return await batched_whispers[whisper_model.id].transcribe(audio)
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server is busy: {str(e)}. Please retry shortly.",
+                headers={"Retry-After": "10"}
+            )
+
+
+# Voice activity detection in front of Whisper and pyannote: pauses of at
+# least VAD_MIN_SILENCE_SECONDS are cut out before the models run and the
+# returned timestamps are mapped back onto the original recording
+vad = None
+if os.environ.get("VAD_ENABLED", "1") == "1":
+    vad = VoiceActivityDetector(
+        margin_db=float(os.environ.get("VAD_MARGIN_DB", "12")),
+        min_silence_seconds=float(os.environ.get("VAD_MIN_SILENCE_SECONDS", "1.5")),
+        pad_seconds=float(os.environ.get("VAD_PAD_SECONDS", "0.3"))
+    )
+
+
+def vad_settings() -> Optional[Dict[str, Any]]:
+    """VAD thresholds for cache keys: results from other speech regions are not reused"""
+    return vad.settings() if vad else None
+
+
+async def detect_speech(response: Response, audio: np.ndarray) -> Tuple[np.ndarray, Optional[SpeechMap]]:
+    """
+    The speech-only audio to send to the models and its map back to the
+    recording (None with VAD off). Reports the fraction of audio skipped in
+    the X-VAD-Skipped response header.
+    """
+    if vad is None:
+        return audio, None
+    with span("vad", response) as details:
+        speech_map = await run_in_threadpool(vad.detect, audio)
+        speech_audio = await run_in_threadpool(speech_map.compact, audio)
+        details.update(
+            speech_seconds=round(speech_map.speech_seconds, 1),
+            audio_seconds=round(len(audio) / SAMPLE_RATE, 1),
+            skipped_fraction=round(speech_map.skipped_fraction, 3)
+        )
+    response.headers["X-VAD-Skipped"] = f"{speech_map.skipped_fraction:.3f}"
+    VAD_SKIPPED_SECONDS.inc((len(audio) - speech_map.speech_samples) / SAMPLE_RATE)
+    return speech_audio, speech_map
+
+
+# Content-addressed cache of Whisper and diarization results. It stores
+# transcripts and speaker voice embeddings on disk - patient data - so it is
+# off unless RESULT_CACHE_ENABLED=1; keep the TTL within your retention policy.
+result_cache = None
+if os.environ.get("RESULT_CACHE_ENABLED", "0") == "1":
+    result_cache = ResultCache(
+        directory=os.environ.get("RESULT_CACHE_DIR", ".medbot-cache"),
+        max_bytes=int(os.environ.get("RESULT_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+        ttl_seconds=float(os.environ.get("RESULT_CACHE_TTL_HOURS", "168")) * 3600
+    )
+
+
+# Stored encounters (ENCOUNTERS_ENABLED=1): every diarized transcript and
+# clinical note is kept in SQLite with a full-text index, written in batches by
+# a background thread. They are patient data, so storage is off by default,
+# reading them back needs ADMIN_TOKEN and ENCOUNTER_RETENTION_DAYS (0 = keep)
+# purges old ones at startup.
+encounter_store = None
+ENCOUNTER_RETENTION_DAYS = float(os.environ.get("ENCOUNTER_RETENTION_DAYS", "0"))
+if os.environ.get("ENCOUNTERS_ENABLED", "0") == "1":
+    encounter_store = EncounterStore(os.environ.get("ENCOUNTER_DIR", ".medbot-encounters"))
+
+
+def store_encounter(result: Dict[str, Any], filename: Optional[str], audio: np.ndarray, source: str) -> Optional[str]:
+    """Queue a diarize result for storage; its encounter id, or None with storage off"""
+    if encounter_store is None:
+        return None
+    return encounter_store.add_encounter(result, filename, source, round(len(audio) / SAMPLE_RATE, 2))
+
+
+async def fingerprint_audio(audio: np.ndarray) -> Optional[str]:
+    """Hash of the decoded audio used as the cache key, or None with caching off"""
+    if result_cache is None:
+        return None
+    with span("fingerprint"):
+        return await run_in_threadpool(audio_fingerprint, audio)
+
+
+async def cached_result(
+    response: Response,
+    fingerprint: Optional[str],
+    kind: str,
+    model_name: str,
+    options: Dict[str, Any],
+    compute: Callable[[], Awaitable[Any]]
+) -> Any:
+    """
+    Return the cached ``kind`` result for this audio/model/options, or compute
+    and store it. Reports hit/miss per stage in the X-Cache response header.
+    """
+    if result_cache is None or fingerprint is None:
+        return await compute()
+
+    key = result_cache.key(fingerprint, model_name, kind, options)
+    value = await run_in_threadpool(result_cache.get, key)
+    status = "hit" if value is not None else "miss"
+    existing = response.headers.get("X-Cache")
+    response.headers["X-Cache"] = f"{existing}, {kind}={status}" if existing else f"{kind}={status}"
+    CACHE_LOOKUPS.labels(kind, status).inc()
+    log("cache", kind=kind, result=status)
+
+    if value is not None:
+        return value
+
+    value = await compute()
+    await run_in_threadpool(result_cache.put, key, value)
+    return value
+
+
+async def transcribe_result(
+    response: Response,
+    whisper_model: WhisperBackend,
+    audio: np.ndarray,
+    fingerprint: Optional[str],
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """Transcribe using Whisper, or reuse an earlier result for the same audio"""
+    async def transcribe() -> Dict[str, Any]:
+        speech, speech_map = await detect_speech(response, audio)
+        result = await transcribe_waveform(response, whisper_model, speech, progress)
+        return speech_map.restore_transcription(result) if speech_map else result
+
+    # Whether the long-audio pool runs depends on the speech-only length,
+    # known only after VAD on a miss, so it is not part of the key
+    result = await cached_result(
+        response, fingerprint, "whisper", whisper_model.id,
+        {
+            "word_timestamps": False,
+            "batched": uses_batching(whisper_model, progress),
+            "vad": vad_settings()
+        },
+        transcribe
+    )
+    
+    # Validate result
+    if not result or "text" not in result:
+        raise Exception("Transcription returned invalid result")
+    return result
+
+
+ALLOWED_EXTENSIONS = {".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".wav", ".webm", ".ogg"}
+
+# Uploads are rejected with 413 as soon as either limit is crossed while streaming
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "500")) * 1024 * 1024
+MAX_AUDIO_SECONDS = float(os.environ.get("MAX_AUDIO_MINUTES", "180")) * 60
+
+
+def validate_audio_file(file: UploadFile):
+    """Reject uploads whose extension is not a supported audio format"""
+    file_ext = Path(file.filename or "").suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file format. Allowed formats: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+        )
+
+
+async def read_upload_audio(response: Response, file: UploadFile) -> np.ndarray:
+    """
+    Stream an upload through ffmpeg into 16kHz mono samples.
+
+    Nothing is written to disk (except for mp4/m4a, which ffmpeg cannot read
+    from a pipe) and the raw upload is never held in memory as a whole, so
+    reading the upload and converting it are timed as one "decode" stage.
+    """
+    try:
+        with span("decode", response, filename=file.filename) as details:
+            audio, size = await decode_upload(file, MAX_UPLOAD_BYTES, MAX_AUDIO_SECONDS)
+            details.update(bytes=size, audio_seconds=round(len(audio) / SAMPLE_RATE, 1))
+    except EmptyUploadError:
+        raise HTTPException(
+            status_code=400,
+            detail="Uploaded file is empty"
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+
+    AUDIO_SECONDS.labels("upload").inc(len(audio) / SAMPLE_RATE)
+    AUDIO_BYTES.labels("upload").inc(size)
+    return audio
+
+
+def segment_selection(fields: Optional[str], response_format: str) -> Optional[List[str]]:
+    """Validate the ?fields= and ?format= options before any work is done"""
+    if response_format not in FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown format '{response_format}'. Available: {', '.join(FORMATS)}"
+        )
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+
+async def encode_response(request: Request, response: Response, content: Any) -> Response:
+    """Serialize and compress a response body off the event loop"""
+    with span("serialize"):
+        return await run_in_threadpool(json_response, request, response, content)
+
+
+NUM_SPEAKERS_DESCRIPTION = "Exact number of speakers, if known (e.g. 2 for clinician and patient)"
+CLINICIAN_DESCRIPTION = "Id of the enrolled clinician in the recording (default: match any enrolled clinician)"
+FIELDS_DESCRIPTION = "Comma-separated segment fields to return, e.g. start,end,text (default: all)"
+FORMAT_DESCRIPTION = "full (list of segment objects) or columnar (one array per field)"
+
+
+def readiness_status() -> str:
+    if model_status.state("whisper") == "failed":
+        return "unhealthy"
+    return "healthy" if models_ready else "starting"
 
 
 @app.get("/")
@@ -61,158 +714,273 @@ async def root():
     """Health check endpoint"""
     return {
         "message": "MedBot API is running",
-        "status": "healthy",
-        "whisper_model": "base"
+        "status": readiness_status(),
+        "whisper_model": whisper_registry.default_id,
+        "loaded_models": [model_id for model_id in model_manager.loaded() if model_id != DIARIZATION_MODEL_ID],
+        "models": model_status.snapshot(),
+        "memory": model_manager.stats(),
+        "inference": {
+            "whisper": whisper_executor.stats(),
+            "diarization": diarization_executor.stats()
+        },
+        "batching": default_batcher().stats() if default_batcher() else None,
+        "long_audio": long_audio.stats() if long_audio else None,
+        "vad": vad.stats() if vad else None,
+        "cache": result_cache.stats() if result_cache else None,
+        "speakers": clinician_store.stats(),
+        "encounters": encounter_store.stats() if encounter_store else None,
+        "clinical_note": note_client.stats(),
+        "jobs": job_store.stats()
     }
 
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and the event loop is responsive"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    """Readiness probe: 200 once the models are loaded and warmed up, 503 until then"""
+    status = readiness_status()
+    if status != "healthy":
+        response.status_code = 503
+    return {
+        "status": "ready" if status == "healthy" else status,
+        "models": model_status.snapshot()
+    }
+
+
+def snapshot_metrics():
+    """Gauges read from the same snapshots as the health endpoint, at scrape time"""
+    models = model_status.snapshot()
+    yield gauge(
+        "medbot_model_load_seconds", "Time it took to load each model",
+        {name: entry.get("load_seconds") for name, entry in models.items()}, "model"
+    )
+    yield gauge(
+        "medbot_model_warmup_seconds", "Time the warm-up pass took for each model",
+        {name: entry.get("warmup_seconds") for name, entry in models.items()}, "model"
+    )
+    yield gauge(
+        "medbot_model_ready", "1 once the model is loaded and warmed up",
+        {name: float(entry["state"] == "ready") for name, entry in models.items()}, "model"
+    )
+
+    pools = {"whisper": whisper_executor.stats(), "diarization": diarization_executor.stats()}
+    yield gauge("medbot_inference_queued", "Inference jobs waiting for a worker", {
+        name: stats["queued"] for name, stats in pools.items()
+    }, "pool")
+    yield gauge("medbot_inference_running", "Inference jobs running", {
+        name: stats["running"] for name, stats in pools.items()
+    }, "pool")
+    yield gauge("medbot_inference_rejected", "Requests turned away with 503 since start", {
+        name: stats["rejected"] for name, stats in pools.items()
+    }, "pool")
+    if default_batcher():
+        yield gauge(
+            "medbot_batching_pending_windows", "30 s windows waiting for a Whisper batch",
+            {None: default_batcher().stats()["pending_windows"]}
+        )
+    if long_audio:
+        yield gauge(
+            "medbot_long_audio_in_progress", "Recordings on the long-audio process pool",
+            {None: long_audio.stats()["in_progress"]}
+        )
+    yield gauge("medbot_note_requests_active", "Clinical note calls in flight", {None: note_client.stats()["active"]})
+    yield gauge("medbot_jobs", "Background jobs by status", job_store.stats(), "status")
+    memory = model_manager.stats()
+    yield gauge(
+        "medbot_model_memory_bytes", "Memory attributed to each resident model",
+        {model["id"]: model["size_mb"] * 1024 * 1024 for model in memory["models"]}, "model"
+    )
+    yield gauge(
+        "medbot_model_references", "Requests and sessions using each resident model",
+        {model["id"]: model["refs"] for model in memory["models"]}, "model"
+    )
+    if encounter_store:
+        yield gauge(
+            "medbot_encounter_pending_writes", "Encounter and note records waiting to be written",
+            {None: encounter_store.stats()["pending_writes"]}
+        )
+    if result_cache:
+        yield gauge("medbot_cache_size_bytes", "Size of the result cache", {
+            None: result_cache.stats()["size_mb"] * 1024 * 1024
+        })
+
+
+register_collector(snapshot_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return await run_in_threadpool(metrics_response)
+
+
+# Admin endpoints change what the server runs for everyone, the clinician
+# enroll/delete endpoints change whose voice is labelled Clinician, and the
+# encounter endpoints return patient data; they are off unless ADMIN_TOKEN is
+# set, and then need it in the X-Admin-Token header
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+
+def require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=403,
+            detail="This endpoint is disabled. Set ADMIN_TOKEN to enable it."
+        )
+    if token is None or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid admin token"
+        )
+
+
+@app.put("/admin/models/whisper")
+async def swap_whisper_model(
+    size: str = Query(..., description="Whisper model size to serve by default, e.g. small"),
+    backend: Optional[str] = Query(None, description="openai-whisper, openai-whisper-int8 or faster-whisper"),
+    unload_previous: bool = Query(True, description="Unload the previous default once no request uses it"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Switch the default Whisper model without a restart. The new model is
+    loaded and warmed up first; requests already running finish on the
+    previous one.
+    """
+    require_admin(x_admin_token)
+    backend = backend or whisper_registry.default_backend
+    try:
+        whisper_registry.check_backend(backend)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    previous = whisper_registry.default_id
+
+    started = time.perf_counter()
+    try:
+        whisper_model = await run_in_threadpool(acquire_whisper_model, backend, size)
+    except Exception as e:
+        log("model_load_failed", level="error", model=f"{backend}:{size}", error=str(e))
+        raise HTTPException(
+            status_code=400,
+            detail=f"Could not load Whisper model '{size}' ({backend}): {str(e)}"
+        )
+    try:
+        # Wait for a worker rather than fail when requests fill the pool
+        wait_for_inference.set(True)
+        await run_inference(Response(), whisper_executor, "warmup", whisper_model.transcribe, warmup_audio(2))
+        with _whisper_lock:
+            whisper_registry.set_default(backend, size)
+            if previous != whisper_model.id:
+                # A batcher on the previous default no longer needs to keep it loaded
+                model_manager.pin(previous, False)
+            model_status.set("whisper", "ready", whisper_model.id)
+        start_batching(whisper_model)
+    finally:
+        release_model(whisper_model)
+
+    unloaded = None
+    if unload_previous and previous != whisper_model.id:
+        unloaded = model_manager.unload(previous)
+    log("whisper_model_swapped", previous=previous, model=whisper_model.id, unloaded_previous=unloaded)
+    return {
+        "success": True,
+        "whisper_model": whisper_model.id,
+        "previous": previous,
+        # True: unloaded now, false: once in-flight requests finish, null: was not loaded
+        "previous_unloaded": unloaded,
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+@app.delete("/admin/models/{model_id:path}")
+async def unload_model(model_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Unload a resident model now, or as soon as no request uses it"""
+    require_admin(x_admin_token)
+    unloaded = await run_in_threadpool(model_manager.unload, model_id)
+    if unloaded is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Model '{model_id}' is not loaded. Loaded: {', '.join(model_manager.loaded()) or 'none'}"
+        )
+    return {"success": True, "id": model_id, "unloaded": unloaded, "pending": not unloaded}
+
+
 @app.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...)):
+async def transcribe_audio(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    model_size: Optional[str] = Query(None, alias="model", description="Whisper model size, e.g. base or small"),
+    backend: Optional[str] = Query(None, description="openai-whisper, openai-whisper-int8 or faster-whisper"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    response_format: str = Query("full", alias="format", description=FORMAT_DESCRIPTION)
+):
     """
     Transcribe audio file using Whisper
     
     Supported formats: mp3, mp4, mpeg, mpga, m4a, wav, webm
     """
     
-    # Validate file type
-    allowed_extensions = {".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".wav", ".webm", ".ogg"}
-    file_ext = Path(file.filename).suffix.lower()
-    
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file format. Allowed formats: {', '.join(allowed_extensions)}"
-        )
+    validate_audio_file(file)
+    selected_fields = segment_selection(fields, response_format)
+    whisper_model = await acquire_whisper(backend, model_size)
     
-    temp_file_path = None
     try:
-        # Read the file content
-        content = await file.read()
-        
-        # Validate file is not empty
-        if not content or len(content) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Uploaded file is empty"
-            )
+        audio = await read_upload_audio(response, file)
+        fingerprint = await fingerprint_audio(audio)
         
-        print(f"File size: {len(content)} bytes")
+        result = await transcribe_result(response, whisper_model, audio, fingerprint)
         
-        # Save uploaded file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Verify temp file exists and has content
-        if not os.path.exists(temp_file_path):
-            raise Exception("Failed to create temporary file")
-        
-        file_size = os.path.getsize(temp_file_path)
-        print(f"Transcribing file: {file.filename} (saved as {temp_file_path}, size: {file_size} bytes)")
-        
-        if file_size == 0:
-            raise Exception("Temporary file is empty")
-        
-        # Transcribe using Whisper
-        result = model.transcribe(temp_file_path, fp16=False)  # Explicitly disable FP16
-        
-        # Clean up temporary file
-        os.unlink(temp_file_path)
-        
-        # Validate result
-        if not result or "text" not in result:
-            raise Exception("Transcription returned invalid result")
-        
-        return {
+        return await encode_response(request, response, {
             "success": True,
             "filename": file.filename,
             "transcription": result["text"],
             "language": result.get("language", "unknown"),
-            "segments": result.get("segments", [])
-        }
+            "segments": select_segments(result.get("segments", []), selected_fields, response_format)
+        })
     
     except HTTPException:
         # Re-raise HTTP exceptions as-is
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
         raise
     
     except Exception as e:
-        print(f"ERROR: {str(e)}")
-        print(f"ERROR TYPE: {type(e).__name__}")
-        print(traceback.format_exc())
-        
-        # Clean up temporary file if it exists
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as cleanup_error:
-                print(f"Cleanup error: {str(cleanup_error)}")
+        log("error", level="error", error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
         
         raise HTTPException(
             status_code=500,
             detail=f"Transcription failed: {str(e)}"
         )
+    
+    finally:
+        release_model(whisper_model)
 
 
 @app.post("/transcribe/simple")
-async def transcribe_audio_simple(file: UploadFile = File(...)):
+async def transcribe_audio_simple(
+    response: Response,
+    file: UploadFile = File(...),
+    model_size: Optional[str] = Query(None, alias="model", description="Whisper model size, e.g. base or small"),
+    backend: Optional[str] = Query(None, description="openai-whisper, openai-whisper-int8 or faster-whisper")
+):
     """
     Transcribe audio file - returns only the text (simplified version)
     """
     
-    allowed_extensions = {".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".wav", ".webm", ".ogg"}
-    file_ext = Path(file.filename).suffix.lower()
+    validate_audio_file(file)
+    whisper_model = await acquire_whisper(backend, model_size)
     
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file format. Allowed formats: {', '.join(allowed_extensions)}"
-        )
-    
-    temp_file_path = None
     try:
-        # Read the file content
-        content = await file.read()
+        audio = await read_upload_audio(response, file)
+        fingerprint = await fingerprint_audio(audio)
         
-        # Validate file is not empty
-        if not content or len(content) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Uploaded file is empty"
-            )
-        
-        print(f"File size: {len(content)} bytes")
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Verify temp file exists and has content
-        if not os.path.exists(temp_file_path):
-            raise Exception("Failed to create temporary file")
-
-        print(f"Temp file path: {temp_file_path}")
-        
-        file_size = os.path.getsize(temp_file_path)
-        print(f"Transcribing file: {file.filename} (saved as {temp_file_path}, size: {file_size} bytes)")
-        
-        if file_size == 0:
-            raise Exception("Temporary file is empty")
-        
-        # Transcribe using Whisper
-        result = model.transcribe(temp_file_path, fp16=False)  # Explicitly disable FP16
-        
-        # Clean up temporary file
-        os.unlink(temp_file_path)
-        
-        # Validate result
-        if not result or "text" not in result:
-            raise Exception("Transcription returned invalid result")
+        result = await transcribe_result(response, whisper_model, audio, fingerprint)
         
         return {
             "text": result["text"]
@@ -220,248 +988,495 @@ async def transcribe_audio_simple(file: UploadFile = File(...)):
     
     except HTTPException:
         # Re-raise HTTP exceptions as-is
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
         raise
     
     except Exception as e:
-        print(f"ERROR: {str(e)}")
-        print(f"ERROR TYPE: {type(e).__name__}")
-        print(traceback.format_exc())
-        
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as cleanup_error:
-                print(f"Cleanup error: {str(cleanup_error)}")
+        log("error", level="error", error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
         
         raise HTTPException(
             status_code=500,
             detail=f"Transcription failed: {str(e)}"
         )
+    
+    finally:
+        release_model(whisper_model)
 
 
-@app.post("/transcribe/diarize")
-async def transcribe_with_diarization(file: UploadFile = File(...)):
+def pyannote_hook(progress: Optional[ProgressCallback]) -> Optional[Callable]:
     """
-    Transcribe audio file with speaker diarization
-    Returns transcription with speaker labels (Person 1, Person 2, etc.)
+    Pipeline hook that turns pyannote's per-step progress (segmentation, then
+    speaker embeddings) into one overall fraction
     """
-    
-    if diarization_pipeline is None:
+    if progress is None:
+        return None
+    # Share of the total diarization time each step roughly takes
+    spans = {"segmentation": (0.0, 0.4), "embeddings": (0.4, 0.95)}
+
+    def hook(step_name, step_artifact, file=None, total=None, completed=None):
+        if step_name in spans and total:
+            low, high = spans[step_name]
+            progress(low + (high - low) * completed / total)
+    return hook
+
+
+# Speaker-count hints for pyannote. Fixing or bounding the number of speakers
+# skips most of the clustering search; requests can override these defaults.
+DIARIZATION_MIN_SPEAKERS = os.environ.get("DIARIZATION_MIN_SPEAKERS")
+DIARIZATION_MAX_SPEAKERS = os.environ.get("DIARIZATION_MAX_SPEAKERS")
+
+
+def speaker_hints(
+    num_speakers: Optional[int] = None,
+    min_speakers: Optional[int] = None,
+    max_speakers: Optional[int] = None
+) -> Dict[str, int]:
+    """Validated pipeline keyword arguments for the requested speaker counts"""
+    if num_speakers is not None:
+        if min_speakers is not None or max_speakers is not None:
+            raise HTTPException(
+                status_code=400,
+                detail="Use either num_speakers or min_speakers/max_speakers, not both"
+            )
+        return {"num_speakers": num_speakers}
+    if min_speakers is None and max_speakers is None:
+        min_speakers = int(DIARIZATION_MIN_SPEAKERS) if DIARIZATION_MIN_SPEAKERS else None
+        max_speakers = int(DIARIZATION_MAX_SPEAKERS) if DIARIZATION_MAX_SPEAKERS else None
+    if min_speakers is not None and max_speakers is not None and min_speakers > max_speakers:
         raise HTTPException(
-            status_code=503,
-            detail="Speaker diarization is not available. Please set HUGGINGFACE_TOKEN environment variable."
+            status_code=400,
+            detail="min_speakers cannot be larger than max_speakers"
         )
-    
-    allowed_extensions = {".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".wav", ".webm", ".ogg"}
-    file_ext = Path(file.filename).suffix.lower()
-    
-    if file_ext not in allowed_extensions:
+    hints = {"min_speakers": min_speakers, "max_speakers": max_speakers}
+    return {name: value for name, value in hints.items() if value is not None}
+
+
+# Enrolled clinician voices. The diarized speaker whose embedding is closest
+# to an enrolled clinician (cosine similarity of at least
+# SPEAKER_MATCH_THRESHOLD) is labelled Clinician and the other speakers
+# Patient / Other N; without a match speakers stay Person 1, Person 2...
+clinician_store = ClinicianStore(os.environ.get("CLINICIAN_STORE_DIR", ".medbot-clinicians"))
+SPEAKER_MATCH_THRESHOLD = float(os.environ.get("SPEAKER_MATCH_THRESHOLD", "0.5"))
+MIN_ENROLLMENT_SECONDS = 10
+
+
+def check_clinician(clinician_id: Optional[str]):
+    """404 for a ?clinician= that has not been enrolled"""
+    if clinician_id is not None and clinician_store.get(clinician_id) is None:
         raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported file format. Allowed formats: {', '.join(allowed_extensions)}"
+            status_code=404,
+            detail=f"Clinician '{clinician_id}' is not enrolled"
         )
+
+
+def identify_clinician(
+    speaker_embeddings: Dict[str, List[float]],
+    clinician_id: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """The diarized speaker matching an enrolled clinician (only ``clinician_id`` if given), or None"""
+    match = match_clinician(speaker_embeddings, clinician_store.embeddings(clinician_id), SPEAKER_MATCH_THRESHOLD)
+    if match is not None:
+        match["name"] = clinician_store.get(match["id"])["name"]
+    return match
+
+
+async def diarize_waveform(
+    response: Response,
+    whisper_model: WhisperBackend,
+    pipeline: Pipeline,
+    audio: np.ndarray,
+    fingerprint: Optional[str],
+    progress: Optional[Callable[[str, float], None]] = None,
+    hints: Optional[Dict[str, int]] = None,
+    clinician_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Transcribe and diarize decoded audio and label the transcript by speaker.
+    ``progress`` is called with ("whisper" | "diarization", fraction done);
+    ``hints`` are speaker counts for pyannote (see ``speaker_hints``).
+    """
+    hints = hints or {}
+    def stage_progress(stage: str) -> Optional[ProgressCallback]:
+        if progress is None:
+            return None
+        return lambda fraction: progress(stage, fraction)
     
-    temp_file_path = None
-    try:
-        # Read the file content
-        content = await file.read()
-        
-        # Validate file is not empty
-        if not content or len(content) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Uploaded file is empty"
+    # Both models skip the same silences; detect them once, and only if one
+    # of the two results is not cached
+    speech_task: Optional[asyncio.Future] = None
+
+    async def speech() -> Tuple[np.ndarray, Optional[SpeechMap]]:
+        nonlocal speech_task
+        if speech_task is None:
+            speech_task = asyncio.ensure_future(detect_speech(response, audio))
+        return await speech_task
+    
+    # Steps 1 and 2 are independent until the merge, so run them at the
+    # same time on their own worker pools
+    async def transcribe() -> Dict[str, Any]:
+        speech_audio, speech_map = await speech()
+        if uses_long_audio(whisper_model, speech_audio):
+            result = await transcribe_long_audio(
+                response, speech_audio, stage_progress("whisper"), word_timestamps=True
             )
-        
-        print(f"File size: {len(content)} bytes")
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Verify temp file exists and has content
-        if not os.path.exists(temp_file_path):
-            raise Exception("Failed to create temporary file")
-        
-        file_size = os.path.getsize(temp_file_path)
-        print(f"Processing file: {file.filename} (saved as {temp_file_path}, size: {file_size} bytes)")
-        
-        if file_size == 0:
-            raise Exception("Temporary file is empty")
-        
-        # Convert to WAV format for pyannote compatibility
-        wav_file_path = None
-        try:
-            if not temp_file_path.endswith('.wav'):
-                print(f"Converting {file_ext} to WAV format for diarization...")
-                # Create WAV file path
-                wav_file_path = temp_file_path.rsplit('.', 1)[0] + '_converted.wav'
-                
-                # Convert using pydub (which uses ffmpeg)
-                audio = AudioSegment.from_file(temp_file_path)
-                audio = audio.set_channels(1)  # Convert to mono
-                audio = audio.set_frame_rate(16000)  # Set to 16kHz
-                audio.export(wav_file_path, format='wav')
-                
-                print(f"Converted to WAV: {wav_file_path}")
-                audio_path_for_diarization = wav_file_path
-            else:
-                audio_path_for_diarization = temp_file_path
-        except Exception as e:
-            print(f"Error converting audio: {str(e)}")
-            raise Exception(f"Failed to convert audio format: {str(e)}")
-        
-        # Step 1: Transcribe using Whisper (works with original file)
-        print("Transcribing audio...")
-        transcription_result = model.transcribe(temp_file_path, fp16=False, word_timestamps=True)
-        
-        # Step 2: Perform speaker diarization (use converted WAV)
-        print("Performing speaker diarization...")
-        diarization = diarization_pipeline(audio_path_for_diarization)
-        
-        # Step 3: Combine transcription segments with speaker labels
-        print("Combining transcription with speaker labels...")
-        
+        else:
+            result = await run_inference(
+                response, whisper_executor, "whisper",
+                whisper_model.transcribe, speech_audio, word_timestamps=True,
+                progress=stage_progress("whisper")
+            )
+        return speech_map.restore_transcription(result) if speech_map else result
+    
+    async def diarize() -> Dict[str, Any]:
+        speech_audio, speech_map = await speech()
+        output = await run_inference(
+            response, diarization_executor, "diarization",
+            pipeline, waveform_input(speech_audio), hook=pyannote_hook(stage_progress("diarization")),
+            return_embeddings=True, **hints
+        )
+        diarization, embeddings = split_diarization(output)
         # Create a list of speaker segments
-        speaker_segments = []
-        for turn, _, speaker in diarization.itertracks(yield_label=True):
-            speaker_segments.append({
-                "start": turn.start,
-                "end": turn.end,
-                "speaker": speaker
-            })
-        
-        # Map speakers to Person 1, Person 2, etc.
-        unique_speakers = sorted(set(seg["speaker"] for seg in speaker_segments))
-        speaker_map = {speaker: f"Person {i+1}" for i, speaker in enumerate(unique_speakers)}
-        
-        # Assign speakers to transcription segments
-        segments_with_speakers = []
-        for segment in transcription_result.get("segments", []):
-            segment_start = segment["start"]
-            segment_end = segment["end"]
-            segment_mid = (segment_start + segment_end) / 2
-            
-            # Find which speaker was talking at the midpoint of this segment
-            assigned_speaker = "Unknown"
-            for speaker_seg in speaker_segments:
-                if speaker_seg["start"] <= segment_mid <= speaker_seg["end"]:
-                    assigned_speaker = speaker_map[speaker_seg["speaker"]]
-                    break
-            
-            segments_with_speakers.append({
-                "start": segment_start,
-                "end": segment_end,
-                "text": segment["text"].strip(),
-                "speaker": assigned_speaker
-            })
-        
-        # Clean up temporary files
-        os.unlink(temp_file_path)
-        if wav_file_path and os.path.exists(wav_file_path):
-            os.unlink(wav_file_path)
+        turns = [
+            {"start": turn.start, "end": turn.end, "speaker": speaker}
+            for turn, _, speaker in diarization.itertracks(yield_label=True)
+        ]
+        return {
+            "turns": speech_map.restore_turns(turns) if speech_map else turns,
+            "embeddings": embeddings
+        }
+    
+    # Step 1: Transcribe using Whisper
+    # Step 2: Perform speaker diarization on the in-memory waveform
+    transcription_result, diarization = await asyncio.gather(
+        cached_result(
+            response, fingerprint, "whisper", whisper_model.id,
+            {"word_timestamps": True, "vad": vad_settings()},
+            transcribe
+        ),
+        cached_result(
+            response, fingerprint, "diarization", DIARIZATION_MODEL_NAME,
+            {"vad": vad_settings(), "embeddings": True, **hints}, diarize
+        )
+    )
+    speaker_segments = diarization["turns"]
+    
+    # Step 3: Combine transcription segments with speaker labels
+    with span("merge", response) as details:
+        # Label the enrolled clinician's voice Clinician and the others
+        # Patient / Other N, or Person 1, Person 2... without a match
+        clinician = identify_clinician(diarization["embeddings"], clinician_id)
+        speaker_map = speaker_labels(speaker_segments, clinician["speaker"] if clinician else None)
+        unique_speakers = list(speaker_map)
         
-        # Create formatted transcript
-        formatted_transcript = ""
-        current_speaker = None
-        current_text = []
+        # Assign speakers word by word (maximum overlap with the speaker turns),
+        # splitting Whisper segments where the speaker changes
+        segments_with_speakers = assign_speakers(
+            transcription_result.get("segments", []), speaker_segments, speaker_map
+        )
+        details.update(segments=len(segments_with_speakers), speakers=len(unique_speakers))
+    
+    # Create formatted transcript
+    formatted_transcript = ""
+    current_speaker = None
+    current_text = []
+    
+    for seg in segments_with_speakers:
+        if seg["speaker"] != current_speaker:
+            if current_speaker is not None:
+                formatted_transcript += f"{current_speaker}: {' '.join(current_text)}\n\n"
+            current_speaker = seg["speaker"]
+            current_text = [seg["text"]]
+        else:
+            current_text.append(seg["text"])
+    
+    # Add the last speaker's text
+    if current_speaker is not None:
+        formatted_transcript += f"{current_speaker}: {' '.join(current_text)}"
+    
+    return {
+        "full_text": transcription_result["text"],
+        "formatted_transcript": formatted_transcript.strip(),
+        "segments": segments_with_speakers,
+        "num_speakers": len(unique_speakers),
+        "speakers": list(speaker_map.values()),
+        "clinician": {key: clinician[key] for key in ("id", "name", "similarity")} if clinician else None
+    }
+
+
+@app.post("/transcribe/diarize")
+async def transcribe_with_diarization(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    model_size: Optional[str] = Query(None, alias="model", description="Whisper model size, e.g. base or small"),
+    backend: Optional[str] = Query(None, description="openai-whisper, openai-whisper-int8 or faster-whisper"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    response_format: str = Query("full", alias="format", description=FORMAT_DESCRIPTION),
+    num_speakers: Optional[int] = Query(None, ge=1, description=NUM_SPEAKERS_DESCRIPTION),
+    min_speakers: Optional[int] = Query(None, ge=1, description="Lower bound on the number of speakers"),
+    max_speakers: Optional[int] = Query(None, ge=1, description="Upper bound on the number of speakers"),
+    clinician: Optional[str] = Query(None, description=CLINICIAN_DESCRIPTION)
+):
+    """
+    Transcribe audio file with speaker diarization
+    Returns transcription with speaker labels: Clinician / Patient when an
+    enrolled clinician is recognised, otherwise Person 1, Person 2, etc.
+    """
+    
+    validate_audio_file(file)
+    selected_fields = segment_selection(fields, response_format)
+    hints = speaker_hints(num_speakers, min_speakers, max_speakers)
+    check_clinician(clinician)
+    pipeline = await acquire_diarization()
+    whisper_model = None
+    
+    try:
+        whisper_model = await acquire_whisper(backend, model_size)
         
-        for seg in segments_with_speakers:
-            if seg["speaker"] != current_speaker:
-                if current_speaker is not None:
-                    formatted_transcript += f"{current_speaker}: {' '.join(current_text)}\n\n"
-                current_speaker = seg["speaker"]
-                current_text = [seg["text"]]
-            else:
-                current_text.append(seg["text"])
+        # Decode once to 16kHz mono in memory; both models use the same samples
+        audio = await read_upload_audio(response, file)
         
-        # Add the last speaker's text
-        if current_speaker is not None:
-            formatted_transcript += f"{current_speaker}: {' '.join(current_text)}"
+        fingerprint = await fingerprint_audio(audio)
         
-        return {
+        result = await diarize_waveform(
+            response, whisper_model, pipeline, audio, fingerprint, hints=hints, clinician_id=clinician
+        )
+        result["encounter_id"] = store_encounter(result, file.filename, audio, "request")
+        result["segments"] = select_segments(result["segments"], selected_fields, response_format)
+        return await encode_response(request, response, {
             "success": True,
             "filename": file.filename,
-            "full_text": transcription_result["text"],
-            "formatted_transcript": formatted_transcript.strip(),
-            "segments": segments_with_speakers,
-            "num_speakers": len(unique_speakers),
-            "speakers": list(speaker_map.values())
-        }
+            **result
+        })
     
     except HTTPException:
         # Re-raise HTTP exceptions as-is
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
-        if 'wav_file_path' in locals() and wav_file_path and os.path.exists(wav_file_path):
-            try:
-                os.unlink(wav_file_path)
-            except:
-                pass
         raise
     
     except Exception as e:
-        print(f"ERROR: {str(e)}")
-        print(f"ERROR TYPE: {type(e).__name__}")
-        print(traceback.format_exc())
-        
-        # Clean up temporary files
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as cleanup_error:
-                print(f"Cleanup error: {str(cleanup_error)}")
-        if 'wav_file_path' in locals() and wav_file_path and os.path.exists(wav_file_path):
-            try:
-                os.unlink(wav_file_path)
-            except Exception as cleanup_error:
-                print(f"WAV cleanup error: {str(cleanup_error)}")
+        log("error", level="error", error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
         
         raise HTTPException(
             status_code=500,
             detail=f"Transcription with diarization failed: {str(e)}"
         )
+    
+    finally:
+        release_model(pipeline, whisper_model)
 
 
-@app.post("/generate-clinical-note")
-async def generate_clinical_note(data: Dict[Any, Any] = Body(...)):
+@app.post("/clinicians/{clinician_id}/enroll")
+async def enroll_clinician(
+    response: Response,
+    clinician_id: str,
+    file: UploadFile = File(...),
+    name: Optional[str] = Query(None, description="Display name"),
+    x_admin_token: Optional[str] = Header(None)
+):
     """
-    Generate a structured clinical note from transcription using AI
+    Enroll a clinician's voice from a recording of them speaking alone
+    (at least 10 seconds; 30-60 seconds works best). Enrolling again adds
+    another sample to the same clinician. Needs the admin token.
     """
+    require_admin(x_admin_token)
+    if not CLINICIAN_ID_PATTERN.match(clinician_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Clinician id may only contain letters, digits, '.', '_' and '-' (up to 64 characters)"
+        )
+    validate_audio_file(file)
+    audio = await read_upload_audio(response, file)
+    speech_audio, _ = await detect_speech(response, audio)
+    if len(speech_audio) < MIN_ENROLLMENT_SECONDS * SAMPLE_RATE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Enrollment needs at least {MIN_ENROLLMENT_SECONDS} seconds of speech"
+        )
     
+    pipeline = await acquire_diarization()
     try:
-        transcript = data.get("transcript", "")
-        formatted_transcript = data.get("formatted_transcript", "")
-        
-        if not transcript and not formatted_transcript:
-            raise HTTPException(
-                status_code=400,
-                detail="Transcript is required"
-            )
-        
-        # Use formatted transcript if available (with speaker labels), otherwise use plain transcript
-        input_text = formatted_transcript if formatted_transcript else transcript
-        
-        # Get API key from environment
-        do_api_key = os.environ.get("DO_AI_API_KEY")
-        if not do_api_key:
-            raise HTTPException(
-                status_code=500,
-                detail="DO_AI_API_KEY not configured in environment"
-            )
-        
-        # System prompt for clinical note generation
-        system_prompt = """You are a medical documentation assistant specializing in orthopedic consultations. Generate a structured clinical note following the SOAP format (Subjective, Objective, Assessment & Plan) based ONLY on information explicitly mentioned in the provided transcript. it shouldnt be just points and very brief. It should be a for    mal letter that we can email to the patient.
+        output = await run_inference(
+            response, diarization_executor, "diarization",
+            pipeline, waveform_input(speech_audio), num_speakers=1, return_embeddings=True
+        )
+    finally:
+        release_model(pipeline)
+    _, embeddings = split_diarization(output)
+    if not embeddings:
+        raise HTTPException(
+            status_code=422,
+            detail="Could not compute a voice embedding from this recording"
+        )
+    try:
+        embedding = next(iter(embeddings.values()))
+        clinician = await run_in_threadpool(clinician_store.enroll, clinician_id, embedding, name)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=str(e)
+        )
+    log("clinician_enrolled", clinician_id=clinician_id, samples=clinician["samples"])
+    return {"success": True, **clinician}
+
+
+@app.get("/clinicians")
+async def list_clinicians():
+    """Enrolled clinicians (without their embeddings)"""
+    return {"clinicians": await run_in_threadpool(clinician_store.list)}
+
+
+@app.delete("/clinicians/{clinician_id}")
+async def delete_clinician(clinician_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Remove a clinician's voice embedding (needs the admin token)"""
+    require_admin(x_admin_token)
+    if not await run_in_threadpool(clinician_store.remove, clinician_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Clinician '{clinician_id}' is not enrolled"
+        )
+    return {"success": True, "id": clinician_id}
+
+
+@app.websocket("/transcribe/stream")
+async def transcribe_stream(websocket: WebSocket):
+    """
+    Live transcription over WebSocket
+
+    The client sends binary audio chunks (e.g. MediaRecorder webm/opus with a
+    timeslice) as they are recorded and a text message "stop" when done.
+    The server replies with JSON messages:
+      {"type": "partial", "segments": [...]}  - current guess for the newest audio
+      {"type": "final", "segments": [...]}    - segments that will not change
+      {"type": "done", "text": "...", "duration": 123.4}
+      {"type": "error", "detail": "..."}
+    """
+    await websocket.accept()
+    try:
+        # Held for the whole session
+        whisper_model = await acquire_whisper()
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=1013)
+        return
+
+    async def transcribe_window(audio: np.ndarray, prompt: Optional[str]) -> Dict[str, Any]:
+        result, _ = await whisper_executor.run(
+            whisper_model.transcribe,
+            audio,
+            initial_prompt=prompt,
+            condition_on_previous_text=False
+        )
+        return result
+
+    transcriber = LiveTranscriber(
+        transcribe_window,
+        window_seconds=float(os.environ.get("STREAM_WINDOW_SECONDS", "30")),
+        step_seconds=float(os.environ.get("STREAM_STEP_SECONDS", "3"))
+    )
+    decoder = StreamDecoder()
+    finished = False
+    try:
+        await decoder.start()
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes"):
+                await decoder.feed(message["bytes"])
+                transcriber.add_audio(decoder.take())
+                if transcriber.ready():
+                    try:
+                        for event in await transcriber.step():
+                            await websocket.send_json(event)
+                    except QueueFullError:
+                        # Server is busy - keep buffering and retry once more audio has arrived
+                        log("live_pass_skipped", level="warning", reason="inference queue is full")
+
+            elif message.get("text") == "stop":
+                transcriber.add_audio(await decoder.finish())
+                finished = True
+
+                # The final passes must run, so wait for queue space instead of giving up
+                while transcriber.has_audio():
+                    try:
+                        events = await transcriber.step(final=True)
+                    except QueueFullError:
+                        await asyncio.sleep(0.5)
+                        continue
+                    for event in events:
+                        await websocket.send_json(event)
+
+                await websocket.send_json({
+                    "type": "done",
+                    "text": transcriber.committed_text,
+                    "duration": round(transcriber.duration, 2)
+                })
+                await websocket.close()
+                break
+
+    except WebSocketDisconnect:
+        log("live_disconnected")
+
+    except Exception as e:
+        log("error", level="error", error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
+        try:
+            await websocket.send_json({"type": "error", "detail": f"Live transcription failed: {str(e)}"})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+
+    finally:
+        if not finished:
+            await decoder.abort()
+        release_model(whisper_model)
+
+
+# Shared client for the clinical note LLM: keep-alive connection pool, at most
+# NOTE_MAX_CONCURRENCY generations at once, retries with jitter on 429/5xx
+CLINICAL_NOTE_MODEL = "openai-gpt-oss-20b"
+note_client = ChatClient(
+    url=os.environ.get("DO_AI_API_URL", "https://inference.do-ai.run/v1/chat/completions"),
+    api_key=os.environ.get("DO_AI_API_KEY"),
+    max_concurrency=int(os.environ.get("NOTE_MAX_CONCURRENCY", "4")),
+    max_retries=int(os.environ.get("NOTE_MAX_RETRIES", "3")),
+    timeout=float(os.environ.get("NOTE_TIMEOUT_SECONDS", "30"))
+)
+
+# Transcripts longer than NOTE_CHUNK_TOKENS (estimated) are split at speaker
+# turns; facts are extracted per chunk in parallel and merged in a final call
+NOTE_CHUNK_TOKENS = int(os.environ.get("NOTE_CHUNK_TOKENS", "4000"))
+NOTE_FACTS_MAX_TOKENS = int(os.environ.get("NOTE_FACTS_MAX_TOKENS", "800"))
+
+
+def clinical_note_input(data: Dict[Any, Any]) -> str:
+    """Validate a note request and return the transcript text to work from"""
+    transcript = data.get("transcript", "")
+    formatted_transcript = data.get("formatted_transcript", "")
+    
+    if not transcript and not formatted_transcript:
+        raise HTTPException(
+            status_code=400,
+            detail="Transcript is required"
+        )
+    
+    # Use formatted transcript if available (with speaker labels), otherwise use plain transcript
+    input_text = formatted_transcript if formatted_transcript else transcript
+    
+    # API key comes from the environment
+    if not note_client.api_key:
+        raise HTTPException(
+            status_code=500,
+            detail="DO_AI_API_KEY not configured in environment"
+        )
+    
+    return input_text
+
+
+def clinical_note_payload(user_message: str) -> Dict[str, Any]:
+    """Chat-completions payload that writes the note from ``user_message``"""
+    # System prompt for clinical note generation
+    system_prompt = """You are a medical documentation assistant specializing in orthopedic consultations. Generate a structured clinical note following the SOAP format (Subjective, Objective, Assessment & Plan) based ONLY on information explicitly mentioned in the provided transcript. it shouldnt be just points and very brief. It should be a for    mal letter that we can email to the patient.
 
 CRITICAL RULES:
 - ONLY include information explicitly mentioned in the transcript
@@ -504,63 +1519,584 @@ Additional Notes: (only if mentioned)
 
 Remember: If information is not in the transcript, completely omit that section. Do not use brackets, placeholders, or mention omissions."""
 
-        # Call DigitalOcean AI API
-        url = "https://inference.do-ai.run/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {do_api_key}"
-        }
-        payload = {
-            "model": "openai-gpt-oss-20b",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": f"Generate a clinical note from this consultation transcript:\n\n{input_text}"
-                }
-            ],
-            "max_tokens": 2000,
-            "temperature": 0.3  # Lower temperature for more consistent medical documentation
-        }
-        
-        print("Generating clinical note with AI...")
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        
-        if response.status_code != 200:
-            print(f"AI API Error: {response.status_code} - {response.text}")
+    payload = {
+        "model": CLINICAL_NOTE_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": user_message
+            }
+        ],
+        "max_tokens": 2000,
+        "temperature": 0.3  # Lower temperature for more consistent medical documentation
+    }
+    
+    return payload
+
+
+async def prepare_clinical_note(data: Dict[Any, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Build the final note request. Short transcripts go to the model as is;
+    long ones are chunked and reduced to extracted facts first.
+
+    Returns the payload and the number of transcript chunks used.
+    """
+    input_text = clinical_note_input(data)
+    user_message, chunks = await note_message(
+        note_client, CLINICAL_NOTE_MODEL, input_text, NOTE_CHUNK_TOKENS, NOTE_FACTS_MAX_TOKENS
+    )
+    return clinical_note_payload(user_message), chunks
+
+
+async def write_clinical_note(data: Dict[Any, Any]) -> Dict[str, Any]:
+    """Generate the note for a transcript; raises ChatAPIError on AI API errors"""
+    payload, chunks = await prepare_clinical_note(data)
+    with span("note") as details:
+        result = await note_client.complete(payload)
+        clinical_note = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+        details["characters"] = len(clinical_note)
+    
+    if not clinical_note:
+        raise Exception("No clinical note generated from AI")
+    
+    note = {
+        "clinical_note": clinical_note,
+        "model": CLINICAL_NOTE_MODEL,
+        "chunks": chunks
+    }
+    note["note_id"] = store_note(note, data)
+    return note
+
+
+@app.post("/generate-clinical-note")
+async def generate_clinical_note(data: Dict[Any, Any] = Body(...)):
+    """
+    Generate a structured clinical note from transcription using AI
+    """
+    
+    try:
+        try:
+            note = await write_clinical_note(data)
+        except ChatAPIError as e:
+            log("ai_api_error", level="error", status_code=e.status_code, detail=e.detail)
             raise HTTPException(
-                status_code=response.status_code,
-                detail=f"AI API error: {response.text}"
+                status_code=e.status_code,
+                detail=f"AI API error: {e.detail}"
             )
         
-        result = response.json()
-        print(result)
-        clinical_note = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        if not clinical_note:
-            raise Exception("No clinical note generated from AI")
-        
-        print("Clinical note generated successfully")
-        
         return {
             "success": True,
-            "clinical_note": clinical_note,
-            "model": "openai-gpt-oss-20b"
+            **note
         }
     
     except HTTPException:
         raise
     
     except Exception as e:
-        print(f"ERROR generating clinical note: {str(e)}")
-        print(traceback.format_exc())
+        log("error", level="error", error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate clinical note: {str(e)}"
+        )
+
+
+def store_note(note: Dict[str, Any], data: Dict[Any, Any]) -> Optional[str]:
+    """Queue a generated note for storage, linked to the request's encounter_id if any"""
+    if encounter_store is None:
+        return None
+    encounter_id = data.get("encounter_id")
+    return encounter_store.add_note(note, encounter_id if isinstance(encounter_id, str) else None)
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate-clinical-note/stream")
+async def generate_clinical_note_stream(data: Dict[Any, Any] = Body(...)):
+    """
+    Generate a clinical note and stream it as server-sent events
+
+    Events:
+      event: token  data: {"text": "..."}   - next piece of the note
+      event: done   data: {"model": "...", "chunks": n}  - generation finished
+      event: error  data: {"detail": "..."} - generation failed part way
+    Errors before the first token are returned as normal HTTP errors.
+    """
+    # Long transcripts are reduced to facts first; wait for that and the first
+    # token here so upstream failures still get a proper status code
+    try:
+        payload, chunks = await prepare_clinical_note(data)
+        started = time.perf_counter()
+        tokens = note_client.stream(payload)
+        first = await tokens.__anext__()
+        observe_stage("note-first-token", time.perf_counter() - started)
+    except StopAsyncIteration:
+        first = None
+    except HTTPException:
+        raise
+    except ChatAPIError as e:
+        log("ai_api_error", level="error", status_code=e.status_code, detail=e.detail)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"AI API error: {e.detail}"
+        )
+    except Exception as e:
+        log("error", level="error", error=str(e), error_type=type(e).__name__, traceback=traceback.format_exc())
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate clinical note: {str(e)}"
         )
+    
+    if first is None:
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate clinical note: No clinical note generated from AI"
+        )
+    
+    async def events():
+        try:
+            pieces = [first]
+            yield sse_event("token", {"text": first})
+            async for text in tokens:
+                pieces.append(text)
+                yield sse_event("token", {"text": text})
+            clinical_note = "".join(pieces)
+            observe_stage("note", time.perf_counter() - started, characters=len(clinical_note), streamed=True)
+            note_id = store_note({"clinical_note": clinical_note, "model": CLINICAL_NOTE_MODEL, "chunks": chunks}, data)
+            yield sse_event("done", {"model": CLINICAL_NOTE_MODEL, "chunks": chunks, "note_id": note_id})
+        except Exception as e:
+            log("error", level="error", error=str(e), error_type=type(e).__name__, stage="note")
+            yield sse_event("error", {"detail": f"Failed to generate clinical note: {str(e)}"})
+        finally:
+            # Closes the upstream connection if the client went away mid-note
+            await tokens.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Background jobs for long recordings. Uploads are kept in JOB_DIR until their
+# job finishes; JOB_WORKERS jobs run at once in this process (0 = leave them to
+# separate `python worker.py` processes sharing the same JOB_DIR).
+JOB_DIR = os.environ.get("JOB_DIR", ".medbot-jobs")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+JOB_RETENTION_HOURS = float(os.environ.get("JOB_RETENTION_HOURS", "168"))
+JOB_POLL_SECONDS = 2.0
+# Workers renew the lease on their running jobs every quarter lease; a job
+# whose lease runs out (its worker died without a trace) goes back in the queue
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "120"))
+job_store = JobStore(JOB_DIR)
+job_wakeup = asyncio.Event()
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job fields returned to clients"""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "stages": job["stages"],
+        "filename": job["filename"],
+        "options": job["options"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+        "result": job["result"]
+    }
+
+
+async def process_recording(
+    response: Response,
+    kind: str,
+    options: Dict[str, Any],
+    audio: np.ndarray,
+    filename: Optional[str],
+    source: str,
+    progress: Optional[Callable[[str, float], None]] = None
+) -> Dict[str, Any]:
+    """
+    Transcribe (``kind="transcribe"``) or transcribe and diarize decoded
+    audio with the job ``options``, plus the clinical note if asked for.
+    Shared by background jobs and the batch CLI (batch.py).
+    """
+    fingerprint = await fingerprint_audio(audio)
+    whisper_model = await acquire_whisper(options.get("backend"), options.get("model"))
+    pipeline = None
+
+    try:
+        if kind == "diarize":
+            pipeline = await acquire_diarization()
+            result = await diarize_waveform(
+                response, whisper_model, pipeline, audio, fingerprint, progress,
+                hints=options.get("speakers"), clinician_id=options.get("clinician")
+            )
+        else:
+            transcription = await transcribe_result(
+                response, whisper_model, audio, fingerprint,
+                (lambda fraction: progress("whisper", fraction)) if progress else None
+            )
+    finally:
+        # The note does not need the models
+        release_model(whisper_model, pipeline)
+
+    if kind == "diarize":
+        result["encounter_id"] = store_encounter(result, filename, audio, source)
+        note_input = {
+            "transcript": result["full_text"],
+            "formatted_transcript": result["formatted_transcript"],
+            "encounter_id": result["encounter_id"]
+        }
+    else:
+        result = {
+            "transcription": transcription["text"],
+            "language": transcription.get("language", "unknown"),
+            "segments": transcription.get("segments", [])
+        }
+        note_input = {"transcript": result["transcription"]}
+
+    if options.get("note"):
+        if progress:
+            progress("note", 0.0)
+        result["clinical_note"] = await write_clinical_note(note_input)
+
+    result["audio_seconds"] = round(len(audio) / SAMPLE_RATE, 2)
+    skipped = response.headers.get("X-VAD-Skipped")
+    result["vad_skipped"] = float(skipped) if skipped else None
+    result["timings"] = response.headers.get("Server-Timing")
+    return result
+
+
+async def run_job(job: Dict[str, Any]):
+    """Decode a job's audio and run the same pipeline as the synchronous endpoints"""
+    options = job["options"]
+    weights = {"decode": 0.05, "whisper": 0.9}
+    if job["kind"] == "diarize":
+        weights.update(whisper=0.45, diarization=0.45)
+    if options.get("note"):
+        weights["note"] = 0.1
+    progress = JobProgress(job_store, job["id"], weights)
+    # Wait for inference capacity instead of failing with 503
+    wait_for_inference.set(True)
+    # Log lines of the job carry its id in place of a request id
+    request_id.set(f"job-{job['id']}")
+    response = Response()  # collects Server-Timing for the job result
+
+    log("job_started", job_id=job["id"], kind=job["kind"], filename=job["filename"])
+    started = time.perf_counter()
+    try:
+        progress("decode", 0.0)
+        with span("decode", response, filename=job["filename"]):
+            audio = await run_in_threadpool(decode_audio, job["audio_path"], MAX_AUDIO_SECONDS)
+        AUDIO_SECONDS.labels("job").inc(len(audio) / SAMPLE_RATE)
+        progress("decode", 1.0)
+        result = await process_recording(response, job["kind"], options, audio, job["filename"], "job", progress)
+        await run_in_threadpool(job_store.finish, job["id"], result)
+        observe_stage(f"job-{job['kind']}", time.perf_counter() - started, job_id=job["id"])
+
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        log("job_failed", level="error", job_id=job["id"], error=detail, traceback=traceback.format_exc())
+        await run_in_threadpool(job_store.fail, job["id"], detail)
+
+    # Failed jobs are not retried, so their audio is not needed either. A
+    # cancelled (shutting down) job skips this and is requeued on restart.
+    remove_audio(job["audio_path"])
+
+
+async def job_worker(worker: str):
+    """Claim and run queued jobs until cancelled"""
+    while True:
+        job = await run_in_threadpool(job_store.claim, worker)
+        if job is None:
+            job_wakeup.clear()
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_job(job)
+
+
+async def job_leases(worker: str):
+    """Renew this process's job leases and requeue jobs whose lease has run out, until cancelled"""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 4)
+        try:
+            await run_in_threadpool(job_store.heartbeat, worker)
+            requeued = await run_in_threadpool(job_store.requeue_orphans, JOB_LEASE_SECONDS, worker)
+        except Exception as e:
+            log("job_lease_failed", level="error", error=str(e))
+            continue
+        if requeued:
+            log("jobs_requeued", level="warning", jobs=requeued, reason="lease expired")
+            job_wakeup.set()
+
+
+def start_job_workers(count: int) -> List[asyncio.Task]:
+    """Recover jobs interrupted by a restart and start ``count`` workers"""
+    worker = worker_id()
+    requeued = job_store.requeue_orphans(JOB_LEASE_SECONDS, worker)
+    purged = job_store.purge(JOB_RETENTION_HOURS * 3600)
+    if requeued or purged:
+        print(f"Jobs: {requeued} interrupted job(s) requeued, {purged} old job(s) removed")
+    if count <= 0:
+        return []
+    return [asyncio.create_task(job_leases(worker))] + [
+        asyncio.create_task(job_worker(worker)) for _ in range(count)
+    ]
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    kind: str = Query("diarize", description="transcribe or diarize"),
+    note: bool = Query(False, description="Also generate a clinical note"),
+    model_size: Optional[str] = Query(None, alias="model", description="Whisper model size, e.g. base or small"),
+    backend: Optional[str] = Query(None, description="openai-whisper, openai-whisper-int8 or faster-whisper"),
+    num_speakers: Optional[int] = Query(None, ge=1, description=NUM_SPEAKERS_DESCRIPTION),
+    min_speakers: Optional[int] = Query(None, ge=1, description="Lower bound on the number of speakers"),
+    max_speakers: Optional[int] = Query(None, ge=1, description="Upper bound on the number of speakers"),
+    clinician: Optional[str] = Query(None, description=CLINICIAN_DESCRIPTION)
+):
+    """
+    Queue a recording for background processing
+    Returns a job id at once; poll GET /jobs/{job_id} for progress and the result
+    """
+    
+    validate_audio_file(file)
+    if kind not in JOB_KINDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown job kind '{kind}'. Available: {', '.join(JOB_KINDS)}"
+        )
+    if kind == "diarize" and diarization_unavailable():
+        raise HTTPException(
+            status_code=503,
+            detail="Speaker diarization is not available. Please set HUGGINGFACE_TOKEN environment variable."
+        )
+    try:
+        backend, model_size = whisper_registry.resolve(backend, model_size)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    hints = speaker_hints(num_speakers, min_speakers, max_speakers)
+    check_clinician(clinician)
+    
+    audio_path = job_store.new_audio_path(Path(file.filename or "").suffix.lower())
+    try:
+        size = await save_upload(file, audio_path, MAX_UPLOAD_BYTES)
+    except EmptyUploadError:
+        raise HTTPException(
+            status_code=400,
+            detail="Uploaded file is empty"
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+    
+    job_id = await run_in_threadpool(
+        job_store.create, kind,
+        {"model": model_size, "backend": backend, "note": note, "speakers": hints, "clinician": clinician},
+        file.filename, audio_path
+    )
+    job_wakeup.set()
+    AUDIO_BYTES.labels("job").inc(size)
+    log("job_queued", job_id=job_id, kind=kind, filename=file.filename, bytes=size)
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events"
+    }
+
+
+async def load_job(job_id: str) -> Dict[str, Any]:
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found"
+        )
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    request: Request,
+    response: Response,
+    job_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    response_format: str = Query("full", alias="format", description=FORMAT_DESCRIPTION)
+):
+    """Status, progress and (once done) the result of a job"""
+    selected_fields = segment_selection(fields, response_format)
+    job = public_job(await load_job(job_id))
+    if job["result"] and "segments" in job["result"]:
+        job["result"]["segments"] = select_segments(job["result"]["segments"], selected_fields, response_format)
+    return await encode_response(request, response, job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Follow a job's progress as server-sent events
+
+    Events:
+      event: progress  data: {"stage": "...", "progress": 0.42, "stages": {...}}
+      event: done      data: <same as GET /jobs/{job_id}>
+      event: failed    data: <same as GET /jobs/{job_id}>
+    """
+    job = await load_job(job_id)
+    
+    async def events():
+        current = job
+        last = None
+        while True:
+            if current["status"] in ("done", "failed"):
+                yield sse_event(current["status"], public_job(current))
+                return
+            update = (current["stage"], current["progress"])
+            if update != last:
+                last = update
+                yield sse_event("progress", {
+                    "status": current["status"],
+                    "stage": current["stage"],
+                    "progress": current["progress"],
+                    "stages": current["stages"]
+                })
+            await asyncio.sleep(1)
+            current = await run_in_threadpool(job_store.get, job_id)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def require_encounter_store(token: Optional[str]) -> EncounterStore:
+    """The store for an admin request (stored encounters are patient data)"""
+    require_admin(token)
+    if encounter_store is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Encounter storage is disabled (ENCOUNTERS_ENABLED=0)"
+        )
+    return encounter_store
+
+
+def page_info(total: int, limit: int, offset: int) -> Dict[str, Any]:
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < total else None
+    }
+
+
+@app.get("/encounters")
+async def list_encounters(
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Stored encounters, newest first"""
+    store = require_encounter_store(x_admin_token)
+    encounters, total = await run_in_threadpool(store.list_encounters, limit, offset)
+    return {"encounters": encounters, **page_info(total, limit, offset)}
+
+
+@app.get("/encounters/search")
+async def search_encounters(
+    q: str = Query(..., min_length=1, description="Words to find; the last one also matches as a prefix"),
+    scope: str = Query("segments", description="segments (transcripts) or notes"),
+    order: str = Query("recent", description="recent (newest first, fastest) or relevance"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Full-text search over stored transcript segments or clinical notes.
+    Matches are marked with [brackets] in ``snippet``.
+    """
+    store = require_encounter_store(x_admin_token)
+    search = {"segments": store.search_segments, "notes": store.search_notes}.get(scope)
+    if search is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Unknown scope. Available: segments, notes"
+        )
+    try:
+        results, total = await run_in_threadpool(search, q, limit, offset, order)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    return {"query": q, "scope": scope, "order": order, "results": results, **page_info(total, limit, offset)}
+
+
+@app.get("/encounters/{encounter_id}")
+async def get_encounter(
+    request: Request,
+    response: Response,
+    encounter_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    response_format: str = Query("full", alias="format", description=FORMAT_DESCRIPTION),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """A stored encounter with its transcript segments and clinical notes"""
+    store = require_encounter_store(x_admin_token)
+    selected_fields = segment_selection(fields, response_format)
+    encounter = await run_in_threadpool(store.get_encounter, encounter_id)
+    if encounter is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Encounter not found"
+        )
+    encounter["segments"] = select_segments(encounter["segments"], selected_fields, response_format)
+    return await encode_response(request, response, encounter)
+
+
+@app.delete("/encounters/{encounter_id}")
+async def delete_encounter(encounter_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Delete an encounter with its transcript and notes"""
+    store = require_encounter_store(x_admin_token)
+    if not await run_in_threadpool(store.delete_encounter, encounter_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Encounter not found"
+        )
+    return {"success": True, "encounter_id": encounter_id}
+
+
+@app.get("/notes/{note_id}")
+async def get_note(note_id: str, x_admin_token: Optional[str] = Header(None)):
+    """A stored clinical note"""
+    store = require_encounter_store(x_admin_token)
+    note = await run_in_threadpool(store.get_note, note_id)
+    if note is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Note not found"
+        )
+    return note
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+"""
+Bounded worker pool for blocking model inference.
+
+Whisper and pyannote calls block the calling thread for the whole decode, so
+running them directly inside an ``async def`` handler freezes the event loop.
+``InferenceExecutor`` runs them on a fixed number of worker threads, keeps a
+bounded queue of waiting jobs and rejects new work once that queue is full.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import torch
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept more work"""
+
+
+class InferenceExecutor:
+    """
+    Run blocking inference calls on a thread pool with admission control.
+
+    Torch releases the GIL inside its kernels, so worker threads share the
+    loaded model weights instead of holding one copy per process.
+
+    ``torch_threads`` caps the intra-op threads used by this pool's workers.
+    Torch's OpenMP thread count is per calling thread, so two executors with
+    e.g. 8 and 8 threads can run side by side on a 16-core machine without
+    oversubscribing it.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_queue: int = 4,
+        torch_threads: Optional[int] = None,
+        name: str = "inference"
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.torch_threads = torch_threads
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name,
+            initializer=self._init_worker
+        )
+        self._lock = threading.Lock()
+        self._pending = 0  # queued + running jobs
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_queue_wait = 0.0
+        self._total_run_time = 0.0
+        self._max_queue_wait = 0.0
+
+    def _init_worker(self):
+        if self.torch_threads:
+            torch.set_num_threads(self.torch_threads)
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(
+                    f"Inference queue is full ({self._pending} jobs pending)"
+                )
+            self._pending += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _record(self, timing: Dict[str, float], failed: bool):
+        with self._lock:
+            self._running -= 1
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+            self._total_queue_wait += timing["queue_wait"]
+            self._total_run_time += timing["run_time"]
+            self._max_queue_wait = max(self._max_queue_wait, timing["queue_wait"])
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, float]]:
+        """
+        Run ``fn(*args, **kwargs)`` on a worker thread.
+
+        Returns the result together with ``{"queue_wait", "run_time"}`` in
+        seconds. Raises ``QueueFullError`` without queueing anything if the
+        pool and its queue are already full.
+        """
+        self._admit()
+        submitted = time.perf_counter()
+        timing = {"queue_wait": 0.0, "run_time": 0.0}
+
+        def call():
+            started = time.perf_counter()
+            timing["queue_wait"] = started - submitted
+            with self._lock:
+                self._running += 1
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                timing["run_time"] = time.perf_counter() - started
+                self._record(timing, failed)
+
+        try:
+            future = self._pool.submit(call)
+        except Exception:
+            self._release()
+            raise
+        # Release the slot when the job actually finishes (or is cancelled
+        # before starting), not when the awaiting request goes away.
+        future.add_done_callback(self._release)
+        result = await asyncio.wrap_future(future)
+        return result, timing
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue depth and timing counters"""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "workers": self.max_workers,
+                "torch_threads": self.torch_threads,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_queue_wait_ms": round(1000 * self._total_queue_wait / finished, 1) if finished else 0.0,
+                "max_queue_wait_ms": round(1000 * self._max_queue_wait, 1),
+                "avg_run_time_ms": round(1000 * self._total_run_time / finished, 1) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
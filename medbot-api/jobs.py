@@ -0,0 +1,271 @@
+"""
+Persistent job queue for long recordings.
+
+``POST /jobs`` stores the upload on disk and a job row in SQLite, and returns
+at once. Workers - asyncio tasks in the API process, or separate
+``python worker.py`` processes on the same machine - claim queued jobs, run
+the same transcription/diarization/note code as the synchronous endpoints
+and write progress and results back to the store, where ``GET /jobs/{id}``
+reads them.
+
+Jobs survive a restart. A worker renews a lease on its running jobs every
+few seconds (``heartbeat``); a job whose lease has expired - its worker was
+killed, its container restarted or its machine went away - is put back in
+the queue by any other worker. Jobs of a worker that certainly exited (on
+this machine) are requeued straight away, without waiting for the lease.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+JOB_KINDS = ("transcribe", "diarize")
+JOB_STATES = ("queued", "running", "done", "failed")
+
+
+# Unique to this run of the process: after a container restart the hostname
+# and pid usually come back the same (often pid 1), the token does not
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+
+def worker_id() -> str:
+    """Identifies this process in the ``worker`` column: host, pid and a token unique to this run"""
+    return f"{socket.gethostname()}:{os.getpid()}:{_PROCESS_TOKEN}"
+
+
+def _worker_exited(worker: Optional[str]) -> bool:
+    """
+    Whether the worker that claimed a job has certainly exited. Only provable
+    on this machine; otherwise (or if its pid is in use) the lease decides.
+    """
+    if not worker:
+        return True
+    # host:pid:token (host:pid before tokens were added)
+    host, _, rest = worker.partition(":")
+    pid = rest.split(":")[0]
+    if host != socket.gethostname():
+        return False
+    try:
+        pid = int(pid)
+    except ValueError:
+        return True
+    if pid == os.getpid():
+        # An earlier run with this pid; this run has its own token
+        return worker != worker_id()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    # Running, but possibly another process that got the same pid
+    return False
+
+
+class JobStore:
+    """SQLite-backed job table, safe to share between threads and processes"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.audio_dir = os.path.join(directory, "audio")
+        os.makedirs(self.audio_dir, exist_ok=True)
+        self.path = os.path.join(directory, "jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                options TEXT NOT NULL,
+                filename TEXT,
+                audio_path TEXT,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                stages TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at)")
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat_at" not in columns:
+            try:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            except sqlite3.OperationalError:
+                pass  # Added by another process in the meantime
+
+    def new_audio_path(self, suffix: str) -> str:
+        return os.path.join(self.audio_dir, f"{uuid.uuid4().hex}{suffix}")
+
+    def create(self, kind: str, options: Dict[str, Any], filename: str, audio_path: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, options, filename, audio_path, stage, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(options), filename, audio_path, time.time())
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job, or None if there is none"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', stage = 'starting', worker = ?, started_at = ?, "
+                    "heartbeat_at = ? WHERE id = ?",
+                    (worker, now, now, row["id"])
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row["id"], include_result=False)
+
+    def update_progress(self, job_id: str, stage: str, progress: float, stages: Dict[str, float]):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, stages = ? WHERE id = ? AND status = 'running'",
+                (stage, round(progress, 4), json.dumps(stages), job_id)
+            )
+
+    def finish(self, job_id: str, result: Dict[str, Any]):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', stage = 'done', progress = 1, result = ?, finished_at = ? "
+                "WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', stage = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (error, time.time(), job_id)
+            )
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if include_result and job["result"] else None
+        return job
+
+    def heartbeat(self, worker: str) -> int:
+        """Renew the lease on every job ``worker`` is running; returns how many"""
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND worker = ?",
+                (time.time(), worker)
+            ).rowcount
+
+    def requeue_orphans(self, lease_seconds: float, worker: Optional[str] = None) -> int:
+        """
+        Put back running jobs whose lease is older than ``lease_seconds`` or
+        whose worker has exited. Jobs of ``worker`` (the caller) are left alone.
+        """
+        expired = time.time() - lease_seconds
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, worker, COALESCE(heartbeat_at, started_at, 0) AS renewed "
+                    "FROM jobs WHERE status = 'running'"
+                ).fetchall()
+                orphans = [
+                    row["id"] for row in rows
+                    if row["worker"] != worker and (row["renewed"] < expired or _worker_exited(row["worker"]))
+                ]
+                for job_id in orphans:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'queued', stage = 'queued', progress = 0, stages = '{}', "
+                        "worker = NULL, started_at = NULL, heartbeat_at = NULL WHERE id = ?",
+                        (job_id,)
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(orphans)
+
+    def purge(self, max_age_seconds: float) -> int:
+        """Delete finished jobs (and any leftover audio) older than ``max_age_seconds``"""
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, audio_path FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (cutoff,)
+            ).fetchall()
+            for row in rows:
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        for row in rows:
+            remove_audio(row["audio_path"])
+        return len(rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {state: counts.get(state, 0) for state in JOB_STATES}
+
+
+class JobProgress:
+    """
+    Collects per-stage progress of one job (called from inference worker
+    threads) and writes the weighted overall fraction to the store. Writes are
+    skipped unless progress moved by at least ``min_step`` or the stage changed.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, weights: Dict[str, float], min_step: float = 0.01):
+        total = sum(weights.values())
+        self.store = store
+        self.job_id = job_id
+        self.weights = {stage: weight / total for stage, weight in weights.items()}
+        self.min_step = min_step
+        self.stages = {stage: 0.0 for stage in weights}
+        self._lock = threading.Lock()
+        self._stage = None
+        self._written = -1.0
+
+    def __call__(self, stage: str, fraction: float):
+        with self._lock:
+            self.stages[stage] = max(self.stages.get(stage, 0.0), min(fraction, 1.0))
+            overall = sum(self.weights.get(name, 0) * done for name, done in self.stages.items())
+            if stage == self._stage and overall - self._written < self.min_step and fraction < 1.0:
+                return
+            self._stage = stage
+            self._written = overall
+            stages = {name: round(done, 3) for name, done in self.stages.items()}
+        self.store.update_progress(self.job_id, stage, overall, stages)
+
+
+def remove_audio(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.unlink(path)
@@ -0,0 +1,194 @@
+"""
+Async client for the chat-completions API used to write clinical notes.
+
+One ``httpx.AsyncClient`` is shared by all requests, so TLS connections to
+the inference endpoint are kept alive and reused instead of being opened per
+note. A semaphore caps how many generations run at once, and rate-limit
+(429) or server (5xx) responses are retried with exponential backoff and
+full jitter so that concurrent retries do not arrive in lockstep.
+"""
+
+import asyncio
+import json
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from telemetry import log
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Failures where the request never reached the model, so retrying is safe
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+# Longest Retry-After we are willing to honour before giving up
+MAX_RETRY_AFTER_SECONDS = 30.0
+
+
+class ChatAPIError(Exception):
+    """The chat-completions API returned an error (after any retries)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"AI API error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ChatClient:
+    """
+    Pooled, retrying chat-completions client.
+
+    ``complete`` returns the parsed JSON response; ``stream`` yields content
+    deltas as the API sends them (server-sent events).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str],
+        max_connections: int = 10,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        timeout: float = 30.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._requests = 0
+        self._retries = 0
+        self._failed = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        # Created on first use so it belongs to the server's event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Full-jitter exponential backoff, or the server's Retry-After if it sent one"""
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("Retry-After", ""))
+                return min(retry_after, MAX_RETRY_AFTER_SECONDS)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _retry_wait(self, attempt: int, reason: str, response: Optional[httpx.Response] = None):
+        delay = self._backoff(attempt, response)
+        self._retries += 1
+        log(
+            "ai_api_retry", level="warning", reason=reason, delay_seconds=round(delay, 1),
+            attempt=attempt + 2, max_attempts=self.max_retries + 1
+        )
+        await asyncio.sleep(delay)
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a chat-completions request and return the JSON response"""
+        async with self._semaphore:
+            self._active += 1
+            self._requests += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    last_attempt = attempt == self.max_retries
+                    try:
+                        response = await self._http().post(self.url, json=payload)
+                    except RETRY_EXCEPTIONS as e:
+                        if last_attempt:
+                            raise
+                        await self._retry_wait(attempt, type(e).__name__)
+                        continue
+
+                    if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                        await self._retry_wait(attempt, f"returned {response.status_code}", response)
+                        continue
+                    if response.status_code != 200:
+                        raise ChatAPIError(response.status_code, response.text)
+                    return response.json()
+            except Exception:
+                self._failed += 1
+                raise
+            finally:
+                self._active -= 1
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        POST a streaming chat-completions request and yield content deltas.
+
+        Retries only happen before the first delta is yielded; once text has
+        been passed on, an interrupted stream raises instead of starting over.
+        """
+        payload = {**payload, "stream": True}
+        streamed = False
+        async with self._semaphore:
+            self._active += 1
+            self._requests += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    last_attempt = attempt == self.max_retries
+                    retry_response = None
+                    try:
+                        async with self._http().stream("POST", self.url, json=payload) as response:
+                            if response.status_code != 200:
+                                body = (await response.aread()).decode(errors="replace")
+                                if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                                    raise ChatAPIError(response.status_code, body)
+                                # Back off after the connection is returned to the pool
+                                retry_response = response
+                            else:
+                                async for line in response.aiter_lines():
+                                    if not line.startswith("data:"):
+                                        continue
+                                    data = line[len("data:"):].strip()
+                                    if data == "[DONE]":
+                                        break
+                                    choices = json.loads(data).get("choices") or [{}]
+                                    content = (choices[0].get("delta") or {}).get("content")
+                                    if content:
+                                        streamed = True
+                                        yield content
+                        if retry_response is None:
+                            return
+                    except RETRY_EXCEPTIONS as e:
+                        if last_attempt or streamed:
+                            raise
+                        await self._retry_wait(attempt, type(e).__name__)
+                        continue
+                    await self._retry_wait(attempt, f"returned {retry_response.status_code}", retry_response)
+            except Exception:
+                self._failed += 1
+                raise
+            finally:
+                self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "requests": self._requests,
+            "retries": self._retries,
+            "failed": self._failed
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,226 @@
+"""
+Chunk-parallel transcription of long recordings.
+
+``model.transcribe`` decodes a recording one 30-second window after another
+on one process, so an hour of audio keeps a single set of torch threads busy
+however many cores the machine has, and more intra-op threads stop helping
+well before 32. ``ChunkedTranscriber`` instead cuts the decoded waveform at
+pauses (see ``vad.silence_split_points``), transcribes the chunks at the same
+time on a pool of worker processes and stitches the results back into one
+``model.transcribe``-shaped dict with global timestamps and segment ids.
+
+Each worker process loads its own copy of the model when it starts, so memory
+grows with the number of processes. The pool uses the ``spawn`` start method:
+forking a server process whose torch/OpenMP thread pools are already running
+can deadlock the child, and openai-whisper stores its checkpoints in fp16 and
+converts them to fp32 on load, so the weights could not be shared through a
+memory-mapped checkpoint anyway.
+
+Differences from one ``model.transcribe`` call over the whole recording:
+- each chunk starts without the previous chunk's text as a prompt
+- the language is detected per chunk; the result reports the most common one
+- progress is reported per finished chunk
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+from inference import QueueFullError
+from vad import silence_split_points
+
+# Whisper's mel spectrogram has 100 frames per second; ``seek`` counts frames
+FRAMES_PER_SECOND = 100
+
+# Model loaded by _init_worker in each pool process
+_worker_model = None
+
+
+def _init_worker(backend: str, size: str, torch_threads: int):
+    global _worker_model
+    import torch
+    from backends import load_backend
+
+    torch.set_num_threads(torch_threads)
+    _worker_model = load_backend(backend, size, cpu_threads=torch_threads)
+
+
+def _transcribe_chunk(audio: np.ndarray, options: Dict[str, Any]) -> Dict[str, Any]:
+    return _worker_model.transcribe(audio, **options)
+
+
+def _shift(value: float, offset: float) -> float:
+    return round(value + offset, 3)
+
+
+def stitch(results: List[Dict[str, Any]], offsets: List[float]) -> Dict[str, Any]:
+    """
+    Join per-chunk transcription results, shifting timestamps by each chunk's
+    start (in seconds) and renumbering segment ids from 0
+    """
+    text = ""
+    segments: List[Dict[str, Any]] = []
+    languages: Counter = Counter()
+
+    for result, offset in zip(results, offsets):
+        chunk_text = result.get("text", "")
+        if text and chunk_text and not chunk_text[:1].isspace():
+            text += " "
+        text += chunk_text
+        if result.get("language"):
+            languages[result["language"]] += 1
+
+        for segment in result.get("segments", []):
+            segment = dict(segment)
+            segment["id"] = len(segments)
+            segment["seek"] = segment.get("seek", 0) + int(round(offset * FRAMES_PER_SECOND))
+            segment["start"] = _shift(segment["start"], offset)
+            segment["end"] = _shift(segment["end"], offset)
+            if segment.get("words"):
+                segment["words"] = [
+                    {**word, "start": _shift(word["start"], offset), "end": _shift(word["end"], offset)}
+                    for word in segment["words"]
+                ]
+            segments.append(segment)
+
+    return {
+        "text": text,
+        "segments": segments,
+        "language": languages.most_common(1)[0][0] if languages else None
+    }
+
+
+class ChunkedTranscriber:
+    """
+    Transcribe long audio as parallel chunks on a pool of model processes.
+
+    ``min_chunk_seconds`` keeps chunks long enough that Whisper has context
+    and the per-chunk overhead stays small; shorter recordings get fewer
+    chunks than there are processes. ``max_pending`` bounds how many
+    recordings may be in flight at once; more are rejected with
+    ``QueueFullError``.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        size: str,
+        processes: int,
+        torch_threads: int = 1,
+        min_chunk_seconds: float = 120,
+        max_pending: int = 2
+    ):
+        self.backend = backend
+        self.size = size
+        self.processes = processes
+        self.torch_threads = torch_threads
+        self.min_chunk_seconds = min_chunk_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._chunks = 0
+        self._audio_seconds = 0.0
+        self._rejected = 0
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.backend, self.size, self.torch_threads)
+        )
+
+    def split(self, audio: np.ndarray, chunks: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        (start, end) sample ranges of the chunks, cut at pauses. ``chunks``
+        overrides the number of chunks aimed for (default: one per process).
+        """
+        duration = len(audio) / SAMPLE_RATE
+        if chunks:
+            target = duration / chunks
+        else:
+            target = max(self.min_chunk_seconds, duration / self.processes)
+        bounds = [0] + silence_split_points(audio, target) + [len(audio)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise QueueFullError(f"Long-audio pool is busy ({self._pending} recordings in progress)")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def transcribe(
+        self,
+        audio: np.ndarray,
+        progress: Optional[Callable[[float], None]] = None,
+        chunks: Optional[int] = None,
+        **options
+    ) -> Dict[str, Any]:
+        """
+        Transcribe ``audio`` chunk by chunk across the pool. Same options and
+        result shape as ``WhisperBackend.transcribe``; ``progress`` is called
+        with the fraction of audio done after each finished chunk.
+        """
+        self._admit()
+        try:
+            bounds = self.split(audio, chunks)
+            loop = asyncio.get_running_loop()
+            done = [0]
+
+            def chunk_done(size: int):
+                def callback(future):
+                    if progress and not future.cancelled() and future.exception() is None:
+                        done[0] += size
+                        progress(done[0] / len(audio))
+                return callback
+
+            futures = []
+            for start, end in bounds:
+                future = loop.run_in_executor(self._pool, _transcribe_chunk, audio[start:end], options)
+                future.add_done_callback(chunk_done(end - start))
+                futures.append(future)
+            try:
+                results = await asyncio.gather(*futures)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool for the next request
+                print("WARNING: Long-audio worker process died; restarting the pool")
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = self._new_pool()
+                raise
+        finally:
+            self._release()
+
+        with self._lock:
+            self._completed += 1
+            self._chunks += len(bounds)
+            self._audio_seconds += len(audio) / SAMPLE_RATE
+        return stitch(results, [start / SAMPLE_RATE for start, _ in bounds])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "torch_threads": self.torch_threads,
+                "in_progress": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "chunks": self._chunks,
+                "audio_seconds": round(self._audio_seconds, 1)
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
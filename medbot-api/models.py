@@ -0,0 +1,293 @@
+"""
+Which models are held in memory, within a memory budget.
+
+Whisper models and the pyannote pipeline take hundreds of MB to several GB
+each. ``ModelManager`` loads them on first use and keeps them in LRU order:
+
+- With a budget, loading a model first unloads the least recently used idle
+  models until the new one fits. Sizes are measured when a model loads (the
+  growth of the process RSS, or the size of its torch weights if larger) and
+  remembered for the next time it is loaded.
+- With an idle timeout, models nobody has used for that long are unloaded
+  by a background thread and load again on their next use.
+- Every user holds a reference (``acquire`` ... ``release``) for as long as
+  it runs inference, and a model with references is never unloaded. If
+  every resident model is in use, a load goes over the budget rather than
+  wait or interrupt anyone, and is logged as a warning.
+
+``pin`` keeps a model resident regardless (e.g. while a micro-batcher holds
+it). ``unload`` drops a model as soon as its last reference is released.
+"""
+
+import ctypes
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+
+from telemetry import log
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def module_bytes(model: Any) -> int:
+    """Bytes of torch weights in ``model`` itself or in its attributes (e.g. ``backend.model``)"""
+    candidates = [model] + list(getattr(model, "__dict__", {}).values())
+    seen, total = set(), 0
+    for candidate in candidates:
+        if not isinstance(candidate, torch.nn.Module):
+            continue
+        for tensor in list(candidate.parameters()) + list(candidate.buffers()):
+            if tensor.data_ptr() not in seen:
+                seen.add(tensor.data_ptr())
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def free_memory():
+    """Return the memory of unloaded models to the OS instead of keeping it in the allocators"""
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    try:
+        # glibc keeps freed heap pages otherwise, so RSS would not go down
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class ModelManager:
+    """Reference-counted LRU of loaded models with a memory budget and idle unloading"""
+
+    def __init__(
+        self,
+        budget_bytes: int = 0,
+        idle_seconds: float = 0,
+        on_unload: Optional[Callable[[str, str], None]] = None
+    ):
+        """
+        ``budget_bytes`` / ``idle_seconds`` of 0 mean no limit / never unload
+        idle models. ``on_unload(model_id, reason)`` is called after a model
+        has been dropped.
+        """
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.on_unload = on_unload
+        self._lock = threading.Lock()
+        # One load at a time, so the RSS growth during a load is that model's
+        self._load_lock = threading.Lock()
+        self._models: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._ids: Dict[int, str] = {}
+        self._sizes: Dict[str, int] = {}
+        self._loads = 0
+        self._evictions = 0
+        self._idle_unloads = 0
+        self._over_budget_loads = 0
+        self._stop = threading.Event()
+        self._reaper = None
+        if idle_seconds > 0:
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _take(self, entry: Dict[str, Any]) -> Any:
+        entry["refs"] += 1
+        entry["last_used"] = time.monotonic()
+        self._models.move_to_end(entry["id"])
+        return entry["model"]
+
+    def acquire(self, model_id: str, loader: Callable[[], Any]) -> Any:
+        """
+        Take a reference on ``model_id``, loading it with ``loader()`` if it
+        is not resident (blocking). Every acquire needs a matching release.
+        """
+        with self._lock:
+            if model_id in self._models:
+                return self._take(self._models[model_id])
+
+        with self._load_lock:
+            with self._lock:
+                # Loaded by another thread while this one waited
+                if model_id in self._models:
+                    return self._take(self._models[model_id])
+                evicted = self._make_room(self._sizes.get(model_id, 0))
+            self._drop(evicted, "budget")
+
+            rss_before = process_rss_bytes()
+            model = loader()
+            rss_after = process_rss_bytes()
+            grown = rss_after - rss_before if rss_before is not None and rss_after is not None else 0
+            size = max(grown, module_bytes(model))
+
+            with self._lock:
+                self._sizes[model_id] = size
+                self._models[model_id] = {
+                    "id": model_id, "model": model, "size": size, "refs": 0,
+                    "pinned": False, "unload_when_idle": False, "loaded_at": time.time()
+                }
+                self._ids[id(model)] = model_id
+                self._loads += 1
+                model = self._take(self._models[model_id])
+                # The estimate may have been missing or too small
+                evicted = self._make_room(0)
+                over_budget = self.budget_bytes and self._used() > self.budget_bytes
+                if over_budget:
+                    self._over_budget_loads += 1
+                used = self._used()
+            self._drop(evicted, "budget")
+
+        log("model_loaded", model=model_id, size_mb=round(size / 2**20, 1))
+        if over_budget:
+            log(
+                "model_budget_exceeded", level="warning", model=model_id,
+                used_mb=round(used / 2**20, 1), budget_mb=round(self.budget_bytes / 2**20, 1),
+                reason="all other resident models are in use"
+            )
+        return model
+
+    def release(self, model: Any):
+        """Drop a reference taken by ``acquire``"""
+        evicted = []
+        with self._lock:
+            model_id = self._ids.get(id(model))
+            entry = self._models.get(model_id)
+            if entry is None:
+                return
+            entry["refs"] = max(0, entry["refs"] - 1)
+            entry["last_used"] = time.monotonic()
+            if entry["refs"] == 0 and entry["unload_when_idle"] and not entry["pinned"]:
+                evicted = [self._evict(model_id)]
+            entry = None
+        self._drop(evicted, "requested")
+
+    def _used(self) -> int:
+        return sum(entry["size"] for entry in self._models.values())
+
+    def _evict(self, model_id: str) -> Dict[str, Any]:
+        entry = self._models.pop(model_id)
+        self._ids.pop(id(entry["model"]), None)
+        return entry
+
+    def _make_room(self, needed: int) -> List[Dict[str, Any]]:
+        """Evict idle models, least recently used first, until ``needed`` more bytes fit (lock held)"""
+        evicted = []
+        if not self.budget_bytes:
+            return evicted
+        while self._used() + needed > self.budget_bytes:
+            idle = [
+                model_id for model_id, entry in self._models.items()
+                if entry["refs"] == 0 and not entry["pinned"]
+            ]
+            if not idle:
+                break
+            evicted.append(self._evict(idle[0]))
+            self._evictions += 1
+        return evicted
+
+    def _drop(self, evicted: List[Dict[str, Any]], reason: str):
+        """Release evicted models outside the lock and give their memory back"""
+        if not evicted:
+            return
+        model_ids = [entry["id"] for entry in evicted]
+        evicted.clear()
+        free_memory()
+        for model_id in model_ids:
+            log("model_unloaded", model=model_id, reason=reason)
+            if self.on_unload:
+                self.on_unload(model_id, reason)
+
+    def unload(self, model_id: str) -> Optional[bool]:
+        """
+        Unload ``model_id`` now (True) or once its last reference is
+        released (False); None if it is not loaded
+        """
+        with self._lock:
+            entry = self._models.get(model_id)
+            if entry is None:
+                return None
+            entry["pinned"] = False
+            if entry["refs"] > 0:
+                entry["unload_when_idle"] = True
+                return False
+            entry = None
+            evicted = [self._evict(model_id)]
+        self._drop(evicted, "requested")
+        return True
+
+    def pin(self, model_id: str, pinned: bool = True):
+        """Keep a resident model loaded regardless of budget and idle time"""
+        with self._lock:
+            if model_id in self._models:
+                self._models[model_id]["pinned"] = pinned
+
+    def unload_idle(self) -> int:
+        """Unload models unused for ``idle_seconds``; returns how many"""
+        if self.idle_seconds <= 0:
+            return 0
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            evicted = [
+                self._evict(model_id) for model_id, entry in list(self._models.items())
+                if entry["refs"] == 0 and not entry["pinned"] and entry["last_used"] < cutoff
+            ]
+            self._idle_unloads += len(evicted)
+        count = len(evicted)
+        self._drop(evicted, "idle")
+        return count
+
+    def _reap(self):
+        interval = min(60.0, max(1.0, self.idle_seconds / 4))
+        while not self._stop.wait(interval):
+            try:
+                self.unload_idle()
+            except Exception as e:
+                log("model_reaper_failed", level="error", error=str(e))
+
+    def loaded(self) -> List[str]:
+        """Resident model ids, least recently used first"""
+        with self._lock:
+            return list(self._models)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        rss = process_rss_bytes()
+        with self._lock:
+            models = [
+                {
+                    "id": entry["id"],
+                    "size_mb": round(entry["size"] / 2**20, 1),
+                    "refs": entry["refs"],
+                    "idle_seconds": round(now - entry["last_used"], 1) if entry["refs"] == 0 else 0.0,
+                    "pinned": entry["pinned"],
+                    "loaded_at": entry["loaded_at"]
+                }
+                for entry in self._models.values()
+            ]
+            used = self._used()
+            counts = {
+                "loads": self._loads,
+                "evictions": self._evictions,
+                "idle_unloads": self._idle_unloads,
+                "over_budget_loads": self._over_budget_loads
+            }
+        return {
+            "rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+            "models_mb": round(used / 2**20, 1),
+            "budget_mb": round(self.budget_bytes / 2**20, 1) if self.budget_bytes else None,
+            "idle_unload_minutes": self.idle_seconds / 60 if self.idle_seconds else None,
+            "models": models,
+            **counts
+        }
+
+    def shutdown(self):
+        self._stop.set()
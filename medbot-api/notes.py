@@ -0,0 +1,167 @@
+"""
+Map-reduce clinical note generation for long transcripts.
+
+A long consultation does not fit in one note request: the prompt can exceed
+the model context and a single generation over the whole transcript runs
+past the request timeout. Instead the transcript is split at speaker-turn
+boundaries into chunks under a token budget, the SOAP-relevant facts of each
+chunk are extracted with parallel requests, and one final request writes the
+note from the collected facts. Latency then follows the slowest chunk plus
+the merge, not the length of the whole consultation.
+"""
+
+import asyncio
+import re
+from typing import List, Tuple
+
+from llm import ChatClient
+from telemetry import span
+
+# Rough tokens-per-character ratio for English text; close enough for
+# budgeting without shipping the model's tokenizer
+CHARS_PER_TOKEN = 4
+
+FACT_EXTRACTION_PROMPT = """You are extracting facts from one part of a longer orthopedic consultation transcript. The parts are processed separately and combined later into a clinical note.
+
+List every clinically relevant fact stated in this part as short bullet points under the headings Subjective, Objective, Assessment & Plan and Additional Notes. Keep the exact medical terminology and say who stated a fact when it matters.
+
+CRITICAL RULES:
+- ONLY include information explicitly mentioned in this part of the transcript
+- NEVER invent or assume patient details, diagnoses, or treatment plans
+- Omit headings with nothing to report
+- Do not write a letter, a summary or any commentary"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_turns(transcript: str) -> List[str]:
+    """
+    Speaker turns of a ``formatted_transcript`` ("Person 1: ...\\n\\nPerson 2:
+    ..."). A plain transcript without blank lines comes back as one turn.
+    """
+    return [turn.strip() for turn in transcript.split("\n\n") if turn.strip()]
+
+
+def _split_long_turn(turn: str, max_tokens: int) -> List[str]:
+    """Split one over-budget turn at sentence (then word) boundaries, keeping its speaker label"""
+    label, separator, text = turn.partition(": ")
+    if not separator or "\n" in label or len(label) > 40:
+        label, text = "", turn
+    prefix = f"{label}: " if label else ""
+    budget = max(1, max_tokens - estimate_tokens(prefix))
+
+    pieces: List[str] = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        if estimate_tokens(sentence) <= budget:
+            pieces.append(sentence)
+            continue
+        words, current = sentence.split(), []
+        for word in words:
+            if current and estimate_tokens(" ".join(current + [word])) > budget:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+
+    parts, current = [], ""
+    for piece in pieces:
+        candidate = f"{current} {piece}" if current else piece
+        if current and estimate_tokens(candidate) > budget:
+            parts.append(prefix + current)
+            candidate = piece
+        current = candidate
+    if current:
+        parts.append(prefix + current)
+    return parts
+
+
+def chunk_transcript(transcript: str, max_tokens: int) -> List[str]:
+    """
+    Group consecutive speaker turns into chunks of at most ``max_tokens``
+    (estimated). Turns are never split unless a single turn is over budget.
+    """
+    turns: List[str] = []
+    for turn in split_turns(transcript):
+        if estimate_tokens(turn) > max_tokens:
+            turns.extend(_split_long_turn(turn, max_tokens))
+        else:
+            turns.append(turn)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for turn in turns:
+        tokens = estimate_tokens(turn)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(turn)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def extract_facts(
+    client: ChatClient,
+    model: str,
+    chunks: List[str],
+    max_tokens: int = 800
+) -> List[str]:
+    """Extract the SOAP facts of every chunk, one request per chunk, all at once"""
+
+    async def extract(index: int, chunk: str) -> str:
+        result = await client.complete({
+            "model": model,
+            "messages": [
+                {"role": "system", "content": FACT_EXTRACTION_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"Part {index + 1} of {len(chunks)} of the consultation transcript:\n\n{chunk}"
+                }
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0.1
+        })
+        return result.get("choices", [{}])[0].get("message", {}).get("content", "") or ""
+
+    return await asyncio.gather(*(extract(i, chunk) for i, chunk in enumerate(chunks)))
+
+
+def merge_message(facts: List[str]) -> str:
+    """User message for the final note request, built from the per-chunk facts"""
+    parts = [
+        f"Part {i + 1}:\n{text.strip()}"
+        for i, text in enumerate(facts)
+        if text.strip()
+    ]
+    return (
+        "Generate a clinical note from this consultation. The facts below were extracted, "
+        "in order, from consecutive parts of the transcript; later parts may update or "
+        "correct earlier ones.\n\n" + "\n\n".join(parts)
+    )
+
+
+async def note_message(
+    client: ChatClient,
+    model: str,
+    transcript: str,
+    chunk_tokens: int,
+    facts_max_tokens: int = 800
+) -> Tuple[str, int]:
+    """
+    User message for the final note request, and the number of transcript
+    chunks it was built from. A transcript within ``chunk_tokens`` goes to
+    the model as is (no extra calls); a longer one is reduced to the facts
+    of each chunk first.
+    """
+    chunks = chunk_transcript(transcript, chunk_tokens)
+    if len(chunks) <= 1:
+        return f"Generate a clinical note from this consultation transcript:\n\n{transcript}", 1
+
+    with span("note-facts", chunks=len(chunks)):
+        facts = await extract_facts(client, model, chunks, facts_max_tokens)
+    return merge_message(facts), len(chunks)
@@ -0,0 +1,138 @@
+"""
+Compact response bodies for transcripts.
+
+Whisper segments carry decoder details (``tokens``, ``avg_logprob``,
+``compression_ratio``, ``no_speech_prob``, ``temperature``) that the frontend
+never reads; for a long recording they make up most of a multi-MB response.
+Clients can ask for just the segment fields they use (``?fields=start,end,text``)
+and for a columnar layout with one array per field (``?format=columnar``),
+which drops the repeated keys as well.
+
+Bodies are serialized with orjson (several times faster than the standard
+library on large transcripts) and compressed with brotli or gzip when the
+client accepts it. Both orjson and brotli are optional: without them the
+standard json module and gzip are used.
+"""
+
+import gzip
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Every field a segment may have (Whisper segments, or speaker-labelled ones from diarize)
+SEGMENT_FIELDS = (
+    "id", "seek", "start", "end", "text", "tokens", "temperature",
+    "avg_logprob", "compression_ratio", "no_speech_prob", "words", "speaker"
+)
+FORMATS = ("full", "columnar")
+COLUMNAR_FIELDS = ("start", "end", "text", "speaker")
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated ``fields`` query value as a list; raises ValueError on unknown names"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SEGMENT_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Unknown segment field(s): {', '.join(unknown)}. Available: {', '.join(SEGMENT_FIELDS)}"
+        )
+    return names
+
+
+def select_segments(
+    segments: List[Dict[str, Any]],
+    fields: Optional[Sequence[str]] = None,
+    format: str = "full"
+) -> Union[List[Dict[str, Any]], Dict[str, List[Any]]]:
+    """
+    Segments reduced to ``fields``, as a list of objects (``full``) or as
+    parallel arrays (``columnar``). ``full`` without ``fields`` returns the
+    segments unchanged; ``columnar`` defaults to start/end/text (and speaker
+    when present).
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}'. Available: {', '.join(FORMATS)}")
+
+    if format == "columnar":
+        if fields is None:
+            present = segments[0].keys() if segments else ()
+            fields = [name for name in COLUMNAR_FIELDS if name != "speaker" or name in present]
+        return {name: [segment.get(name) for segment in segments] for name in fields}
+
+    if fields is None:
+        return segments
+    return [{name: segment[name] for name in fields if name in segment} for segment in segments]
+
+
+def encode_json(content: Any) -> bytes:
+    if orjson is not None:
+        # OPT_SERIALIZE_NUMPY covers numpy scalars that slip into model output
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """``Accept-Encoding`` as {coding: q}"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress ``body`` with the best coding the client accepts (br, then gzip).
+    Returns the body and the Content-Encoding, or None if left as is.
+    """
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    accepted = _accepted_encodings(accept_encoding)
+    # Low levels: most of the size win at a fraction of the CPU time
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return brotli.compress(body, quality=4), "br"
+    if accepted.get("gzip", 0) > 0:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def json_response(request: Request, response: Response, content: Any) -> Response:
+    """
+    Serialize ``content`` with orjson and compress it for the client.
+
+    Returning a Response skips FastAPI's ``jsonable_encoder`` pass over the
+    whole transcript; headers already set on the injected ``response``
+    (Server-Timing, X-Cache, ...) are carried over.
+    """
+    body, encoding = compress(encode_json(content), request.headers.get("accept-encoding", ""))
+    headers = dict(response.headers)
+    headers.pop("content-length", None)
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=response.status_code or 200, headers=headers, media_type="application/json")
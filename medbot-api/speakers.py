@@ -0,0 +1,195 @@
+"""
+Enrolled clinician voices and role labels for diarized speakers.
+
+pyannote clusters the speakers of every recording from scratch and names
+them SPEAKER_00, SPEAKER_01... in no particular order, so on their own they
+can only be shown as "Person 1", "Person 2". A clinician who uploads a short
+sample of their voice once gets an embedding stored here: the centroid
+pyannote computes for the single speaker in the sample, in the same space it
+clusters consultations in. For each consultation the per-speaker centroids
+pyannote returns are compared with the enrolled embeddings by cosine
+similarity; the speaker that matches becomes "Clinician", the other speaker
+with the most speech "Patient", and any further speakers (a relative, an
+interpreter) "Other 1", "Other 2"...
+
+Voice embeddings identify people; keep the store with the rest of the
+patient data.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+CLINICIAN_LABEL = "Clinician"
+PATIENT_LABEL = "Patient"
+OTHER_LABEL = "Other"
+
+CLINICIAN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+def normalize(embedding) -> np.ndarray:
+    """Unit-length float32 copy; raises ValueError for empty or NaN embeddings"""
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector)) if vector.size else 0.0
+    if not np.isfinite(norm) or norm == 0.0:
+        raise ValueError("Speaker embedding is empty")
+    return vector / norm
+
+
+def split_diarization(output) -> Tuple[Any, Dict[str, List[float]]]:
+    """
+    Annotation and {speaker: centroid embedding} from a pipeline called with
+    ``return_embeddings=True``. Older pipelines return the annotation alone;
+    speakers without a usable embedding are left out.
+    """
+    if not isinstance(output, tuple):
+        return output, {}
+    annotation, centroids = output
+    embeddings = {}
+    for label, centroid in zip(annotation.labels(), centroids if centroids is not None else []):
+        try:
+            embeddings[label] = normalize(centroid).tolist()
+        except ValueError:
+            continue
+    return annotation, embeddings
+
+
+def match_clinician(
+    speakers: Dict[str, List[float]],
+    enrolled: Dict[str, np.ndarray],
+    threshold: float
+) -> Optional[Dict[str, Any]]:
+    """
+    The (speaker, clinician) pair with the highest cosine similarity, if it
+    reaches ``threshold``. At most one speaker is taken to be the clinician.
+    """
+    if not speakers or not enrolled:
+        return None
+    labels = list(speakers)
+    clinician_ids = list(enrolled)
+    # Rows are unit vectors, so the dot product is the cosine similarity
+    similarity = np.stack([normalize(speakers[label]) for label in labels]) @ np.stack(
+        [enrolled[clinician_id] for clinician_id in clinician_ids]
+    ).T
+    speaker_index, clinician_index = np.unravel_index(int(np.argmax(similarity)), similarity.shape)
+    best = float(similarity[speaker_index, clinician_index])
+    if best < threshold:
+        return None
+    return {"speaker": labels[speaker_index], "id": clinician_ids[clinician_index], "similarity": round(best, 3)}
+
+
+def speaker_labels(speaker_segments: List[Dict[str, Any]], clinician_speaker: Optional[str] = None) -> Dict[str, str]:
+    """
+    Display label for each diarized speaker. With a matched clinician:
+    Clinician, then Patient for the speaker with the most speech, then
+    Other 1, Other 2... by speech time. Without one: Person 1, Person 2...
+    """
+    speech: Dict[str, float] = {}
+    for turn in speaker_segments:
+        speech[turn["speaker"]] = speech.get(turn["speaker"], 0.0) + turn["end"] - turn["start"]
+
+    if clinician_speaker is None or clinician_speaker not in speech:
+        return {speaker: f"Person {i + 1}" for i, speaker in enumerate(sorted(speech))}
+
+    labels = {clinician_speaker: CLINICIAN_LABEL}
+    others = sorted((speaker for speaker in speech if speaker != clinician_speaker), key=lambda s: (-speech[s], s))
+    for i, speaker in enumerate(others):
+        labels[speaker] = PATIENT_LABEL if i == 0 else f"{OTHER_LABEL} {i}"
+    return labels
+
+
+class ClinicianStore:
+    """SQLite table of enrolled clinician voice embeddings"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "clinicians.sqlite3")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS clinicians (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                embedding BLOB NOT NULL,
+                samples INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "samples": row["samples"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def enroll(self, clinician_id: str, embedding, name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add a voice sample. Repeat enrollments average the samples, which
+        makes the match more robust to different rooms and microphones.
+        """
+        vector = normalize(embedding)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT * FROM clinicians WHERE id = ?", (clinician_id,)).fetchone()
+            if row is None:
+                self._db.execute(
+                    "INSERT INTO clinicians (id, name, embedding, samples, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 1, ?, ?)",
+                    (clinician_id, name, vector.tobytes(), now, now)
+                )
+            else:
+                current = np.frombuffer(row["embedding"], dtype=np.float32)
+                if current.shape != vector.shape:
+                    raise ValueError("Embedding size changed; delete the clinician and enroll again")
+                merged = normalize(current * row["samples"] + vector)
+                self._db.execute(
+                    "UPDATE clinicians SET name = COALESCE(?, name), embedding = ?, samples = samples + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    (name, merged.tobytes(), now, clinician_id)
+                )
+            return self._public(
+                self._db.execute("SELECT * FROM clinicians WHERE id = ?", (clinician_id,)).fetchone()
+            )
+
+    def get(self, clinician_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM clinicians WHERE id = ?", (clinician_id,)).fetchone()
+        return self._public(row) if row else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM clinicians ORDER BY id").fetchall()
+        return [self._public(row) for row in rows]
+
+    def remove(self, clinician_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("DELETE FROM clinicians WHERE id = ?", (clinician_id,)).rowcount > 0
+
+    def embeddings(self, clinician_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Enrolled embeddings by clinician id, or just ``clinician_id``'s"""
+        with self._lock:
+            if clinician_id is None:
+                rows = self._db.execute("SELECT id, embedding FROM clinicians").fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT id, embedding FROM clinicians WHERE id = ?", (clinician_id,)
+                ).fetchall()
+        return {row["id"]: np.frombuffer(row["embedding"], dtype=np.float32) for row in rows}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"clinicians": self._db.execute("SELECT COUNT(*) FROM clinicians").fetchone()[0]}
@@ -0,0 +1,154 @@
+"""
+Live transcription over a rolling audio buffer.
+
+Audio arrives in small pieces while the visit is still being recorded.
+``LiveTranscriber`` keeps everything that has not been committed yet in a
+buffer, re-runs Whisper over that window every few seconds and commits the
+segments that have settled, i.e. ended well before the edge of the window.
+The uncommitted tail is decoded again on the next pass (the window overlap),
+and the committed text is passed as the prompt so wording stays consistent
+across windows.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+
+# Whisper never looks at more than 30 seconds at once
+MAX_WINDOW_SECONDS = 30.0
+
+
+class LiveTranscriber:
+    """
+    Incrementally transcribe a stream of 16kHz mono samples.
+
+    ``transcribe_fn(audio, prompt)`` must return a Whisper-style result dict
+    with ``segments`` whose timestamps are relative to the start of ``audio``.
+    """
+
+    def __init__(
+        self,
+        transcribe_fn: Callable[[np.ndarray, Optional[str]], Awaitable[Dict[str, Any]]],
+        window_seconds: float = MAX_WINDOW_SECONDS,
+        step_seconds: float = 3.0,
+        settle_seconds: float = 2.0,
+        prompt_chars: int = 200
+    ):
+        self.transcribe_fn = transcribe_fn
+        self.window_seconds = min(window_seconds, MAX_WINDOW_SECONDS)
+        self.step_seconds = step_seconds
+        self.settle_seconds = settle_seconds
+        self.prompt_chars = prompt_chars
+
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_offset = 0.0  # stream time (seconds) of buffer[0]
+        self.new_samples = 0  # samples added since the last pass
+        self.committed_text = ""
+        self.next_segment_id = 0
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio received so far"""
+        return self.buffer_offset + len(self.buffer) / SAMPLE_RATE
+
+    def add_audio(self, samples: np.ndarray):
+        if len(samples) == 0:
+            return
+        self.buffer = np.concatenate([self.buffer, samples])
+        self.new_samples += len(samples)
+
+    def has_audio(self) -> bool:
+        """True while there is uncommitted audio in the buffer"""
+        return len(self.buffer) > 0
+
+    def ready(self) -> bool:
+        """True once enough new audio has arrived to justify another pass"""
+        return self.new_samples >= self.step_seconds * SAMPLE_RATE
+
+    def _prompt(self) -> Optional[str]:
+        if not self.committed_text:
+            return None
+        return self.committed_text[-self.prompt_chars:]
+
+    def _commit(self, segments: List[Dict[str, Any]], cut_seconds: float) -> List[Dict[str, Any]]:
+        """Emit ``segments`` as final and drop audio before ``cut_seconds``"""
+        final = []
+        for segment in segments:
+            text = segment["text"].strip()
+            if not text:
+                continue
+            final.append({
+                "id": self.next_segment_id,
+                "start": round(self.buffer_offset + segment["start"], 2),
+                "end": round(self.buffer_offset + segment["end"], 2),
+                "text": text
+            })
+            self.next_segment_id += 1
+            self.committed_text = f"{self.committed_text} {text}".strip()
+
+        cut_samples = min(len(self.buffer), int(cut_seconds * SAMPLE_RATE))
+        self.buffer = self.buffer[cut_samples:]
+        self.buffer_offset += cut_samples / SAMPLE_RATE
+        return final
+
+    async def step(self, final: bool = False) -> List[Dict[str, Any]]:
+        """
+        Run one Whisper pass over the current window.
+
+        Returns events of type ``final`` (segments that will not change any
+        more) and ``partial`` (the current guess for the unsettled tail).
+        With ``final=True`` everything in the window is committed; call it
+        until ``has_audio()`` is False to drain the buffer at end of stream.
+        """
+        self.new_samples = 0
+        window_samples = int(self.window_seconds * SAMPLE_RATE)
+        audio = self.buffer[:window_samples]
+        if len(audio) == 0:
+            return []
+
+        result = await self.transcribe_fn(audio, self._prompt())
+        segments = [s for s in result.get("segments", []) if s["end"] > s["start"]]
+        window_end = len(audio) / SAMPLE_RATE
+        window_offset = self.buffer_offset
+        window_full = len(audio) >= window_samples
+
+        if final:
+            committed = self._commit(segments, window_end)
+            pending = []
+        else:
+            # The last segment may still be cut mid-sentence; anything ending
+            # inside the settle margin will be decoded again next pass.
+            settled = [s for s in segments[:-1] if s["end"] <= window_end - self.settle_seconds]
+            if not settled and window_full:
+                # The window cannot grow any further, so force progress
+                settled = segments[:-1] if len(segments) > 1 else segments
+            if settled:
+                pending = segments[len(settled):]
+                committed = self._commit(settled, settled[-1]["end"])
+            elif window_full:
+                # Nothing recognisable in a full window (silence/noise): drop
+                # all but the settle margin so the buffer stays bounded
+                pending = []
+                committed = self._commit([], window_end - self.settle_seconds)
+            else:
+                pending = segments
+                committed = []
+
+        events = []
+        if committed:
+            events.append({"type": "final", "segments": committed})
+        if not final:
+            events.append({
+                "type": "partial",
+                "segments": [
+                    {
+                        "start": round(window_offset + s["start"], 2),
+                        "end": round(window_offset + s["end"], 2),
+                        "text": s["text"].strip()
+                    }
+                    for s in pending if s["text"].strip()
+                ]
+            })
+        return events
@@ -0,0 +1,184 @@
+"""
+Request ids, per-stage timing and Prometheus metrics.
+
+Every HTTP request gets an id (the client's ``X-Request-ID`` if it sent one)
+that is echoed back in the response and attached to every log line written
+while the request is handled. Log lines are single JSON objects on stdout, so
+a log shipper can index them and join them with the metrics:
+
+    {"ts": 1718000000.123, "level": "info", "event": "stage", "request_id": "3f2a...", "stage": "whisper", "duration_ms": 5321.4}
+
+``span`` times one step of a request (decode, VAD, Whisper, the speaker
+merge...) into the ``medbot_stage_duration_seconds`` histogram, logs it and
+adds it to the Server-Timing header. Gauges that mirror state the app already
+keeps (queue depth, model load times, jobs) are read at scrape time by a
+collector instead of being updated on every change.
+"""
+
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, Metric
+from starlette.responses import Response
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Stages range from a few ms (fingerprint) to tens of minutes (diarizing a
+# three-hour recording)
+DURATION_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+REQUEST_SECONDS = Histogram(
+    "medbot_request_duration_seconds", "HTTP request latency, until the response body is sent",
+    ["method", "route", "status"], buckets=DURATION_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "medbot_stage_duration_seconds", "Time spent in each processing stage",
+    ["stage"], buckets=DURATION_BUCKETS
+)
+STAGE_ERRORS = Counter("medbot_stage_errors", "Processing stages that raised", ["stage"])
+AUDIO_SECONDS = Counter("medbot_audio_seconds", "Seconds of audio decoded", ["source"])
+AUDIO_BYTES = Counter("medbot_upload_bytes", "Bytes of uploaded audio read", ["source"])
+VAD_SKIPPED_SECONDS = Counter("medbot_vad_skipped_seconds", "Seconds of audio cut out as silence before inference")
+CACHE_LOOKUPS = Counter("medbot_cache_lookups", "Result cache lookups", ["kind", "result"])
+
+# Lines below LOG_LEVEL (debug, info, warning, error) are not written
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+min_log_level = LOG_LEVELS.get(os.environ.get("LOG_LEVEL", "info").lower(), LOG_LEVELS["info"])
+
+# Probes and scrapes are counted but not logged
+QUIET_ROUTES = {"/metrics", "/health/live", "/health/ready"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def log(event: str, level: str = "info", **fields: Any):
+    """Write one structured log line tagged with the current request id"""
+    if LOG_LEVELS.get(level, LOG_LEVELS["info"]) < min_log_level:
+        return
+    record = {"ts": round(time.time(), 3), "level": level, "event": event, "request_id": request_id.get()}
+    record.update(fields)
+    print(json.dumps(record, default=str), flush=True)
+
+
+def observe_stage(stage: str, seconds: float, response: Optional[Response] = None, **fields: Any):
+    """Record a stage that was timed elsewhere (e.g. by an inference pool)"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    log("stage", stage=stage, duration_ms=round(seconds * 1000, 1), **fields)
+    if response is not None:
+        add_server_timing(response, f"{stage};dur={seconds * 1000:.1f}")
+
+
+@contextmanager
+def span(stage: str, response: Optional[Response] = None, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time the enclosed block as ``stage``. Yields a dict whose entries are
+    added to the log line, for details only known at the end of the block.
+    """
+    started = time.perf_counter()
+    details = dict(fields)
+    try:
+        yield details
+    except BaseException as e:
+        STAGE_ERRORS.labels(stage).inc()
+        details["error"] = type(e).__name__
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started, response, **details)
+
+
+def add_server_timing(response: Response, entry: str):
+    existing = response.headers.get("Server-Timing")
+    response.headers["Server-Timing"] = f"{existing}, {entry}" if existing else entry
+
+
+def gauge(name: str, documentation: str, samples: Dict[Any, float], label: Optional[str] = None) -> GaugeMetricFamily:
+    """Gauge family from {label value: value}, or from {None: value} without a label"""
+    family = GaugeMetricFamily(name, documentation, labels=[label] if label else None)
+    for key, value in samples.items():
+        if value is not None:
+            family.add_metric([str(key)] if label else [], value)
+    return family
+
+
+class SnapshotCollector:
+    """Exposes gauges computed at scrape time from the app's ``stats()`` snapshots"""
+
+    def __init__(self, collect: Callable[[], Iterable[Metric]]):
+        self._collect = collect
+
+    def collect(self) -> Iterable[Metric]:
+        try:
+            yield from self._collect()
+        except Exception as e:
+            # A broken snapshot must not take the whole scrape down
+            log("metrics_collect_failed", level="error", error=str(e))
+
+    def describe(self) -> Iterable[Metric]:
+        # Registered before the state it reads exists; skip the trial collect
+        return []
+
+
+def register_collector(collect: Callable[[], Iterable[Metric]]) -> SnapshotCollector:
+    collector = SnapshotCollector(collect)
+    REGISTRY.register(collector)
+    return collector
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that assigns each HTTP request an id, returns it in the
+    ``X-Request-ID`` header, records the request duration and logs one line
+    per request. Plain ASGI rather than ``BaseHTTPMiddleware`` so streamed
+    (SSE) responses are timed to their last byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers", [])).get(b"x-request-id", b"").decode("latin-1")
+        # Keep client ids short and printable; they end up in every log line
+        rid = incoming[:64] if incoming and incoming.isprintable() else new_request_id()
+        token = request_id.set(rid)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            # FastAPI leaves the matched route in the scope; label by its
+            # template (/jobs/{job_id}) to keep the label set small
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            if scope["type"] == "websocket":
+                status = 101
+            duration = time.perf_counter() - started
+            REQUEST_SECONDS.labels(scope.get("method", "WS"), route, str(status)).observe(duration)
+            if route not in QUIET_ROUTES:
+                log(
+                    "request", method=scope.get("method", "WS"), route=route, path=scope.get("path"),
+                    status=status, duration_ms=round(duration * 1000, 1)
+                )
+            request_id.reset(token)
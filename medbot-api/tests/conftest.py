@@ -0,0 +1,118 @@
+"""
+Shared setup for the tests.
+
+Run from medbot-api/ with ``python -m pytest tests``. The modules under test
+are imported the way index.py imports them (flat, from medbot-api/), and the
+local stand-ins in benchmarks/ (e.g. the fake completion server) are
+importable too. Tests of the API itself (the ``index`` fixture) need the
+full requirements.txt installed and are skipped otherwise.
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.join(API_DIR, "benchmarks"))
+
+from fake_llm import FakeChatServer  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def fake_llm_server():
+    server = FakeChatServer(0, prefill_ms_per_token=0, decode_ms_per_token=0)
+    with server:
+        yield server
+
+
+@pytest.fixture
+def fake_llm(fake_llm_server):
+    """The fake chat-completions server, with its request log cleared"""
+    fake_llm_server.app.state.requests = 0
+    fake_llm_server.app.state.bodies = []
+    return fake_llm_server
+
+
+def scripted_chat_app() -> FastAPI:
+    """
+    Chat-completions stand-in that answers each request with the next entry
+    of ``app.state.script``:
+
+    - ``("ok", tokens)``: success; streamed as SSE if the request asks for it
+    - ``("status", code, headers)``: that error status (e.g. 429 with Retry-After)
+    - ``("drop", tokens)``: stream ``tokens``, then cut the connection
+    """
+    app = FastAPI()
+    app.state.script = []
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        kind, *args = app.state.script.pop(0)
+
+        if kind == "status":
+            code, headers = args
+            return JSONResponse({"error": {"message": f"scripted {code}"}}, status_code=code, headers=headers)
+
+        tokens = args[0]
+        if not body.get("stream"):
+            return {"choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}]}
+
+        async def events():
+            for token in tokens:
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n"
+                await asyncio.sleep(0.01)
+            if kind == "drop":
+                # Aborts the response mid-body; the client sees an incomplete chunked read
+                raise ConnectionAbortedError("scripted disconnect")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def stub_llm_server():
+    server = FakeChatServer(0, app=scripted_chat_app())
+    with server:
+        yield server
+
+
+@pytest.fixture
+def stub_llm(stub_llm_server):
+    """The scripted chat-completions stand-in; set ``stub_llm.app.state.script`` per test"""
+    stub_llm_server.app.state.script = []
+    stub_llm_server.app.state.requests = 0
+    return stub_llm_server
+
+
+@pytest.fixture(scope="session")
+def index(tmp_path_factory):
+    """
+    The API module, configured for tests: no warm-up, job workers, result
+    cache or note API key, and its stores in a temporary directory
+    """
+    for module in ("torch", "whisper", "pyannote.audio"):
+        pytest.importorskip(module)
+    directory = tmp_path_factory.mktemp("medbot")
+    # Read when index is imported
+    os.environ.update({
+        "WARMUP_ON_STARTUP": "0",
+        "JOB_WORKERS": "0",
+        "RESULT_CACHE_ENABLED": "0",
+        "LOG_LEVEL": "warning",
+        "JOB_DIR": str(directory / "jobs"),
+        "CLINICIAN_STORE_DIR": str(directory / "clinicians"),
+        "ENCOUNTER_DIR": str(directory / "encounters")
+    })
+    import index
+    return index
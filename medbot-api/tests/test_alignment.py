@@ -0,0 +1,125 @@
+"""Speaker alignment: the turn index against a brute-force overlap merge and the old midpoint scan"""
+
+import numpy as np
+import pytest
+
+from alignment import MAX_GAP_SECONDS, SpeakerIndex, assign_speakers
+from bench_alignment import midpoint_scan, synthetic_transcript
+
+
+def overlap_merge(words, turns):
+    """Reference: each word against every turn - summed overlap per speaker, else the nearest turn"""
+    labels = sorted(set(turn["speaker"] for turn in turns))
+    turns = sorted(turns, key=lambda turn: turn["start"])
+    result = []
+    for start, end in words:
+        totals = {label: 0.0 for label in labels}
+        for turn in turns:
+            totals[turn["speaker"]] += max(0.0, min(end, turn["end"]) - max(start, turn["start"]))
+        best = max(labels, key=lambda label: totals[label])
+        if totals[best] > 0:
+            result.append(best)
+            continue
+        before = [turn for turn in turns if turn["start"] < end]
+        after = [turn for turn in turns if turn["start"] >= end]
+        gap_before = start - max(turn["end"] for turn in before) if before else np.inf
+        gap_after = after[0]["start"] - end if after else np.inf
+        if min(gap_before, gap_after) > MAX_GAP_SECONDS:
+            result.append(None)
+        elif gap_before <= gap_after:
+            result.append(max(before, key=lambda turn: turn["end"])["speaker"])
+        else:
+            result.append(after[0]["speaker"])
+    return result
+
+
+def overlapping_turns(rng, count: int, total: float):
+    """Turns that overlap, nest and leave gaps, plus one covering most of the recording"""
+    turns = [{"start": 5.0, "end": total - 5.0, "speaker": "S3"}]
+    for _ in range(count):
+        start = rng.uniform(0, total)
+        turns.append({"start": start, "end": start + rng.exponential(4), "speaker": f"S{rng.integers(3)}"})
+    return turns
+
+
+def lookup(turns, words):
+    words = np.array(words, dtype=np.float64).reshape(-1, 2)
+    return SpeakerIndex(turns).lookup(words[:, 0], words[:, 1])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lookup_matches_the_overlap_merge_on_overlapping_turns(seed):
+    rng = np.random.default_rng(seed)
+    turns = overlapping_turns(rng, 60, 300.0)
+    starts = rng.uniform(-5, 310, 400)
+    # Mostly word-length intervals, some zero-length and some spanning several turns
+    lengths = rng.choice([0.0, 0.3, 0.6, 15.0], size=400, p=[0.1, 0.5, 0.3, 0.1])
+    words = list(zip(starts, starts + lengths))
+
+    assert lookup(turns, words) == overlap_merge(words, turns)
+
+
+def test_long_turn_does_not_widen_the_candidates():
+    # Every word overlaps the covering turn and one or two short ones, not all of them
+    turns = [{"start": 0.0, "end": 3600.0, "speaker": "BACKGROUND"}]
+    turns += [{"start": t, "end": t + 9.5, "speaker": f"S{i % 2}"} for i, t in enumerate(range(0, 3600, 10))]
+    starts = np.arange(0, 3600, 0.5)
+    index = SpeakerIndex(turns)
+
+    intervals, _ = index.overlapping(starts, starts + 0.4)
+    assert len(index.layers) == 2
+    assert len(intervals) <= 2 * len(starts)
+
+
+def test_zero_length_word_inside_a_covering_turn():
+    # The turn starting just before the word ended long ago; the covering one has not
+    turns = [
+        {"start": 0.0, "end": 100.0, "speaker": "A"},
+        {"start": 10.0, "end": 11.0, "speaker": "B"}
+    ]
+    assert lookup(turns, [(50.0, 50.0)]) == ["A"]
+
+
+def test_word_between_turns_takes_the_nearest_within_the_gap():
+    turns = [
+        {"start": 0.0, "end": 10.0, "speaker": "A"},
+        {"start": 2.0, "end": 4.0, "speaker": "B"},
+        {"start": 11.5, "end": 20.0, "speaker": "C"}
+    ]
+    # 0.2 s after A (not B, which ended earlier), 0.7 s before C
+    assert lookup(turns, [(10.2, 10.8), (10.9, 11.2), (30.0, 30.5)]) == ["A", "C", None]
+
+
+def test_assign_speakers_matches_the_midpoint_scan_on_overlapping_turns():
+    _, turns = synthetic_transcript(0.25, 3, seed=1)
+    # Each turn runs 1 s into the next one
+    overlapping = [{**turn, "end": turn["end"] + 1.0} for turn in turns]
+    # Segments past the previous turn's overlap, where both methods must agree
+    segments = [
+        {"start": turn["start"] + 1.1, "end": turn["end"] - 0.1, "text": f" turn {i}"}
+        for i, turn in enumerate(turns) if turn["end"] - turn["start"] > 1.5
+    ]
+
+    aligned = assign_speakers(segments, overlapping)
+    assert len(aligned) == len(segments)
+    assert [s["speaker"] for s in aligned] == [s["speaker"] for s in midpoint_scan(segments, overlapping)]
+
+
+def test_assign_speakers_splits_on_speaker_change_in_overlapping_turns():
+    turns = [
+        {"start": 0.0, "end": 10.0, "speaker": "A"},
+        {"start": 8.0, "end": 20.0, "speaker": "B"}
+    ]
+    words = [
+        {"word": " knee", "start": 7.0, "end": 7.5},
+        {"word": " pain", "start": 9.0, "end": 9.5},
+        {"word": " since", "start": 9.8, "end": 10.6},
+        {"word": " Monday", "start": 11.0, "end": 11.5}
+    ]
+    segment = {"start": 7.0, "end": 11.5, "text": " knee pain since Monday", "words": words}
+
+    aligned = assign_speakers([segment], turns, speaker_map={"A": "Clinician"})
+    # Equal overlap in the shared stretch goes to the first speaker; past A's end, B
+    assert [(s["speaker"], s["text"]) for s in aligned] == [
+        ("Clinician", "knee pain"), ("B", "since Monday")
+    ]
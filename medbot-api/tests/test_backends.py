@@ -0,0 +1,46 @@
+"""The int8 openai-whisper backend: every Linear layer is really quantized"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("whisper")
+
+from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear  # noqa: E402
+from whisper.model import ModelDimensions, Whisper  # noqa: E402
+
+from backends import quantize_linear_layers  # noqa: E402
+
+DIMS = ModelDimensions(
+    n_mels=80, n_audio_ctx=8, n_audio_state=16, n_audio_head=2, n_audio_layer=2,
+    n_vocab=64, n_text_ctx=8, n_text_state=16, n_text_head=2, n_text_layer=2
+)
+
+
+def tiny_whisper() -> Whisper:
+    torch.manual_seed(0)
+    return Whisper(DIMS).eval()
+
+
+def test_linear_layers_are_dynamic_int8():
+    model = tiny_whisper()
+    linear = {name for name, module in model.named_modules() if isinstance(module, torch.nn.Linear)}
+    assert linear
+
+    quantized = quantize_linear_layers(model)
+    modules = dict(quantized.named_modules())
+    assert all(isinstance(modules[name], DynamicQuantizedLinear) for name in linear)
+    assert not any(isinstance(module, torch.nn.Linear) for module in modules.values())
+
+
+def test_quantized_model_still_decodes():
+    reference = tiny_whisper()
+    quantized = quantize_linear_layers(tiny_whisper())
+    mel = torch.randn(1, DIMS.n_mels, 2 * DIMS.n_audio_ctx)
+    tokens = torch.tensor([[1, 2, 3]])
+
+    with torch.no_grad():
+        expected = reference.logits(tokens, reference.embed_audio(mel))
+        logits = quantized.logits(tokens, quantized.embed_audio(mel))
+    assert logits.shape == (1, 3, DIMS.n_vocab)
+    # int8 weights: close to the fp32 model, not equal
+    assert (logits - expected).abs().max() < 0.1 * expected.abs().max()
@@ -0,0 +1,98 @@
+"""BatchedWhisper shutdown: pending windows fail instead of waiting forever"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("whisper")
+
+import batching  # noqa: E402
+from batching import BatchedWhisper, _Window  # noqa: E402
+
+
+@pytest.fixture
+def decoding(monkeypatch):
+    """Make whisper.decode block until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def decode(model, mel, options):
+        started.set()
+        release.wait(10)
+        return [SimpleNamespace(language="en", tokens=[]) for _ in range(len(mel))]
+
+    monkeypatch.setattr(batching.whisper, "decode", decode)
+    monkeypatch.setattr(batching.whisper, "DecodingOptions", lambda **options: None)
+    yield started, release
+    release.set()
+
+
+def batcher(monkeypatch, **options) -> BatchedWhisper:
+    # One 30-second window per second of "audio", without computing mels
+    model = SimpleNamespace(device="cpu")
+    monkeypatch.setattr(
+        BatchedWhisper, "_split",
+        lambda self, audio: [_Window(torch.zeros(1), float(i), 1.0) for i in range(len(audio))]
+    )
+    return BatchedWhisper(model, **options)
+
+
+def wait_until(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_queued_windows_fail_on_shutdown(monkeypatch, decoding):
+    started, release = decoding
+    whisper_batcher = batcher(monkeypatch, batch_size=2, max_wait_ms=0)
+
+    async def main():
+        request = asyncio.ensure_future(whisper_batcher.transcribe(np.zeros(6)))
+        # The first batch is decoding; the rest are still queued
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        whisper_batcher.shutdown()
+        with pytest.raises(RuntimeError, match="shutting down"):
+            await asyncio.wait_for(request, 5)
+
+    asyncio.run(main())
+    # The batch already decoding finishes; nothing is left pending
+    release.set()
+    whisper_batcher._thread.join(5)
+    assert not whisper_batcher._thread.is_alive()
+    assert whisper_batcher.stats()["pending_windows"] == 0
+
+
+def test_windows_collected_into_a_batch_fail_on_shutdown(monkeypatch, decoding):
+    started, _ = decoding
+    # The scheduler takes the window, then waits for more to fill the batch
+    whisper_batcher = batcher(monkeypatch, batch_size=8, max_wait_ms=10_000)
+
+    async def main():
+        request = asyncio.ensure_future(whisper_batcher.transcribe(np.zeros(1)))
+        await asyncio.get_running_loop().run_in_executor(
+            None, wait_until, lambda: whisper_batcher.stats()["pending_windows"] and whisper_batcher._queue.empty()
+        )
+        whisper_batcher.shutdown()
+        with pytest.raises(RuntimeError, match="shutting down"):
+            await asyncio.wait_for(request, 5)
+
+    asyncio.run(main())
+    whisper_batcher._thread.join(5)
+    assert not whisper_batcher._thread.is_alive()
+    assert not started.is_set()
+    assert whisper_batcher.stats()["pending_windows"] == 0
+
+
+def test_requests_after_shutdown_fail(monkeypatch, decoding):
+    whisper_batcher = batcher(monkeypatch)
+    whisper_batcher.shutdown()
+
+    with pytest.raises(RuntimeError, match="shutting down"):
+        asyncio.run(whisper_batcher.transcribe(np.zeros(1)))
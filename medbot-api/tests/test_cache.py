@@ -0,0 +1,156 @@
+"""ResultCache: keys, TTL expiry and least-recently-used eviction by size"""
+
+import json
+import random
+import string
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import cache
+from cache import ResultCache, audio_fingerprint
+
+TTL = 3600
+FINGERPRINT = "f" * 40
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """The cache's clock, advanced by hand"""
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def open_cache(tmp_path, max_bytes: int = 1024 * 1024) -> ResultCache:
+    return ResultCache(str(tmp_path), max_bytes=max_bytes, ttl_seconds=TTL)
+
+
+def result(seed: int, length: int = 2000) -> dict:
+    """A transcript that does not compress much, so entry sizes are predictable"""
+    rng = random.Random(seed)
+    return {"text": "".join(rng.choice(string.ascii_letters) for _ in range(length))}
+
+
+def stored_size(value: dict) -> int:
+    """Bytes an entry takes in the cache (compressed JSON)"""
+    return len(zlib.compress(json.dumps(value).encode(), 6))
+
+
+def key(name: str) -> str:
+    return ResultCache.key(FINGERPRINT, "openai-whisper:base", "whisper", {"name": name})
+
+
+def test_result_round_trips_with_numpy_values(tmp_path):
+    results = open_cache(tmp_path)
+    value = {"text": "Knee pain.", "segments": [{"start": np.float32(0.5), "tokens": np.array([1, 2])}]}
+    results.put(key("a"), value)
+
+    assert results.get(key("a")) == {"text": "Knee pain.", "segments": [{"start": 0.5, "tokens": [1, 2]}]}
+
+
+def test_keys_separate_audio_model_kind_and_options():
+    base = ("a" * 40, "openai-whisper:base", "whisper", {"word_timestamps": True, "vad": {"margin_db": 12}})
+    keys = {
+        ResultCache.key(*base),
+        ResultCache.key("b" * 40, *base[1:]),
+        ResultCache.key(base[0], "openai-whisper:small", *base[2:]),
+        ResultCache.key(base[0], base[1], "diarization", base[3]),
+        ResultCache.key(*base[:3], {"word_timestamps": False, "vad": {"margin_db": 12}}),
+        ResultCache.key(*base[:3], {"word_timestamps": True, "vad": {"margin_db": 10}})
+    }
+    assert len(keys) == 6
+    assert ResultCache.key(*base).startswith("whisper:")
+
+
+def test_key_ignores_option_order():
+    assert ResultCache.key(FINGERPRINT, "m", "whisper", {"a": 1, "b": 2}) == \
+        ResultCache.key(FINGERPRINT, "m", "whisper", {"b": 2, "a": 1})
+
+
+def test_other_model_or_options_miss(tmp_path):
+    results = open_cache(tmp_path)
+    results.put(ResultCache.key(FINGERPRINT, "openai-whisper:base", "whisper", {"vad": None}), result(1))
+
+    assert results.get(ResultCache.key(FINGERPRINT, "openai-whisper:small", "whisper", {"vad": None})) is None
+    assert results.get(ResultCache.key(FINGERPRINT, "openai-whisper:base", "whisper", {"vad": {"v": 1}})) is None
+    assert results.stats()["misses"] == {"whisper": 2}
+
+
+def test_hits_and_misses_are_counted_per_kind(tmp_path):
+    results = open_cache(tmp_path)
+    diarization = ResultCache.key(FINGERPRINT, "pyannote", "diarization")
+    results.put(key("a"), result(1))
+    results.get(key("a"))
+    results.get(key("b"))
+    results.get(diarization)
+
+    stats = results.stats()
+    assert stats["hits"] == {"whisper": 1}
+    assert stats["misses"] == {"whisper": 1, "diarization": 1}
+    assert stats["entries"] == 1
+
+
+def test_entry_expires_after_the_ttl(tmp_path, clock):
+    results = open_cache(tmp_path)
+    results.put(key("a"), result(1))
+
+    clock.now += TTL - 1
+    assert results.get(key("a")) is not None
+    # Reading it does not extend its life
+    clock.now += 2
+    assert results.get(key("a")) is None
+    assert results.stats()["entries"] == 0
+
+
+def test_expired_entries_are_purged_on_write(tmp_path, clock):
+    results = open_cache(tmp_path)
+    results.put(key("old"), result(1))
+    clock.now += TTL + 1
+    results.put(key("new"), result(2))
+
+    stats = results.stats()
+    assert stats["entries"] == 1
+    assert stats["evictions"] == 1
+
+
+def test_least_recently_used_entry_is_evicted_over_max_bytes(tmp_path, clock):
+    # Room for three entries, not four
+    results = open_cache(tmp_path, max_bytes=int(stored_size(result(0)) * 3.5))
+    for name in "abc":
+        clock.now += 1
+        results.put(key(name), result(ord(name)))
+    # "a" was used most recently, so "b" is now the least recently used
+    clock.now += 1
+    assert results.get(key("a")) is not None
+
+    clock.now += 1
+    results.put(key("d"), result(ord("d")))
+    assert results.get(key("b")) is None
+    assert all(results.get(key(name)) is not None for name in "acd")
+    assert results.stats()["evictions"] == 1
+
+
+def test_value_larger_than_the_cache_is_not_stored(tmp_path):
+    results = open_cache(tmp_path, max_bytes=100)
+    results.put(key("a"), result(1))
+
+    assert results.get(key("a")) is None
+    assert results.stats()["entries"] == 0
+
+
+def test_entries_survive_reopening(tmp_path):
+    open_cache(tmp_path).put(key("a"), result(1))
+    assert open_cache(tmp_path).get(key("a")) == result(1)
+
+
+def test_fingerprint_depends_only_on_the_samples():
+    audio = np.linspace(-1, 1, 16000, dtype=np.float32)
+    assert audio_fingerprint(audio) == audio_fingerprint(audio.copy())
+    # Same samples in a non-contiguous view
+    assert audio_fingerprint(np.repeat(audio, 2)[::2]) == audio_fingerprint(audio)
+    changed = audio.copy()
+    changed[100] += 0.01
+    assert audio_fingerprint(changed) != audio_fingerprint(audio)
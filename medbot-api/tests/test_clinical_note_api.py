@@ -0,0 +1,123 @@
+"""The clinical note endpoints, with the fake completion server or a scripted stand-in as the AI API"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from llm import ChatClient
+
+
+def transcript(turns: int) -> str:
+    return "\n\n".join(
+        f"{('Clinician', 'Patient')[i % 2]}: Turn {i} about the knee, the swelling and the pain at night."
+        for i in range(turns)
+    )
+
+
+def sse_events(body: str) -> list:
+    """(event, data) of every server-sent event in a response body"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def api(index, fake_llm, monkeypatch):
+    monkeypatch.setattr(index, "note_client", ChatClient(fake_llm.url, "test", max_retries=0))
+    with TestClient(index.app) as client:
+        yield client
+
+
+@pytest.fixture
+def stub_api(index, stub_llm, monkeypatch):
+    """The API with the scripted stand-in as the AI API"""
+    client = ChatClient(stub_llm.url, "test", max_retries=2, backoff_base=0.001, backoff_max=0.01)
+    monkeypatch.setattr(index, "note_client", client)
+    with TestClient(index.app) as api:
+        yield api
+
+
+def test_short_transcript_is_one_call(api, index, fake_llm, monkeypatch):
+    monkeypatch.setattr(index, "NOTE_CHUNK_TOKENS", 1000)
+    text = transcript(4)
+    response = api.post("/generate-clinical-note", json={"formatted_transcript": text})
+
+    assert response.status_code == 200
+    assert response.json()["chunks"] == 1
+    assert response.json()["clinical_note"]
+    assert fake_llm.app.state.requests == 1
+    assert text in fake_llm.app.state.bodies[0]["messages"][1]["content"]
+
+
+def test_long_transcript_is_map_reduced(api, index, fake_llm, monkeypatch):
+    monkeypatch.setattr(index, "NOTE_CHUNK_TOKENS", 60)
+    response = api.post("/generate-clinical-note", json={"formatted_transcript": transcript(30)})
+
+    assert response.status_code == 200
+    chunks = response.json()["chunks"]
+    assert chunks > 1
+    # One fact extraction per chunk, then the note from the merged facts
+    bodies = fake_llm.app.state.bodies
+    assert len(bodies) == chunks + 1
+    merge = bodies[-1]["messages"][1]["content"]
+    assert all(f"Part {i + 1}:\n" in merge for i in range(chunks))
+
+
+def test_transcript_is_required(api, fake_llm):
+    response = api.post("/generate-clinical-note", json={})
+    assert response.status_code == 400
+    assert fake_llm.app.state.requests == 0
+
+
+def test_stream_relays_tokens_as_server_sent_events(stub_api, stub_llm):
+    stub_llm.app.state.script = [("ok", ["Subjective: ", "knee ", "pain."])]
+    response = stub_api.post("/generate-clinical-note/stream", json={"formatted_transcript": transcript(2)})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert events[:-1] == [("token", {"text": text}) for text in ["Subjective: ", "knee ", "pain."]]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["chunks"] == 1
+
+
+def test_stream_relays_the_fake_server_note(api, fake_llm):
+    response = api.post("/generate-clinical-note/stream", json={"formatted_transcript": transcript(4)})
+
+    events = sse_events(response.text)
+    assert events[-1][0] == "done"
+    note = "".join(data["text"] for event, data in events if event == "token")
+    assert note and set(note.split()) == {"note"}
+    assert fake_llm.app.state.bodies[0]["stream"] is True
+
+
+def test_stream_error_before_first_token_is_an_http_error(stub_api, stub_llm):
+    stub_llm.app.state.script = [("status", 400, {})]
+    response = stub_api.post("/generate-clinical-note/stream", json={"formatted_transcript": transcript(2)})
+
+    assert response.status_code == 400
+    assert stub_llm.app.state.requests == 1
+
+
+def test_stream_retries_before_first_token(stub_api, stub_llm):
+    stub_llm.app.state.script = [("status", 503, {}), ("ok", ["Knee pain."])]
+    response = stub_api.post("/generate-clinical-note/stream", json={"formatted_transcript": transcript(2)})
+
+    assert response.status_code == 200
+    assert sse_events(response.text)[0] == ("token", {"text": "Knee pain."})
+    assert stub_llm.app.state.requests == 2
+
+
+def test_stream_failure_after_first_token_ends_with_an_error_event(stub_api, stub_llm):
+    stub_llm.app.state.script = [("drop", ["Subjective: ", "knee "]), ("ok", ["Subjective: knee pain."])]
+    response = stub_api.post("/generate-clinical-note/stream", json={"formatted_transcript": transcript(2)})
+
+    assert response.status_code == 200
+    events = sse_events(response.text)
+    assert events[:2] == [("token", {"text": "Subjective: "}), ("token", {"text": "knee "})]
+    assert events[-1][0] == "error"
+    # Not started over once tokens were relayed
+    assert stub_llm.app.state.requests == 1
@@ -0,0 +1,47 @@
+"""Clinician enrollment endpoints: changing enrolled voices needs the admin token"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def api(index, monkeypatch):
+    monkeypatch.setattr(index, "ADMIN_TOKEN", TOKEN)
+    with TestClient(index.app) as client:
+        yield client
+
+
+def enroll(api, headers=None):
+    return api.post(
+        "/clinicians/dr_smith/enroll",
+        files={"file": ("sample.txt", b"not audio", "text/plain")},
+        headers=headers or {}
+    )
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}])
+def test_enroll_and_delete_need_the_admin_token(api, headers):
+    assert enroll(api, headers).status_code == 401
+    assert api.delete("/clinicians/dr_smith", headers=headers).status_code == 401
+
+
+def test_enroll_and_delete_are_disabled_without_an_admin_token(api, index, monkeypatch):
+    monkeypatch.setattr(index, "ADMIN_TOKEN", None)
+    headers = {"X-Admin-Token": TOKEN}
+    assert enroll(api, headers).status_code == 403
+    assert api.delete("/clinicians/dr_smith", headers=headers).status_code == 403
+
+
+def test_admin_token_reaches_the_endpoints(api):
+    headers = {"X-Admin-Token": TOKEN}
+    # Past the token check: the file type is checked, the id looked up
+    assert enroll(api, headers).status_code == 400
+    assert api.delete("/clinicians/dr_smith", headers=headers).status_code == 404
+
+
+def test_listing_clinicians_needs_no_token(api):
+    response = api.get("/clinicians")
+    assert response.status_code == 200
+    assert "clinicians" in response.json()
@@ -0,0 +1,79 @@
+"""Diarization load state: a failed pipeline load is retried and recovers to ready"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def index(index, monkeypatch):
+    """The API with diarization configured (as with a token) but not loaded yet"""
+    before = index.model_status.snapshot().get("diarization", {})
+    monkeypatch.setattr(index, "hf_token", "hf_test")
+    index.model_status.set("diarization", "not_loaded", index.DIARIZATION_MODEL_NAME)
+    yield index
+    index.model_manager.unload(index.DIARIZATION_MODEL_ID)
+    index.model_status.set("diarization", before.get("state", "not_loaded"), before.get("detail"))
+
+
+@pytest.fixture
+def loads(index, monkeypatch):
+    """Calls to Pipeline.from_pretrained; it fails while ``loads.failing`` is set"""
+    calls = SimpleNamespace(count=0, failing=True)
+
+    def from_pretrained(name, use_auth_token=None):
+        calls.count += 1
+        if calls.failing:
+            raise OSError("huggingface.co unreachable")
+        return SimpleNamespace(name=name)
+
+    monkeypatch.setattr(index.Pipeline, "from_pretrained", from_pretrained)
+    return calls
+
+
+def acquire(index):
+    async def main():
+        pipeline = await index.acquire_diarization()
+        index.release_model(pipeline)
+        return pipeline
+    return asyncio.run(main())
+
+
+def state(index) -> str:
+    return index.model_status.state("diarization")
+
+
+def test_failed_load_is_not_retried_within_the_retry_interval(index, loads, monkeypatch):
+    monkeypatch.setattr(index, "DIARIZATION_RETRY_SECONDS", 3600)
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            acquire(index)
+        assert error.value.status_code == 503
+    assert loads.count == 1
+    assert state(index) == "failed"
+    assert index.diarization_unavailable()
+
+
+def test_later_successful_load_resets_the_state_to_ready(index, loads, monkeypatch):
+    monkeypatch.setattr(index, "DIARIZATION_RETRY_SECONDS", 0)
+    with pytest.raises(HTTPException):
+        acquire(index)
+    assert state(index) == "failed"
+
+    loads.failing = False
+    assert acquire(index).name == index.DIARIZATION_MODEL_NAME
+    assert state(index) == "ready"
+    assert not index.diarization_unavailable()
+
+
+def test_pipeline_reloaded_after_an_unload_is_ready(index, loads):
+    loads.failing = False
+    acquire(index)
+    index.model_manager.unload(index.DIARIZATION_MODEL_ID)
+    assert state(index) == "not_loaded"
+
+    acquire(index)
+    assert state(index) == "ready"
+    assert loads.count == 2
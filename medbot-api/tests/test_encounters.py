@@ -0,0 +1,165 @@
+"""EncounterStore: the batching writer, full-text search and deletes"""
+
+import sqlite3
+
+import pytest
+
+from encounters import EncounterStore, fts_query
+
+
+def diarized(*turns):
+    """A /transcribe/diarize result from (speaker, text) turns, 5 s each"""
+    segments = [
+        {"start": i * 5.0, "end": i * 5.0 + 4.5, "speaker": speaker, "text": text}
+        for i, (speaker, text) in enumerate(turns)
+    ]
+    return {
+        "full_text": " ".join(text for _, text in turns),
+        "formatted_transcript": "\n\n".join(f"{speaker}: {text}" for speaker, text in turns),
+        "segments": segments,
+        "speakers": sorted({speaker for speaker, _ in turns})
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Never write on the timer during a test: only a full batch, sync() or a read flushes
+    store = EncounterStore(str(tmp_path), batch_size=1000, max_wait_ms=60_000)
+    yield store
+    store.close()
+
+
+def committed_encounters(store: EncounterStore) -> int:
+    """Encounters on disk, read through a separate connection (not the store's)"""
+    db = sqlite3.connect(store.path)
+    try:
+        return db.execute("SELECT COUNT(*) FROM encounters").fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_writes_are_queued_until_sync(store):
+    for _ in range(3):
+        store.add_encounter(diarized(("Clinician", "How is the knee?")), "visit.webm")
+    assert committed_encounters(store) == 0
+
+    store.sync()
+    assert committed_encounters(store) == 3
+    stats = store.stats()
+    assert stats["batches"] == 1
+    assert stats["writes"] == 3
+    assert stats["pending_writes"] == 0
+
+
+def test_reads_see_queued_writes(store):
+    encounter_id = store.add_encounter(
+        diarized(("Clinician", "Any swelling?"), ("Patient", "Every morning.")), "visit.webm", audio_seconds=10.0
+    )
+    note_id = store.add_note({"clinical_note": "Knee swelling, mornings.", "model": "m", "chunks": 1}, encounter_id)
+
+    encounter = store.get_encounter(encounter_id)
+    assert encounter["filename"] == "visit.webm"
+    assert encounter["audio_seconds"] == 10.0
+    assert [segment["speaker"] for segment in encounter["segments"]] == ["Clinician", "Patient"]
+    assert [note["note_id"] for note in encounter["notes"]] == [note_id]
+    assert store.get_note(note_id)["encounter_id"] == encounter_id
+
+
+def test_close_writes_queued_records(tmp_path):
+    store = EncounterStore(str(tmp_path), batch_size=1000, max_wait_ms=60_000)
+    store.add_encounter(diarized(("Patient", "It hurts.")))
+    store.close()
+    assert committed_encounters(store) == 1
+
+
+def test_search_ranks_by_relevance_or_recency(store):
+    best = store.add_encounter(diarized(("Patient", "Knee pain, knee swelling, knee stiffness.")))
+    newest = store.add_encounter(diarized(
+        ("Clinician", "We talked about your diet, sleep, work and exercise, and briefly about the knee.")
+    ))
+
+    results, total = store.search_segments("knee", 10, 0, "relevance")
+    assert total == 2
+    assert [result["encounter_id"] for result in results] == [best, newest]
+
+    results, _ = store.search_segments("knee", 10, 0, "recent")
+    assert [result["encounter_id"] for result in results] == [newest, best]
+
+
+def test_search_snippets_mark_matches(store):
+    store.add_encounter(diarized(("Patient", "The knee has been swelling every morning.")))
+
+    results, total = store.search_segments("knee swell", 10, 0)
+    assert total == 1
+    # Stemmed, and the last word matches as a prefix
+    assert results[0]["snippet"] == "The [knee] has been [swelling] every morning."
+    assert results[0]["speaker"] == "Patient"
+    assert results[0]["start"] == 0.0
+
+    assert store.search_segments("menisc", 10, 0)[1] == 0
+    assert store.search_segments("knee elbow", 10, 0)[1] == 0
+
+
+def test_search_pages(store):
+    for i in range(5):
+        store.add_encounter(diarized(("Patient", f"Knee pain, visit {i}.")))
+    first, total = store.search_segments("knee", 2, 0)
+    rest, _ = store.search_segments("knee", 10, 2)
+    assert total == 5
+    assert len(first) == 2 and len(rest) == 3
+    assert not {r["encounter_id"] for r in first} & {r["encounter_id"] for r in rest}
+
+
+def test_search_notes(store):
+    encounter_id = store.add_encounter(diarized(("Patient", "My knee hurts.")))
+    note_id = store.add_note({"clinical_note": "Assessment: suspected meniscus tear."}, encounter_id)
+
+    results, total = store.search_notes("menisc", 10, 0, "relevance")
+    assert total == 1
+    assert results[0]["note_id"] == note_id
+    assert results[0]["encounter_id"] == encounter_id
+    assert "[meniscus]" in results[0]["snippet"]
+
+
+def test_search_input_is_matched_literally():
+    assert fts_query('knee OR "pain') == '"knee" "OR" """pain"*'
+    with pytest.raises(ValueError):
+        fts_query("   ")
+
+
+def test_search_rejects_unknown_order(store):
+    with pytest.raises(ValueError):
+        store.search_segments("knee", 10, 0, "oldest")
+
+
+def test_delete_removes_segments_and_notes(store):
+    deleted = store.add_encounter(diarized(("Patient", "Knee pain since the fall.")))
+    kept = store.add_encounter(diarized(("Patient", "Knee pain when climbing stairs.")))
+    deleted_notes = [store.add_note({"clinical_note": f"Knee pain note {i}."}, deleted) for i in range(2)]
+    kept_note = store.add_note({"clinical_note": "Knee pain note, stairs."}, kept)
+
+    assert store.delete_encounter(deleted)
+    assert not store.delete_encounter(deleted)
+
+    assert store.get_encounter(deleted) is None
+    assert all(store.get_note(note_id) is None for note_id in deleted_notes)
+    assert [r["encounter_id"] for r in store.search_segments("knee", 10, 0)[0]] == [kept]
+    assert [r["note_id"] for r in store.search_notes("knee", 10, 0)[0]] == [kept_note]
+    stats = store.stats()
+    assert (stats["encounters"], stats["notes"]) == (1, 1)
+
+
+def test_note_for_deleted_encounter_is_kept_unlinked(store):
+    encounter_id = store.add_encounter(diarized(("Patient", "Knee pain.")))
+    store.delete_encounter(encounter_id)
+    note_id = store.add_note({"clinical_note": "Knee pain."}, encounter_id)
+    assert store.get_note(note_id)["encounter_id"] is None
+
+
+def test_purge_removes_old_encounters(store):
+    encounter_id = store.add_encounter(diarized(("Patient", "Knee pain.")))
+    store.add_note({"clinical_note": "Unlinked note."})
+    assert store.purge(3600) == 0
+    assert store.purge(0) == 1
+    assert store.get_encounter(encounter_id) is None
+    assert store.stats()["notes"] == 0
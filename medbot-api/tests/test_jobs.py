@@ -0,0 +1,136 @@
+"""JobStore: claiming jobs, leases and requeueing jobs of lost workers"""
+
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from jobs import JobStore, worker_id
+
+HOST = socket.gethostname()
+LEASE = 60
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path))
+
+
+def running_job(store: JobStore, worker: str, renewed_ago: float = 0) -> str:
+    """A job claimed by ``worker`` whose lease was last renewed ``renewed_ago`` seconds ago"""
+    job_id = store.create("transcribe", {}, "visit.webm", store.new_audio_path(".webm"))
+    assert store.claim(worker)["id"] == job_id
+    with store._lock:
+        store._db.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - ? WHERE id = ?", (renewed_ago, job_id))
+    return job_id
+
+
+def exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def status(store: JobStore, job_id: str) -> str:
+    return store.get(job_id)["status"]
+
+
+def test_worker_id_is_unique_to_this_run():
+    host, pid, token = worker_id().split(":")
+    assert (host, int(pid)) == (HOST, os.getpid())
+    assert token
+    assert worker_id() == worker_id()
+
+
+def test_claim_takes_the_oldest_queued_job(store):
+    first = store.create("transcribe", {}, "a.webm", None)
+    store.create("diarize", {}, "b.webm", None)
+
+    job = store.claim("w1")
+    assert job["id"] == first
+    assert (job["status"], job["worker"]) == ("running", "w1")
+    assert job["heartbeat_at"] == job["started_at"]
+
+
+def test_live_worker_keeps_its_job(store):
+    # Another live process on this machine, lease recently renewed
+    job_id = running_job(store, f"{HOST}:{os.getppid()}:othertoken", renewed_ago=LEASE / 2)
+    assert store.requeue_orphans(LEASE, worker_id()) == 0
+    assert status(store, job_id) == "running"
+
+
+def test_expired_lease_is_requeued(store):
+    # On another machine (or a reused pid): only the lease can tell
+    other_machine = running_job(store, "other-host:1:othertoken", renewed_ago=LEASE + 1)
+    reused_pid = running_job(store, f"{HOST}:{os.getppid()}:othertoken", renewed_ago=LEASE + 1)
+
+    assert store.requeue_orphans(LEASE, worker_id()) == 2
+    for job_id in (other_machine, reused_pid):
+        job = store.get(job_id)
+        assert (job["status"], job["worker"], job["progress"]) == ("queued", None, 0)
+
+
+def test_heartbeat_renews_the_lease(store):
+    worker = "other-host:1:othertoken"
+    job_id = running_job(store, worker, renewed_ago=LEASE + 1)
+    other = running_job(store, "other-host:2:othertoken", renewed_ago=LEASE + 1)
+
+    assert store.heartbeat(worker) == 1
+    assert store.requeue_orphans(LEASE, worker_id()) == 1
+    assert status(store, job_id) == "running"
+    assert status(store, other) == "queued"
+
+
+def test_previous_run_with_the_same_pid_is_requeued_at_once(store):
+    # A container restart: same hostname, same pid (often 1), new process
+    job_id = running_job(store, f"{HOST}:{os.getpid()}:previousrun")
+    assert store.requeue_orphans(LEASE, worker_id()) == 1
+    assert status(store, job_id) == "queued"
+
+
+def test_exited_worker_on_this_machine_is_requeued_at_once(store):
+    pid = exited_pid()
+    job_id = running_job(store, f"{HOST}:{pid}:othertoken")
+    legacy = running_job(store, f"{HOST}:{pid}")
+
+    assert store.requeue_orphans(LEASE, worker_id()) == 2
+    assert status(store, job_id) == status(store, legacy) == "queued"
+
+
+def test_own_jobs_are_never_requeued(store):
+    job_id = running_job(store, worker_id(), renewed_ago=LEASE * 10)
+    assert store.requeue_orphans(LEASE, worker_id()) == 0
+    assert status(store, job_id) == "running"
+
+
+def test_requeued_job_can_be_claimed_again(store):
+    job_id = running_job(store, "other-host:1:othertoken", renewed_ago=LEASE + 1)
+    store.requeue_orphans(LEASE, worker_id())
+
+    job = store.claim(worker_id())
+    assert job["id"] == job_id
+    assert job["worker"] == worker_id()
+
+
+def test_store_without_lease_column_is_upgraded(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "jobs.sqlite3"))
+    db.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+        "options TEXT NOT NULL, filename TEXT, audio_path TEXT, stage TEXT, progress REAL NOT NULL DEFAULT 0, "
+        "stages TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, worker TEXT, created_at REAL NOT NULL, "
+        "started_at REAL, finished_at REAL)"
+    )
+    # Left running by an old-style worker id, long ago
+    db.execute(
+        "INSERT INTO jobs (id, kind, status, options, worker, created_at, started_at) "
+        "VALUES ('old', 'transcribe', 'running', '{}', 'other-host:1', 0, 0)"
+    )
+    db.commit()
+    db.close()
+
+    store = JobStore(str(tmp_path))
+    assert store.requeue_orphans(LEASE, worker_id()) == 1
+    assert status(store, "old") == "queued"
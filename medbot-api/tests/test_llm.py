@@ -0,0 +1,154 @@
+"""ChatClient retries and streaming, against a scripted local stand-in of the AI API"""
+
+import asyncio
+import random
+import time
+
+import httpx
+import pytest
+
+import llm
+from llm import ChatAPIError, ChatClient
+
+PAYLOAD = {"model": "test-model", "messages": [{"role": "user", "content": "Write a note."}]}
+
+
+def client_for(server, **options) -> ChatClient:
+    # Near-zero backoff, so only Retry-After can make a test wait
+    options = {"max_retries": 3, "backoff_base": 0.001, "backoff_max": 0.01, **options}
+    return ChatClient(server.url, "test", **options)
+
+
+def complete(client: ChatClient):
+    async def main():
+        try:
+            return await client.complete(PAYLOAD)
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def stream(client: ChatClient, received: list):
+    """Collect streamed deltas into ``received`` (so they are kept if the stream fails)"""
+    async def main():
+        try:
+            async for text in client.stream(PAYLOAD):
+                received.append(text)
+        finally:
+            await client.aclose()
+    asyncio.run(main())
+    return received
+
+
+def content(result) -> str:
+    return result["choices"][0]["message"]["content"]
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_complete_retries_rate_limits_and_server_errors(stub_llm, status):
+    stub_llm.app.state.script = [("status", status, {}), ("status", status, {}), ("ok", ["Note."])]
+    client = client_for(stub_llm)
+
+    assert content(complete(client)) == "Note."
+    assert stub_llm.app.state.requests == 3
+    assert client.stats()["retries"] == 2
+    assert client.stats()["failed"] == 0
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 422])
+def test_complete_does_not_retry_client_errors(stub_llm, status):
+    stub_llm.app.state.script = [("status", status, {}), ("ok", ["Note."])]
+    client = client_for(stub_llm)
+
+    with pytest.raises(ChatAPIError) as error:
+        complete(client)
+    assert error.value.status_code == status
+    assert stub_llm.app.state.requests == 1
+    assert client.stats()["retries"] == 0
+
+
+def test_complete_gives_up_after_max_retries(stub_llm):
+    stub_llm.app.state.script = [("status", 503, {})] * 3
+    client = client_for(stub_llm, max_retries=2)
+
+    with pytest.raises(ChatAPIError) as error:
+        complete(client)
+    assert error.value.status_code == 503
+    assert stub_llm.app.state.requests == 3
+    assert client.stats()["failed"] == 1
+
+
+def test_retry_delays_are_jittered_exponential_backoff(stub_llm, monkeypatch):
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return 0.0
+    monkeypatch.setattr(llm.random, "uniform", uniform)
+    stub_llm.app.state.script = [("status", 503, {})] * 4 + [("ok", ["Note."])]
+
+    complete(client_for(stub_llm, max_retries=4, backoff_base=0.001, backoff_max=0.004))
+    # Drawn uniformly from [0, base * 2^attempt], capped at backoff_max
+    assert bounds == [(0, 0.001), (0, 0.002), (0, 0.004), (0, 0.004)]
+
+
+def test_backoff_samples_spread_over_the_whole_range():
+    client = ChatClient("http://127.0.0.1:1/", "test", backoff_base=0.5, backoff_max=8.0)
+    random.seed(0)
+    delays = [client._backoff(3) for _ in range(1000)]
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert min(delays) < 0.5 and max(delays) > 3.5
+
+
+def test_retry_after_is_honoured(stub_llm):
+    stub_llm.app.state.script = [("status", 429, {"Retry-After": "0.5"}), ("ok", ["Note."])]
+    started = time.perf_counter()
+
+    assert content(complete(client_for(stub_llm))) == "Note."
+    assert time.perf_counter() - started >= 0.5
+
+
+def test_retry_after_is_capped(stub_llm, monkeypatch):
+    monkeypatch.setattr(llm, "MAX_RETRY_AFTER_SECONDS", 0.1)
+    stub_llm.app.state.script = [("status", 503, {"Retry-After": "3600"}), ("ok", ["Note."])]
+    started = time.perf_counter()
+
+    assert content(complete(client_for(stub_llm))) == "Note."
+    assert time.perf_counter() - started < 5
+
+
+def test_stream_yields_deltas(stub_llm):
+    stub_llm.app.state.script = [("ok", ["Subjective: ", "knee ", "pain."])]
+    assert stream(client_for(stub_llm), []) == ["Subjective: ", "knee ", "pain."]
+
+
+def test_stream_retries_before_the_first_token(stub_llm):
+    stub_llm.app.state.script = [("status", 429, {}), ("status", 502, {}), ("ok", ["Knee ", "pain."])]
+    client = client_for(stub_llm)
+
+    assert stream(client, []) == ["Knee ", "pain."]
+    assert stub_llm.app.state.requests == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_stream_does_not_retry_after_the_first_token(stub_llm):
+    stub_llm.app.state.script = [("drop", ["Subjective: ", "knee "]), ("ok", ["Subjective: knee pain."])]
+    client = client_for(stub_llm)
+    received = []
+
+    with pytest.raises(httpx.HTTPError):
+        stream(client, received)
+    # What was relayed stays relayed; the request is not started over
+    assert received == ["Subjective: ", "knee "]
+    assert stub_llm.app.state.requests == 1
+    assert client.stats()["retries"] == 0
+    assert client.stats()["failed"] == 1
+
+
+def test_stream_does_not_retry_client_errors(stub_llm):
+    stub_llm.app.state.script = [("status", 400, {}), ("ok", ["Note."])]
+
+    with pytest.raises(ChatAPIError) as error:
+        stream(client_for(stub_llm), [])
+    assert error.value.status_code == 400
+    assert stub_llm.app.state.requests == 1
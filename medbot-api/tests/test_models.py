@@ -0,0 +1,250 @@
+"""ModelManager: references, the memory budget, deferred and idle unloading"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# models.py measures torch weights; the tests use stand-in models instead
+pytest.importorskip("torch")
+
+import models  # noqa: E402
+from models import ModelManager  # noqa: E402
+
+MB = 2**20
+
+
+class StubModel:
+    """A 'model' of a fixed size"""
+
+    def __init__(self, name: str, nbytes: int):
+        self.name = name
+        self.nbytes = nbytes
+
+
+@pytest.fixture(autouse=True)
+def fixed_sizes(monkeypatch):
+    # Size = the stub's nbytes; no RSS measurement or allocator trimming
+    monkeypatch.setattr(models, "process_rss_bytes", lambda: None)
+    monkeypatch.setattr(models, "module_bytes", lambda model: model.nbytes)
+    monkeypatch.setattr(models, "free_memory", lambda: None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(models, "time", SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    return clock
+
+
+class Loaders:
+    """Stub loaders that count their calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name: str, size_mb: int = 100):
+        def load():
+            self.calls.append(name)
+            return StubModel(name, size_mb * MB)
+        return load
+
+
+@pytest.fixture
+def loaders():
+    return Loaders()
+
+
+@pytest.fixture
+def unloaded():
+    return []
+
+
+def manager(unloaded, budget_mb: int = 0, idle_seconds: float = 0) -> ModelManager:
+    return ModelManager(
+        budget_bytes=budget_mb * MB,
+        idle_seconds=idle_seconds,
+        on_unload=lambda model_id, reason: unloaded.append((model_id, reason))
+    )
+
+
+def use(models_: ModelManager, loaders: Loaders, name: str, size_mb: int = 100):
+    """Acquire and release right away, leaving the model idle"""
+    models_.release(models_.acquire(name, loaders(name, size_mb)))
+
+
+def refs(models_: ModelManager) -> dict:
+    return {entry["id"]: entry["refs"] for entry in models_.stats()["models"]}
+
+
+def test_model_is_loaded_once_and_reference_counted(unloaded, loaders):
+    models_ = manager(unloaded)
+    first = models_.acquire("a", loaders("a"))
+    second = models_.acquire("a", loaders("a"))
+
+    assert first is second
+    assert loaders.calls == ["a"]
+    assert refs(models_) == {"a": 2}
+    models_.release(first)
+    models_.release(second)
+    models_.release(second)
+    assert refs(models_) == {"a": 0}
+
+
+def test_least_recently_used_idle_model_is_evicted_for_a_new_one(unloaded, loaders):
+    models_ = manager(unloaded, budget_mb=250)
+    use(models_, loaders, "a")
+    use(models_, loaders, "b")
+    use(models_, loaders, "a")
+
+    use(models_, loaders, "c")
+    assert models_.loaded() == ["a", "c"]
+    assert unloaded == [("b", "budget")]
+    assert models_.stats()["evictions"] == 1
+
+
+def test_models_in_use_are_never_evicted(unloaded, loaders):
+    models_ = manager(unloaded, budget_mb=250)
+    held = [models_.acquire(name, loaders(name)) for name in "ab"]
+
+    # Everything resident is in use: the load goes over budget instead
+    third = models_.acquire("c", loaders("c"))
+    assert models_.loaded() == ["a", "b", "c"]
+    assert unloaded == []
+    stats = models_.stats()
+    assert stats["over_budget_loads"] == 1
+    assert stats["models_mb"] == 300
+
+    # Once released, the next load brings it back within the budget
+    for model in held + [third]:
+        models_.release(model)
+    use(models_, loaders, "d")
+    assert models_.loaded() == ["c", "d"]
+    assert unloaded == [("a", "budget"), ("b", "budget")]
+
+
+def test_remembered_size_makes_room_before_loading(unloaded, loaders):
+    models_ = manager(unloaded, budget_mb=250)
+    use(models_, loaders, "big", 200)
+    use(models_, loaders, "small", 100)
+    assert models_.loaded() == ["small"]
+
+    def load_big():
+        # The known size of "big" already made room for it
+        assert models_.loaded() == []
+        return StubModel("big", 200 * MB)
+    models_.release(models_.acquire("big", load_big))
+    assert models_.loaded() == ["big"]
+    assert models_.stats()["over_budget_loads"] == 0
+
+
+def test_unload_waits_for_the_last_release(unloaded, loaders):
+    models_ = manager(unloaded)
+    first = models_.acquire("a", loaders("a"))
+    second = models_.acquire("a", loaders("a"))
+
+    assert models_.unload("a") is False
+    models_.release(first)
+    assert models_.loaded() == ["a"]
+    models_.release(second)
+    assert models_.loaded() == []
+    assert unloaded == [("a", "requested")]
+
+
+def test_unload_of_an_idle_or_unknown_model(unloaded, loaders):
+    models_ = manager(unloaded)
+    use(models_, loaders, "a")
+
+    assert models_.unload("a") is True
+    assert models_.unload("a") is None
+    assert unloaded == [("a", "requested")]
+
+
+def test_release_after_unload_does_not_touch_the_reloaded_model(unloaded, loaders):
+    models_ = manager(unloaded)
+    old = models_.acquire("a", loaders("a"))
+    models_.unload("a")
+    models_.release(old)
+    assert models_.loaded() == []
+
+    new = models_.acquire("a", loaders("a"))
+    assert new is not old
+    # The stale object is no longer mapped to "a"
+    models_.release(old)
+    assert refs(models_) == {"a": 1}
+    models_.release(new)
+    assert refs(models_) == {"a": 0}
+
+
+def test_release_of_an_unknown_model_is_ignored(unloaded, loaders):
+    models_ = manager(unloaded)
+    models_.acquire("a", loaders("a"))
+    models_.release(StubModel("a", MB))
+    models_.release(None)
+    assert refs(models_) == {"a": 1}
+
+
+def test_pinned_model_survives_budget_and_idle_unloading(unloaded, loaders, clock):
+    models_ = manager(unloaded, budget_mb=150, idle_seconds=3600)
+    use(models_, loaders, "a")
+    models_.pin("a")
+
+    use(models_, loaders, "b")
+    clock.now += 7200
+    assert models_.unload_idle() == 1
+    assert models_.loaded() == ["a"]
+    models_.shutdown()
+
+
+def test_idle_models_are_unloaded_after_the_timeout(unloaded, loaders, clock):
+    models_ = manager(unloaded, idle_seconds=600)
+    use(models_, loaders, "a")
+    clock.now += 300
+    use(models_, loaders, "b")
+    held = models_.acquire("c", loaders("c"))
+
+    clock.now += 400
+    assert models_.unload_idle() == 1
+    assert models_.loaded() == ["b", "c"]
+    clock.now += 10_000
+    # "c" is still in use
+    assert models_.unload_idle() == 1
+    assert models_.loaded() == ["c"]
+    assert unloaded == [("a", "idle"), ("b", "idle")]
+    models_.release(held)
+    models_.shutdown()
+
+
+def test_failed_load_leaves_nothing_behind(unloaded, loaders):
+    models_ = manager(unloaded)
+
+    def broken():
+        raise OSError("weights not found")
+    with pytest.raises(OSError):
+        models_.acquire("a", broken)
+    assert models_.loaded() == []
+
+    use(models_, loaders, "a")
+    assert models_.loaded() == ["a"]
+
+
+def test_concurrent_acquires_load_once(unloaded):
+    models_ = manager(unloaded)
+    calls = []
+
+    def slow_load():
+        calls.append(1)
+        time.sleep(0.05)
+        return StubModel("a", MB)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(models_.acquire("a", slow_load))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len({id(model) for model in results}) == 1
+    assert refs(models_) == {"a": 4}
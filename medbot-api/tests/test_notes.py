@@ -0,0 +1,128 @@
+"""Transcript chunking and map-reduce note generation, against the fake completion server"""
+
+import asyncio
+
+import pytest
+
+from fake_llm import FakeChatServer
+from llm import ChatAPIError, ChatClient
+from notes import FACT_EXTRACTION_PROMPT, chunk_transcript, estimate_tokens, extract_facts, note_message
+
+MODEL = "test-model"
+
+
+def transcript(*turns: str) -> str:
+    """A formatted_transcript from turns, alternating Clinician / Patient"""
+    return "\n\n".join(
+        f"{('Clinician', 'Patient')[i % 2]}: {text}" for i, text in enumerate(turns)
+    )
+
+
+@pytest.fixture
+def llm(fake_llm):
+    return ChatClient(fake_llm.url, "test", max_retries=0)
+
+
+def run(client: ChatClient, coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_short_transcript_is_one_chunk():
+    text = transcript("How is the knee?", "Better since the injection.")
+    assert chunk_transcript(text, 1000) == [text]
+
+
+def test_chunks_keep_turns_whole():
+    turns = [f"Turn {i} about the knee, the swelling and the pain at night." for i in range(30)]
+    text = transcript(*turns)
+    chunks = chunk_transcript(text, 60)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 60 for chunk in chunks)
+    # Every turn is in exactly one chunk, unchanged and in order
+    assert [turn for chunk in chunks for turn in chunk.split("\n\n")] == text.split("\n\n")
+
+
+def test_over_budget_turn_is_split_with_its_speaker_label():
+    sentences = [f"Sentence {i} describes the pain in the left knee in detail." for i in range(40)]
+    long_turn = " ".join(sentences)
+    text = transcript("Tell me about the pain.", long_turn, "Thank you.")
+    chunks = chunk_transcript(text, 50)
+
+    turns = [turn for chunk in chunks for turn in chunk.split("\n\n")]
+    assert turns[0] == "Clinician: Tell me about the pain."
+    assert turns[-1] == "Clinician: Thank you."
+    pieces = turns[1:-1]
+    assert len(pieces) > 1
+    assert all(piece.startswith("Patient: ") for piece in pieces)
+    assert all(estimate_tokens(piece) <= 50 for piece in pieces)
+    # Split at sentence boundaries, nothing lost
+    assert " ".join(piece[len("Patient: "):] for piece in pieces) == long_turn
+
+
+def test_over_budget_sentence_is_split_at_words():
+    words = " ".join(f"word{i}" for i in range(200))
+    chunks = chunk_transcript(f"Patient: {words}", 20)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("Patient: ") for chunk in chunks)
+    assert " ".join(chunk[len("Patient: "):] for chunk in chunks) == words
+
+
+def test_plain_transcript_without_labels():
+    text = " ".join(f"Sentence {i} about the knee." for i in range(50))
+    chunks = chunk_transcript(text, 30)
+
+    assert len(chunks) > 1
+    assert " ".join(chunks) == text
+
+
+def test_extract_facts_one_request_per_chunk(llm, fake_llm):
+    chunks = ["Patient: My knee hurts.", "Clinician: Let us get an MRI.", "Patient: Okay."]
+    facts = run(llm, extract_facts(llm, MODEL, chunks, max_tokens=100))
+
+    assert len(facts) == 3 and all(facts)
+    bodies = fake_llm.app.state.bodies
+    assert len(bodies) == 3
+    assert all(body["messages"][0]["content"] == FACT_EXTRACTION_PROMPT for body in bodies)
+    assert all(body["max_tokens"] == 100 for body in bodies)
+    prompts = sorted(body["messages"][1]["content"] for body in bodies)
+    for i, chunk in enumerate(chunks):
+        assert prompts[i] == f"Part {i + 1} of 3 of the consultation transcript:\n\n{chunk}"
+
+
+def test_note_message_below_budget_makes_no_extra_calls(llm, fake_llm):
+    text = transcript("How is the knee?", "Better since the injection.")
+    message, chunks = run(llm, note_message(llm, MODEL, text, chunk_tokens=1000))
+
+    assert chunks == 1
+    assert text in message
+    assert fake_llm.app.state.requests == 0
+
+
+def test_note_message_above_budget_maps_then_merges(llm, fake_llm):
+    turns = [f"Turn {i} about the knee, the swelling and the pain at night." for i in range(30)]
+    text = transcript(*turns)
+    expected_chunks = len(chunk_transcript(text, 60))
+    message, chunks = run(llm, note_message(llm, MODEL, text, chunk_tokens=60, facts_max_tokens=50))
+
+    assert chunks == expected_chunks > 1
+    # One fact extraction per chunk; the merge call is left to the caller
+    assert fake_llm.app.state.requests == chunks
+    assert text not in message
+    for i in range(chunks):
+        assert f"Part {i + 1}:\n" in message
+
+
+def test_extract_facts_raises_api_errors():
+    # Context window smaller than the request, so the fake API answers 400
+    with FakeChatServer(0, context_tokens=100, prefill_ms_per_token=0, decode_ms_per_token=0) as url:
+        client = ChatClient(url, "test", max_retries=0)
+        with pytest.raises(ChatAPIError) as error:
+            run(client, extract_facts(client, MODEL, ["Patient: My knee hurts."], max_tokens=800))
+    assert error.value.status_code == 400
@@ -0,0 +1,109 @@
+"""Transcript bodies: segment field selection, the columnar layout and compression"""
+
+import gzip
+import json
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import payload
+from payload import json_response, parse_fields, select_segments
+
+SEGMENTS = [
+    {"id": 0, "start": 0.0, "end": 2.5, "text": " Knee pain.", "tokens": [1, 2], "no_speech_prob": 0.01, "speaker": "SPEAKER_00"},
+    {"id": 1, "start": 2.5, "end": 4.0, "text": " Since Monday.", "tokens": [3], "no_speech_prob": 0.02, "speaker": "SPEAKER_01"}
+]
+
+
+def request(accept_encoding: str = None) -> Request:
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def respond(accept_encoding: str = None, content=None) -> Response:
+    content = {"segments": SEGMENTS * 50} if content is None else content
+    return json_response(request(accept_encoding), Response(), content)
+
+
+def test_columnar_defaults_to_start_end_text_and_speaker():
+    assert select_segments(SEGMENTS, format="columnar") == {
+        "start": [0.0, 2.5],
+        "end": [2.5, 4.0],
+        "text": [" Knee pain.", " Since Monday."],
+        "speaker": ["SPEAKER_00", "SPEAKER_01"]
+    }
+
+
+def test_columnar_leaves_out_speaker_without_diarization():
+    plain = [{key: value for key, value in segment.items() if key != "speaker"} for segment in SEGMENTS]
+    assert list(select_segments(plain, format="columnar")) == ["start", "end", "text"]
+
+
+def test_columnar_with_fields_fills_missing_values_with_none():
+    columns = select_segments(SEGMENTS[:1] + [{"start": 4.0}], fields=["start", "text"], format="columnar")
+    assert columns == {"start": [0.0, 4.0], "text": [" Knee pain.", None]}
+
+
+def test_columnar_of_no_segments():
+    assert select_segments([], format="columnar") == {"start": [], "end": [], "text": []}
+
+
+def test_full_format_selects_fields_or_returns_segments_as_is():
+    assert select_segments(SEGMENTS) is SEGMENTS
+    assert select_segments(SEGMENTS, fields=parse_fields("start, text")) == [
+        {"start": 0.0, "text": " Knee pain."}, {"start": 2.5, "text": " Since Monday."}
+    ]
+
+
+def test_unknown_field_or_format_is_rejected():
+    with pytest.raises(ValueError, match="logits"):
+        parse_fields("start,logits")
+    with pytest.raises(ValueError, match="rows"):
+        select_segments(SEGMENTS, format="rows")
+
+
+def test_brotli_is_preferred_when_accepted():
+    brotli = pytest.importorskip("brotli")
+    response = respond("gzip, deflate, br")
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert json.loads(brotli.decompress(response.body)) == {"segments": SEGMENTS * 50}
+
+
+def test_gzip_when_brotli_is_not_accepted():
+    response = respond("gzip;q=0.8, br;q=0")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body)) == {"segments": SEGMENTS * 50}
+
+
+def test_gzip_when_brotli_is_not_installed(monkeypatch):
+    monkeypatch.setattr(payload, "brotli", None)
+    assert respond("br, gzip").headers["content-encoding"] == "gzip"
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "", "identity", "gzip;q=0, br;q=0"])
+def test_uncompressed_when_nothing_usable_is_accepted(accept_encoding):
+    response = respond(accept_encoding)
+
+    assert "content-encoding" not in response.headers
+    assert json.loads(response.body) == {"segments": SEGMENTS * 50}
+
+
+def test_small_bodies_are_not_compressed():
+    response = respond("br, gzip", {"segments": SEGMENTS[:1]})
+
+    assert "content-encoding" not in response.headers
+    assert int(response.headers["content-length"]) == len(response.body)
+
+
+def test_headers_and_status_of_the_injected_response_are_kept():
+    injected = Response(status_code=202, headers={"X-Cache": "hit", "Content-Length": "3"})
+    response = json_response(request("gzip"), injected, {"segments": SEGMENTS * 50})
+
+    assert response.status_code == 202
+    assert response.headers["x-cache"] == "hit"
+    assert int(response.headers["content-length"]) == len(response.body)
+    assert response.media_type == "application/json"
@@ -0,0 +1,140 @@
+"""Voice activity detection: finding speech and mapping compacted times back to the recording"""
+
+import numpy as np
+import pytest
+
+# vad.py gets SAMPLE_RATE from audio.py, which imports torch
+pytest.importorskip("torch")
+
+from audio import SAMPLE_RATE  # noqa: E402
+from vad import SpeechMap, VoiceActivityDetector  # noqa: E402
+
+
+def tone(seconds: float, frequency: float = 220.0) -> np.ndarray:
+    """A voiced-speech stand-in: loud and tonal"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def samples(seconds: float) -> int:
+    return int(seconds * SAMPLE_RATE)
+
+
+@pytest.fixture
+def speech_map() -> SpeechMap:
+    # Speech at 0-1 s and 3-4 s of a 5 s recording: compacted, 0-1 s and 1-2 s
+    return SpeechMap([(0, samples(1)), (samples(3), samples(4))], samples(5))
+
+
+def test_times_inside_regions_map_back(speech_map):
+    assert speech_map.to_original(0.5) == 0.5
+    assert speech_map.to_original(1.5) == 3.5
+    assert speech_map.to_original(2.0, end=True) == 4.0
+
+
+def test_boundary_time_starts_the_next_region_or_ends_the_previous(speech_map):
+    assert speech_map.to_original(1.0) == 3.0
+    assert speech_map.to_original(1.0, end=True) == 1.0
+    assert speech_map.to_original(0.0) == speech_map.to_original(0.0, end=True) == 0.0
+
+
+def test_restore_transcription_maps_segments_words_and_seek(speech_map):
+    result = {
+        "text": " Knee pain. Since Monday.",
+        "language": "en",
+        "segments": [
+            {"seek": 0, "start": 0.2, "end": 1.0, "text": " Knee pain.",
+             "words": [{"word": " Knee", "start": 0.2, "end": 0.6}, {"word": " pain.", "start": 0.6, "end": 1.0}]},
+            {"seek": 100, "start": 1.0, "end": 1.8, "text": " Since Monday.",
+             "words": [{"word": " Since", "start": 1.0, "end": 1.4}, {"word": " Monday.", "start": 1.4, "end": 1.8}]}
+        ]
+    }
+    restored = speech_map.restore_transcription(result)
+
+    first, second = restored["segments"]
+    # Ending on the cut stays in the first region instead of spanning the silence
+    assert (first["start"], first["end"], first["seek"]) == (0.2, 1.0, 0)
+    assert [(w["start"], w["end"]) for w in first["words"]] == [(0.2, 0.6), (0.6, 1.0)]
+    # Moved by the 2 s of skipped silence; seek is in 10 ms frames
+    assert (second["start"], second["end"], second["seek"]) == (3.0, 3.8, 300)
+    assert [(w["start"], w["end"]) for w in second["words"]] == [(3.0, 3.4), (3.4, 3.8)]
+    assert restored["text"] == result["text"] and restored["language"] == "en"
+    # The input is left as it was
+    assert result["segments"][1]["start"] == 1.0
+
+
+def test_restore_turns(speech_map):
+    turns = [{"start": 0.5, "end": 1.0, "speaker": "SPEAKER_00"}, {"start": 1.0, "end": 2.0, "speaker": "SPEAKER_01"}]
+    assert speech_map.restore_turns(turns) == [
+        {"start": 0.5, "end": 1.0, "speaker": "SPEAKER_00"},
+        {"start": 3.0, "end": 4.0, "speaker": "SPEAKER_01"}
+    ]
+
+
+def test_compact_joins_the_regions(speech_map):
+    audio = np.arange(samples(5), dtype=np.float32)
+    compacted = speech_map.compact(audio)
+
+    assert len(compacted) == speech_map.speech_samples == samples(2)
+    assert compacted[samples(1)] == audio[samples(3)]
+    assert speech_map.skipped_fraction == pytest.approx(0.6)
+
+
+def test_long_silence_between_speech_is_skipped():
+    audio = np.concatenate([tone(2), silence(10), tone(2)])
+    speech_map = VoiceActivityDetector(pad_seconds=0.3).detect(audio)
+
+    assert len(speech_map.regions) == 2
+    (first_start, first_end), (second_start, second_end) = speech_map.regions
+    assert first_start == 0 and second_end == len(audio)
+    # Padded by 0.3 s into the silence, to within a frame
+    assert first_end / SAMPLE_RATE == pytest.approx(2.3, abs=0.05)
+    assert second_start / SAMPLE_RATE == pytest.approx(11.7, abs=0.05)
+    assert speech_map.skipped_fraction == pytest.approx(9.4 / 14, abs=0.01)
+    # The second tone starts 2.6 s into the compacted audio
+    compacted_start = (first_end - first_start + samples(12) - second_start) / SAMPLE_RATE
+    assert speech_map.to_original(compacted_start) == pytest.approx(12.0, abs=0.001)
+
+
+def test_short_pauses_are_kept():
+    audio = np.concatenate([tone(2), silence(1), tone(2)])
+    speech_map = VoiceActivityDetector(min_silence_seconds=1.5).detect(audio)
+
+    assert speech_map.regions == [(0, len(audio))]
+    assert speech_map.compact(audio) is audio
+
+
+@pytest.mark.parametrize("audio", [silence(5), np.zeros(0, dtype=np.float32)])
+def test_all_silent_audio_keeps_the_whole_recording(audio):
+    speech_map = VoiceActivityDetector().detect(audio)
+
+    assert speech_map.regions == [(0, len(audio))]
+    assert speech_map.skipped_fraction == 0.0
+    assert len(speech_map.compact(audio)) == len(audio)
+
+
+def test_broadband_noise_is_not_speech():
+    noise = np.random.default_rng(0).normal(0, 0.1, samples(10)).astype(np.float32)
+    audio = np.concatenate([tone(2), silence(4), noise, silence(4), tone(2)])
+    speech_map = VoiceActivityDetector().detect(audio)
+
+    # Only the two tones: the noise in the middle is cut with the silence
+    assert len(speech_map.regions) == 2
+    assert speech_map.speech_seconds < 6
+
+
+def test_settings_change_with_every_threshold():
+    default = VoiceActivityDetector().settings()
+    changed = [
+        VoiceActivityDetector(**{name: value}).settings()
+        for name, value in [
+            ("margin_db", 10.0), ("max_flatness", 0.3), ("min_speech_seconds", 0.5),
+            ("min_silence_seconds", 2.0), ("pad_seconds", 0.1)
+        ]
+    ]
+    assert all(settings != default for settings in changed)
+    assert VoiceActivityDetector().settings() == default
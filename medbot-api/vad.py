@@ -0,0 +1,274 @@
+"""
+Cheap voice-activity analysis of decoded 16kHz audio.
+
+Everything here works on per-frame statistics computed with a handful of
+vectorized NumPy operations, so a 60-minute recording is analysed in a second
+or two - negligible next to the models it feeds.
+
+Uses:
+- ``silence_split_points``: where to cut long recordings into chunks
+- ``VoiceActivityDetector``: which parts of a recording contain speech, so
+  Whisper and pyannote can skip long silences (exam time, typing, waiting).
+  Besides the wasted compute, Whisper tends to hallucinate repeated phrases
+  over silence. The returned ``SpeechMap`` maps times on the compacted audio
+  back to the original recording.
+"""
+
+import threading
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+
+FRAME_SECONDS = 0.03
+FRAME_SAMPLES = int(SAMPLE_RATE * FRAME_SECONDS)
+
+
+def frame_energy_db(audio: np.ndarray, frame_samples: int = FRAME_SAMPLES) -> np.ndarray:
+    """RMS level of each non-overlapping frame in dBFS (a trailing partial frame is dropped)"""
+    count = len(audio) // frame_samples
+    frames = audio[:count * frame_samples].reshape(count, frame_samples)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+    return 20 * np.log10(rms)
+
+
+def _moving_average(values: np.ndarray, width: int) -> np.ndarray:
+    """Centred moving average, same length as ``values``"""
+    width = max(1, min(width, len(values)))
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode="edge")
+    sums = np.cumsum(np.insert(padded, 0, 0.0))
+    return (sums[width:] - sums[:-width]) / width
+
+
+def silence_split_points(
+    audio: np.ndarray,
+    chunk_seconds: float,
+    search_seconds: float = 10.0,
+    pause_seconds: float = 0.5
+) -> List[int]:
+    """
+    Sample offsets at which to cut ``audio`` into chunks of roughly
+    ``chunk_seconds``.
+
+    Each cut goes at the quietest ``pause_seconds`` stretch within
+    ``search_seconds`` either side of the target position, so chunks end in a
+    pause between words rather than in the middle of one. Returns the inner
+    cut points only (no 0 or ``len(audio)``).
+    """
+    chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+    if chunk_samples <= 0 or len(audio) <= chunk_samples * 1.5:
+        return []
+
+    energy = _moving_average(frame_energy_db(audio), int(pause_seconds / FRAME_SECONDS))
+    # Never search more than a quarter chunk away, so chunks stay within 75-125% of the target
+    search_frames = int(min(search_seconds, chunk_seconds / 4) / FRAME_SECONDS)
+    cuts: List[int] = []
+    target = chunk_samples
+    # Leave at least half a chunk for the last piece rather than a short tail
+    while target < len(audio) - chunk_samples // 2:
+        centre = target // FRAME_SAMPLES
+        low = max(0, centre - search_frames)
+        high = min(len(energy), centre + search_frames + 1)
+        if high <= low:
+            break
+        frame = low + int(np.argmin(energy[low:high]))
+        cut = frame * FRAME_SAMPLES + FRAME_SAMPLES // 2
+        if cuts and cut <= cuts[-1]:
+            cut = target
+        cuts.append(cut)
+        target = cut + chunk_samples
+    return cuts
+
+
+def spectral_flatness(audio: np.ndarray, frame_samples: int = FRAME_SAMPLES, block_frames: int = 8192) -> np.ndarray:
+    """
+    Spectral flatness (geometric / arithmetic mean of the power spectrum) of
+    each frame: near 0 for tonal, harmonic sounds like voiced speech, around
+    0.5 for broadband noise, clicks and keyboard typing. Computed in blocks so
+    an hour of audio never needs more than a few tens of MB at once.
+    """
+    count = len(audio) // frame_samples
+    frames = audio[:count * frame_samples].reshape(count, frame_samples)
+    window = np.hanning(frame_samples).astype(np.float32)
+    flatness = np.empty(count)
+    for start in range(0, count, block_frames):
+        power = np.abs(np.fft.rfft(frames[start:start + block_frames] * window, axis=1)) ** 2 + 1e-12
+        flatness[start:start + block_frames] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return flatness
+
+
+class SpeechMap:
+    """
+    Speech regions of a recording and the mapping between the compacted
+    (speech only) timeline and the original one.
+
+    ``regions`` are (start, end) sample ranges in the original audio. The
+    compacted audio is those ranges back to back, so a time ``t`` in it lies
+    in the region whose compacted start is the last one at or before ``t``.
+    """
+
+    def __init__(self, regions: List[Tuple[int, int]], total_samples: int):
+        self.regions = regions
+        self.total_samples = total_samples
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        self.compact_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]) / SAMPLE_RATE if regions else np.zeros(0)
+        self.original_starts = np.array([start for start, _ in regions]) / SAMPLE_RATE
+        self.speech_samples = int(lengths.sum())
+
+    @property
+    def skipped_fraction(self) -> float:
+        if not self.total_samples:
+            return 0.0
+        return 1.0 - self.speech_samples / self.total_samples
+
+    @property
+    def speech_seconds(self) -> float:
+        return self.speech_samples / SAMPLE_RATE
+
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        """The speech regions of ``audio`` joined into one array"""
+        if self.speech_samples == len(audio):
+            return audio
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+    def to_original(self, t: float, end: bool = False) -> float:
+        """
+        Map a compacted time in seconds back to the recording. A time exactly
+        on a region boundary belongs to the next region, or to the previous
+        one when ``end`` is set, so a segment ending at a cut does not stretch
+        over the skipped silence.
+        """
+        if not self.regions:
+            return t
+        side = "left" if end else "right"
+        index = max(0, int(np.searchsorted(self.compact_starts, t, side=side)) - 1)
+        return round(float(self.original_starts[index] + t - self.compact_starts[index]), 3)
+
+    def restore_transcription(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Whisper result on the compacted audio, with segment and word times on the original timeline"""
+        segments = []
+        for segment in result.get("segments", []):
+            segment = dict(segment)
+            start = segment["start"]
+            segment["start"] = self.to_original(start)
+            segment["end"] = self.to_original(segment["end"], end=True)
+            if "seek" in segment:
+                segment["seek"] += int(round((segment["start"] - start) * 100))
+            if segment.get("words"):
+                segment["words"] = [
+                    {**word, "start": self.to_original(word["start"]), "end": self.to_original(word["end"], end=True)}
+                    for word in segment["words"]
+                ]
+            segments.append(segment)
+        return {**result, "segments": segments}
+
+    def restore_turns(self, turns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Diarization turns on the compacted audio, mapped to the original timeline"""
+        return [
+            {**turn, "start": self.to_original(turn["start"]), "end": self.to_original(turn["end"], end=True)}
+            for turn in turns
+        ]
+
+
+class VoiceActivityDetector:
+    """
+    Finds speech in a recording from frame energy and spectral flatness.
+
+    A frame counts as speech when it is at least ``margin_db`` above the
+    recording's noise floor (its 10th-percentile frame level) and not
+    noise-like (flatness below ``max_flatness``). Only pauses of at least
+    ``min_silence_seconds`` are cut, so short gaps between words and
+    unvoiced consonants stay in; speech shorter than ``min_speech_seconds``
+    after that is dropped and the rest is padded by ``pad_seconds`` on both
+    sides. If nothing qualifies as speech the whole
+    recording is kept rather than sending nothing to the models.
+    """
+
+    # Bump when the detection itself changes, so cached results keyed on
+    # ``settings()`` are not reused across versions
+    VERSION = 1
+
+    def __init__(
+        self,
+        margin_db: float = 12.0,
+        max_flatness: float = 0.4,
+        min_speech_seconds: float = 0.2,
+        min_silence_seconds: float = 1.5,
+        pad_seconds: float = 0.3
+    ):
+        self.margin_db = margin_db
+        self.max_flatness = max_flatness
+        self.min_speech_seconds = min_speech_seconds
+        self.min_silence_seconds = min_silence_seconds
+        self.pad_seconds = pad_seconds
+        self.min_speech_frames = max(1, int(min_speech_seconds / FRAME_SECONDS))
+        self.min_silence_frames = int(min_silence_seconds / FRAME_SECONDS)
+        self.pad_frames = int(pad_seconds / FRAME_SECONDS)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._audio_seconds = 0.0
+        self._skipped_seconds = 0.0
+
+    def settings(self) -> Dict[str, Any]:
+        """Everything that decides the speech regions (for cache keys)"""
+        return {
+            "version": self.VERSION,
+            "margin_db": self.margin_db,
+            "max_flatness": self.max_flatness,
+            "min_speech_seconds": self.min_speech_seconds,
+            "min_silence_seconds": self.min_silence_seconds,
+            "pad_seconds": self.pad_seconds
+        }
+
+    def speech_frames(self, audio: np.ndarray) -> np.ndarray:
+        """Boolean speech/non-speech decision per frame, before smoothing"""
+        energy = frame_energy_db(audio)
+        if not len(energy):
+            return np.zeros(0, dtype=bool)
+        floor = np.percentile(energy, 10)
+        # Keep the threshold well below the level of the loud (speech) frames,
+        # so a recording without pauses is not cut into
+        threshold = min(max(floor + self.margin_db, -60.0), np.percentile(energy, 95) - 20.0)
+        return (energy > threshold) & (spectral_flatness(audio) < self.max_flatness)
+
+    def detect(self, audio: np.ndarray) -> SpeechMap:
+        speech = self.speech_frames(audio)
+        edges = np.diff(np.concatenate([[0], speech.astype(np.int8), [0]]))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+        if len(starts):
+            # Join runs separated by less than the minimum pause (syllables,
+            # words, unvoiced consonants), then drop isolated blips and pad
+            breaks = starts[1:] - ends[:-1] >= self.min_silence_frames
+            starts = starts[np.concatenate([[True], breaks])]
+            ends = ends[np.concatenate([breaks, [True]])]
+            keep = ends - starts >= self.min_speech_frames
+            starts, ends = starts[keep] - self.pad_frames, ends[keep] + self.pad_frames
+
+        if len(starts):
+            regions = [
+                (max(0, int(start) * FRAME_SAMPLES), min(len(audio), int(end) * FRAME_SAMPLES))
+                for start, end in zip(starts, ends)
+            ]
+            # The trailing partial frame belongs to the last region if it reaches the end
+            if ends[-1] * FRAME_SAMPLES >= len(audio) - FRAME_SAMPLES:
+                regions[-1] = (regions[-1][0], len(audio))
+        else:
+            regions = [(0, len(audio))]
+
+        speech_map = SpeechMap(regions, len(audio))
+        with self._lock:
+            self._requests += 1
+            self._audio_seconds += len(audio) / SAMPLE_RATE
+            self._skipped_seconds += (len(audio) - speech_map.speech_samples) / SAMPLE_RATE
+        return speech_map
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "audio_seconds": round(self._audio_seconds, 1),
+                "skipped_seconds": round(self._skipped_seconds, 1),
+                "skipped_fraction": round(self._skipped_seconds / self._audio_seconds, 3) if self._audio_seconds else 0.0
+            }
@@ -0,0 +1,61 @@
+"""
+Model load state and warm-up helpers.
+
+Loading Whisper and pyannote takes tens of seconds, and the first inference
+in a fresh process is much slower than later ones (weights paged in, kernels
+selected, allocator pools grown). The server binds first and loads the
+models in the background; ``ModelStatus`` tracks where each one is for the
+readiness endpoint.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+
+# not_loaded -> loading -> loaded -> ready (warmed up), or failed / disabled
+MODEL_STATES = ("not_loaded", "loading", "loaded", "ready", "failed", "disabled")
+
+
+def warmup_audio(seconds: float, seed: int = 0) -> np.ndarray:
+    """Quiet noise used as a stand-in recording for warm-up passes"""
+    rng = np.random.default_rng(seed)
+    return (0.01 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+class ModelStatus:
+    """Thread-safe load state of each model, with load and warm-up times"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, Any]] = {}
+
+    def set(self, name: str, state: str, detail: Optional[str] = None):
+        if state not in MODEL_STATES:
+            raise ValueError(f"Unknown model state '{state}'")
+        now = time.perf_counter()
+        with self._lock:
+            entry = self._models.setdefault(name, {"state": "not_loaded", "detail": None})
+            if state == "loading":
+                entry["_load_started"] = now
+            elif state == "loaded" and "_load_started" in entry:
+                entry["load_seconds"] = round(now - entry.pop("_load_started"), 2)
+                entry["_warmup_started"] = now
+            elif state == "ready" and "_warmup_started" in entry:
+                entry["warmup_seconds"] = round(now - entry.pop("_warmup_started"), 2)
+            entry["state"] = state
+            entry["detail"] = detail
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            return self._models.get(name, {}).get("state", "not_loaded")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {key: value for key, value in entry.items() if not key.startswith("_")}
+                for name, entry in self._models.items()
+            }
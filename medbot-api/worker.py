@@ -0,0 +1,43 @@
+"""
+Standalone job worker.
+
+Runs queued jobs from the same JOB_DIR as the API server, with its own copy
+of the models. Start as many as the machine has room for, and set
+JOB_WORKERS=0 on the API server so it only accepts and reports jobs:
+
+    JOB_WORKERS=1 python worker.py
+
+Set WORKER_METRICS_PORT to serve the worker's Prometheus metrics (the same
+set as the API's /metrics) on that port.
+"""
+
+import asyncio
+import os
+
+from prometheus_client import start_http_server
+
+import index
+
+
+async def main():
+    metrics_port = int(os.environ.get("WORKER_METRICS_PORT", "0"))
+    if metrics_port:
+        start_http_server(metrics_port)
+    concurrency = max(1, index.JOB_WORKERS)
+    tasks = index.start_job_workers(concurrency)
+    print(f"Job worker started ({concurrency} concurrent job(s), queue in {index.JOB_DIR})")
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        index.whisper_executor.shutdown()
+        index.diarization_executor.shutdown()
+        if index.encounter_store:
+            index.encounter_store.close()
+        await index.note_client.aclose()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
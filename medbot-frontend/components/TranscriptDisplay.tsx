@@ -1,7 +1,6 @@
 "use client";
 
 import { Loader2, FileText, Users, Sparkles } from "lucide-react";
-import axios from "axios";
 
 interface TranscriptSegment {
   start: number;
@@ -41,13 +40,44 @@ export default function TranscriptDisplay({
   const handleGenerateClinicalNote = async () => {
     setIsGeneratingNote(true);
     try {
-      const response = await axios.post("http://localhost:8000/generate-clinical-note", {
-        transcript: transcript,
-        formatted_transcript: formattedTranscript
+      // Stream the note so it appears as the model writes it
+      const response = await fetch("http://localhost:8000/generate-clinical-note/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          transcript: transcript,
+          formatted_transcript: formattedTranscript
+        })
       });
-      
-      if (response.data && response.data.clinical_note) {
-        onGenerateClinicalNote(response.data.clinical_note);
+
+      if (!response.ok || !response.body) {
+        throw new Error(`Clinical note request failed with status ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let note = "";
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-sent events are separated by a blank line
+        const events = buffer.split("\n\n");
+        buffer = events.pop() || "";
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || "{}");
+          if (event === "token") {
+            note += data.text;
+            onGenerateClinicalNote(note);
+            setIsGeneratingNote(false);
+          } else if (event === "error") {
+            throw new Error(data.detail);
+          }
+        }
       }
     } catch (error) {
       console.error("Error generating clinical note:", error);
@@ -232,7 +262,10 @@ export default function TranscriptDisplay({
       "bg-orange-100 text-orange-800 border-orange-300",
       "bg-pink-100 text-pink-800 border-pink-300",
     ];
-    const index = parseInt(speaker.replace(/\D/g, "")) - 1;
+    // Recognised roles keep the same color in every transcript
+    const roles: Record<string, number> = { Clinician: 0, Patient: 1 };
+    const number = parseInt(speaker.replace(/\D/g, "")) || 1;
+    const index = speaker in roles ? roles[speaker] : speaker.startsWith("Other") ? number + 1 : number - 1;
     return colors[index % colors.length];
   };
 
@@ -310,7 +343,7 @@ export default function TranscriptDisplay({
             /* Render formatted transcript with line breaks */
             <div className="space-y-4">
               {formattedTranscript.split('\n\n').map((paragraph, index) => {
-                const match = paragraph.match(/^(Person \d+): (.[\s\S]*)$/);
+                const match = paragraph.match(/^((?:Person|Other) \d+|Clinician|Patient): (.[\s\S]*)$/);
                 if (match) {
                   const [, speaker, text] = match;
                   return (
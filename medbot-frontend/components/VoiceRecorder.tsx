@@ -35,15 +35,56 @@ export default function VoiceRecorder({ onTranscriptionComplete, onLoadingChange
   const audioContextRef = useRef<AudioContext | null>(null);
   const analyserRef = useRef<AnalyserNode | null>(null);
   const animationFrameRef = useRef<number | null>(null);
+  const socketRef = useRef<WebSocket | null>(null);
+  const pendingChunksRef = useRef<Blob[]>([]);
 
   useEffect(() => {
     return () => {
       if (timerRef.current) clearInterval(timerRef.current);
       if (animationFrameRef.current) cancelAnimationFrame(animationFrameRef.current);
       if (audioContextRef.current) audioContextRef.current.close();
+      if (socketRef.current) socketRef.current.close();
     };
   }, []);
 
+  // Dictation streams audio to the live endpoint while recording, so only the
+  // last few seconds still need transcribing when the clinician presses stop.
+  // onLost is called if the socket closes without a final transcript.
+  const openLiveSocket = (onDone: (text: string) => void, onLost: () => void) => {
+    const socket = new WebSocket("ws://localhost:8000/transcribe/stream");
+    socket.binaryType = "arraybuffer";
+    pendingChunksRef.current = [];
+
+    socket.onopen = () => {
+      pendingChunksRef.current.forEach((chunk) => socket.send(chunk));
+      pendingChunksRef.current = [];
+    };
+
+    let done = false;
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === "done") {
+        done = true;
+        onDone(message.text || "");
+      } else if (message.type === "error") {
+        console.error("Live transcription error:", message.detail);
+      }
+    };
+
+    socket.onerror = (error) => {
+      console.error("Live transcription socket error:", error);
+    };
+
+    socket.onclose = () => {
+      if (!done) {
+        onLost();
+      }
+    };
+
+    socketRef.current = socket;
+    return socket;
+  };
+
   const startRecording = async () => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
@@ -69,21 +110,63 @@ export default function VoiceRecorder({ onTranscriptionComplete, onLoadingChange
       mediaRecorderRef.current = mediaRecorder;
       audioChunksRef.current = [];
 
+      let stopped = false;
+      let uploaded = false;
+      const uploadRecording = async () => {
+        if (uploaded) return;
+        uploaded = true;
+        // Use the actual MIME type from the recorder
+        const mimeType = mediaRecorder.mimeType || 'audio/webm';
+        const audioBlob = new Blob(audioChunksRef.current, { type: mimeType });
+        await sendAudioToAPI(audioBlob);
+      };
+
+      const liveSocket = mode === "dictating" ? openLiveSocket(
+        (text) => {
+          onTranscriptionComplete({ text });
+          onLoadingChange(false);
+          liveSocket?.close();
+          socketRef.current = null;
+        },
+        () => {
+          // The whole recording is still in audioChunksRef: once stopped,
+          // transcribe it like a non-live recording
+          socketRef.current = null;
+          if (stopped) uploadRecording();
+        }
+      ) : null;
+
       mediaRecorder.ondataavailable = (event) => {
         if (event.data.size > 0) {
           audioChunksRef.current.push(event.data);
+          if (liveSocket) {
+            if (liveSocket.readyState === WebSocket.OPEN) {
+              liveSocket.send(event.data);
+            } else if (liveSocket.readyState === WebSocket.CONNECTING) {
+              pendingChunksRef.current.push(event.data);
+            }
+          }
         }
       };
 
       mediaRecorder.onstop = async () => {
-        // Use the actual MIME type from the recorder
-        const mimeType = mediaRecorder.mimeType || 'audio/webm';
-        const audioBlob = new Blob(audioChunksRef.current, { type: mimeType });
-        await sendAudioToAPI(audioBlob);
         stream.getTracks().forEach(track => track.stop());
+        stopped = true;
+
+        if (liveSocket && liveSocket.readyState === WebSocket.OPEN) {
+          // The server sends a "done" message with the full text after this;
+          // if the socket closes first, onLost uploads the recording instead
+          onLoadingChange(true);
+          liveSocket.send("stop");
+          return;
+        }
+
+        liveSocket?.close();
+        await uploadRecording();
       };
 
-      mediaRecorder.start();
+      // Emit a chunk every second when streaming; otherwise one blob at the end
+      mediaRecorder.start(liveSocket ? 1000 : undefined);
       setIsRecording(true);
       setRecordingTime(0);
 